@@ -1,152 +1,925 @@
 # -*- coding: utf-8 -*-
+import functools
+import time
 
 import irc3
 from irc3.compat import asyncio
-from irc3.plugins.command import command
+from irc3.plugins.command import Commands, command
+from irc3.utils import IrcString
 
-from vxinputlib import VXInput, TRIGGER_MAX, GamepadState
-from xinputlib import XInput
+import vxinputlib
+import xinputlib
+from ctrlbotlib.admission import Admission
+from ctrlbotlib.compositor import parse_mask
+from ctrlbotlib.delay import DelayLine
+from ctrlbotlib.holds import TimerWheel
+from ctrlbotlib.ingest import Ingest, shard, worker_config
+from ctrlbotlib.macros import ComboBook, MacroPlayer
+from ctrlbotlib.outbound import Outbound
+from ctrlbotlib.overlay import OverlayFeed
+from ctrlbotlib.parser import CommandParser
+from ctrlbotlib.poll import RollingPoll
+from ctrlbotlib.ramps import EASINGS, RampPlayer
+from ctrlbotlib.recording import Recorder
+from ctrlbotlib.stats import Stats
+from ctrlbotlib.ticker import SKIP, Ticker
+from ctrlbotlib.pool import ControllerPool, Pad
+from ctrlbotlib.worker import FFIWorker, worker_loader
+from vxinputlib import (
+    VXInput, TRIGGER_MAX, DIRECTIONS, DIRECTION_ANGLES, DPAD_UP, DPAD_DOWN,
+    DPAD_LEFT, DPAD_RIGHT, GamepadState, direction_to_xy,
+)
+from vxinputlib import fake as vxinput_fake
+from xinputlib import DeviceRegistry, XInput
+from xinputlib import fake as xinput_fake
 
 
 POLLING_RATE = 1 / 100
 
+DPAD_VALUES = {
+    "up": DPAD_UP,
+    "down": DPAD_DOWN,
+    "left": DPAD_LEFT,
+    "right": DPAD_RIGHT,
+}
 
-async def ctrl_poll(loop, ctrl, vctrl):
-    while True:
-        ctrl.update()
+# backend name: (vXbox library loader, XInput library loader)
+BACKENDS = {
+    "dll": (vxinputlib.load_library, xinputlib.load_library),
+    "fake": (vxinput_fake.load_library, xinput_fake.load_library),
+}
+
+
+class ControllerPoll:
+    """
+    Tick callback polling the physical controllers in devices, a
+    xinputlib.DeviceRegistry, and pushing changed states of the passthrough
+    controller into delay_line.
+
+    The passthrough controller is the connected one in the lowest slot.
+    When it disconnects its inputs are released and the next connected
+    one takes over, controllers plugged in later are picked up.
+
+    With a FFI worker the poll runs on the worker and its events are
+    handled when they arrive, ticks while a poll is still running are
+    counted in busy.
+
+    If polling raises OSError, e.g. because XInput can't be loaded, or
+    RuntimeError, XInputGetState returning an unknown error, the error is
+    passed to on_error once and later ticks do nothing.
+    """
+
+    def __init__(self, devices, delay_line, worker=None, loop=None,
+                 on_error=None):
+        self.devices = devices
+        self.delay_line = delay_line
+        self.worker = worker
+        self.loop = loop
+        self.on_error = on_error
+        self.ctrl = None
+        self.pending = None
+        self.error = None
+        self.busy = 0
+
+    def __call__(self, now):
+        if self.error is not None:
+            return
+        if self.worker is None:
+            try:
+                events = self.devices.poll(now)
+            except (OSError, RuntimeError) as e:
+                self.fail(e)
+                return
+            self.handle(events)
+        elif self.pending is None:
+            self.pending = self.worker.call(self.devices.poll, now)
+            self.pending.add_done_callback(self._done_threadsafe)
+        else:
+            self.busy += 1
+
+    def _done_threadsafe(self, future):
+        self.loop.call_soon_threadsafe(self._done, future)
+
+    def _done(self, future):
+        self.pending = None
+        try:
+            events = future.result()
+        except (OSError, RuntimeError) as e:
+            self.fail(e)
+            return
+        self.handle(events)
+
+    def fail(self, error):
+        self.error = error
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def handle(self, events):
+        for kind, device in events:
+            if kind == xinputlib.CHANGED:
+                if device is self.ctrl:
+                    self.push(device.state)
+            elif kind == xinputlib.DISCONNECTED:
+                if device is self.ctrl:
+                    # release everything the controller was holding
+                    self.delay_line.push(xinputlib.NEUTRAL_STATE,
+                                         GamepadState(0))
+                    self.ctrl = None
+        if self.ctrl is None:
+            self.ctrl = self.devices.first()
+            if self.ctrl is not None:
+                self.push(self.ctrl.state)
+
+    def push(self, ctrl_state):
         mask = GamepadState.axis_l
-        ctrl_state = ctrl.state
         if ctrl_state.back:
             mask = GamepadState.all
-        loop.call_later(1,
-                        vctrl.set_state,
-                        ctrl_state,
-                        mask)
-        await asyncio.sleep(POLLING_RATE)
+        self.delay_line.push(ctrl_state, mask)
+
+
+def parse_duration(value, default=200):
+    if isinstance(value, str) and value.lower().endswith("ms"):
+        value = value[:-2]
+    try:
+        duration = int(value)
+    except (ValueError, TypeError):
+        duration = default
+    return max(0, min(10000, duration)) / 1000
+
+
+RAMP_DURATION = 500
+RAMP_CURVE = "inout"
+
+
+def aim_action(dir_, end=None, duration=None, curve=None):
+    dir_ = dir_.upper()
+    if (dir_, 100) not in DIRECTIONS:
+        return None
+    if end is None and duration is None and curve is None:
+        return ("aim", dir_)
+    start = None
+    if end is not None:
+        start, dir_ = dir_, end.upper()
+        if (dir_, 100) not in DIRECTIONS:
+            return None
+    curve = (curve or RAMP_CURVE).lower()
+    if curve not in EASINGS:
+        return None
+    return ("ramp", start, dir_, parse_duration(duration, RAMP_DURATION),
+            curve)
+
+
+def fire_action(side, duration=None):
+    if side in ("L", "R", "LR"):
+        return ("fire", side, parse_duration(duration))
+
+
+def button_action(buttons, duration=None):
+    buttons = buttons.lower()
+    buttons = "".join(b for b in "abxy" if b in buttons)
+    if buttons:
+        return ("button", buttons, parse_duration(duration))
+
+
+def dpad_action(dir_, count=None):
+    try:
+        count = int(count)
+    except (TypeError, ValueError):
+        count = 1
+    count = min(4, max(1, count))
+    dir_ = dir_.lower()
+    for name in DPAD_VALUES:
+        if name in dir_:
+            return ("dpad", name, count)
+
+
+# commands parsed by the fast path: command name -> action builder
+FAST_COMMANDS = {
+    "aim": aim_action,
+    "fire": fire_action,
+    "button": button_action,
+    "dpad": dpad_action,
+}
+
+BUTTON_DELAY = 200 / 1000
+
+# irc3 copies its interpolation defaults into every section of the ini
+IRC3_DEFAULTS = ("here", "hash", "#", "##")
+
 
+def asbool(value):
+    """
+    Boolean of a config value. irc3 only converts true and false written
+    in lower case, other spellings like False, no or off stay strings.
 
-async def help_reminder(bot, channel):
-    while True:
-        bot.privmsg(channel,
-                    "Type !help to see available commands. "
-                     "Type !help <command> to see help for specific command.")
-        await asyncio.sleep(60 * 5)
+    :raises ValueError: if value is a string other than true, yes, on, 1,
+        false, no, off, 0 in any case, or empty
+    """
+    if not isinstance(value, str):
+        return bool(value)
+    word = value.strip().lower()
+    if word in ("true", "yes", "on", "1"):
+        return True
+    if word in ("false", "no", "off", "0", ""):
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def parse_controller_ids(value):
+    """
+    Bus slots of the controller_ids option: a number, numbers separated by
+    spaces, or the list irc3 makes of a value written on several lines.
+
+    :raises ValueError: if a slot isn't a number from 1 to 4, is given
+        twice, or there is none
+    """
+    if isinstance(value, int):
+        words = [value]
+    elif isinstance(value, str):
+        words = value.split()
+    else:
+        words = [word for line in value for word in str(line).split()]
+    controller_ids = []
+    for word in words:
+        try:
+            controller_id = int(word)
+        except ValueError:
+            controller_id = None
+        if controller_id not in (1, 2, 3, 4) \
+                or controller_id in controller_ids:
+            raise ValueError(
+                f"controller_ids are distinct bus slots 1 to 4, got {word!r}")
+        controller_ids.append(controller_id)
+    if not controller_ids:
+        raise ValueError("controller_ids is empty")
+    return controller_ids
+
+
+def make_combos(bot_config):
+    """
+    ComboBook with the named combos of the ctrlbot_plugin.combos section.
+    """
+    combos = {name: words for name, words
+              in bot_config.get(f"{__name__}.combos", {}).items()
+              if name not in IRC3_DEFAULTS}
+    return ComboBook(
+        combos,
+        press=BUTTON_DELAY, gap=BUTTON_DELAY,
+        max_steps=int(bot_config.get(__name__, {}).get(
+            "combo_max_steps", 16)))
+
+
+def make_parser(prefix, case_sensitive, combos):
+    """
+    Fast path parser of the FAST_COMMANDS and combos.
+    """
+    parser = CommandParser(prefix, case_sensitive)
+    builders = dict(FAST_COMMANDS, combo=combos.action)
+    for name, builder in builders.items():
+        parser.add_command(getattr(Plugin, name).__doc__, builder)
+    return parser
+
+
+def action_label(action):
+    """
+    Readable form of an action, e.g. "fire LR 200ms".
+    """
+    parts = []
+    for part in action:
+        if part is None:
+            continue
+        if isinstance(part, tuple):
+            parts.extend(part)
+        elif isinstance(part, float):
+            parts.append(f"{round(part * 1000)}ms")
+        else:
+            parts.append(str(part))
+    return " ".join(parts)
+
+
+def queued_replies(meth):
+    """
+    Decorate a command of Plugin to queue its replies in the plugin's
+    outbound instead of returning them to irc3, so they count against the
+    chat budget like every other line the plugin sends.
+    """
+    @functools.wraps(meth)
+    def wrapper(self, mask, target, args):
+        replies = meth(self, mask, target, args)
+        if replies is None:
+            return
+        # where irc3 would have replied, private messages to the sender
+        to = mask.nick if target == self.bot.nick else target
+        if isinstance(replies, str):
+            replies = [replies]
+        for reply in replies:
+            self.outbound.say(to, reply)
+    return wrapper
+
+
+HELP_REMINDER = ("Type !help to see available commands. "
+                 "Type !help <command> to see help for specific command.")
+HELP_REMINDER_INTERVAL = 60 * 5
 
 
 @irc3.plugin
 class Plugin:
     requires = [
-        "irc3.plugins.core"
+        "irc3.plugins.core",
+        "irc3.plugins.command",
     ]
 
-    def __init__(self, bot, loop=None, lib=None, ctrl=None, vctrl=None):
+    def __init__(self, bot, loop=None, old=None):
         self.bot = bot
         self.log = bot.log
         self.loop = loop if loop else asyncio.get_event_loop()
         self.config = bot.config.get(__name__, {})
         self.dll_path = self.config["dll_path"]
-        self.vxinput = lib if lib else VXInput(self.dll_path)
-        self.xinput = XInput("xinput9_1_0")
-        self.ctrl = ctrl
-        self.vctrl = vctrl
-        self.button_delay = 200 / 1000
+        self.combos = make_combos(bot.config)
+        self.passthrough_delay = float(
+            self.config.get("passthrough_delay", 1))
+        self.passthrough_pad = int(self.config.get("passthrough_pad", 1)) - 1
+        self.passthrough_rate = float(
+            self.config.get("passthrough_rate", POLLING_RATE))
+        self.commit_rate = float(self.config.get("commit_rate", POLLING_RATE))
+        self.controller_ids = parse_controller_ids(
+            self.config.get("controller_ids", 2))
+        self.poll_mode = self.config.get("mode", "direct") == "poll"
+        self.poll_rate = float(self.config.get("poll_rate", 5))
+        # never read a physical controller, XInput isn't even loaded
+        self.chat_only = asbool(self.config.get("chat_only", False))
+        # plugs in the controllers after joining a channel, see on_joined
+        self.setup_task = None
+        if old is None:
+            self.setup()
+        else:
+            self.take_over(old)
+        self.parser = None
+        if asbool(self.config.get("fast_path", True)):
+            self.install_fast_path()
+
+    def setup(self):
+        """
+        Create the FFI worker, libraries, queues and tickers of a fresh
+        instance. The libraries are loaded on first use and controllers
+        are plugged in when joining a channel, so nothing here keeps the
+        bot from connecting to chat.
+        """
+        vxinput_loader, xinput_loader = \
+            BACKENDS[self.config.get("backend", "dll")]
+        self.stats = Stats()
+        self.worker = None
+        if asbool(self.config.get("ffi_worker", True)):
+            self.worker = FFIWorker(
+                int(self.config.get("ffi_queue_size", 256)),
+                wait=self.stats.histogram("ffi_queue_wait")).start()
+            vxinput_loader = worker_loader(vxinput_loader, self.worker)
+        self.vxinput = VXInput(self.dll_path, vxinput_loader)
+        self.xinput = None
+        self.devices = None
+        if not self.chat_only:
+            self.xinput = XInput("xinput9_1_0", loader=xinput_loader)
+            self.devices = DeviceRegistry(
+                self.xinput,
+                min_backoff=float(self.config.get("device_min_backoff", 0.5)),
+                max_backoff=float(self.config.get("device_max_backoff", 8)),
+                now=self.loop.time())
+            self.devices.listeners.append(self.device_event)
+        self.vctrl = None
+        self.macros = None
+        self.ramps = None
+        self.passthrough = None
+        self.tickers = {}
+        self.pool = None
+        self.admission = Admission(
+            rate=float(self.config.get("user_rate", 2)),
+            burst=float(self.config.get("user_burst", 5)),
+            global_rate=float(self.config.get("global_rate", 0)),
+            global_burst=float(self.config.get("global_burst", 0)),
+            capacity=int(self.config.get("max_users", 10000)),
+        )
+        self.outbound = Outbound(
+            self.bot.privmsg,
+            budget=float(self.config.get("chat_budget", 20)),
+            period=float(self.config.get("chat_budget_period", 30)),
+            now=self.loop.time())
+        self.start_ticker("outbound", float(self.config.get("chat_window", 1)),
+                          self.outbound.flush)
+        outbound = self.outbound
+        self.stats.counter("outbound_sent", lambda: outbound.sent)
+        self.stats.counter("outbound_dropped", lambda: outbound.dropped)
+        self.stats.gauge("outbound_queue", lambda: len(outbound))
+        self.ingest = None
+        self.overlay = None
+        self.overlay_server = None
+        self.recorder = None
+        record_path = self.config.get("record_path")
+        if record_path:
+            self.recorder = Recorder(record_path)
+
+    def take_over(self, old):
+        """
+        Continue where old, the instance replaced by a reload, left off.
+
+        The controllers stay plugged in, holds, macros, votes, admission
+        buckets, queued chat messages and statistics are kept, and tickers
+        and workers keep running with their callbacks moved to this
+        instance, so there is no gap in the input. Settings used to create
+        those objects, e.g. backend, controller_ids, the rates and the
+        admission limits, still take a restart to change.
+        """
+        for name in ("stats", "worker", "vxinput", "xinput", "devices",
+                     "vctrl", "macros", "ramps", "passthrough", "tickers",
+                     "pool",
+                     "admission", "outbound", "ingest", "overlay",
+                     "overlay_server", "recorder"):
+            setattr(self, name, getattr(old, name))
+        if self.devices is not None:
+            listeners = self.devices.listeners
+            listeners[listeners.index(old.device_event)] = self.device_event
+        for name, ticker in self.tickers.items():
+            callback = ticker.callback
+            if getattr(callback, "__self__", None) is old:
+                ticker.callback = getattr(self, callback.__name__)
+            elif name == "passthrough":
+                # an instance of the ControllerPoll class before the reload
+                poll = ControllerPoll(self.devices, self.passthrough,
+                                      self.worker, self.loop,
+                                      self.passthrough_failed)
+                poll.ctrl = callback.ctrl
+                ticker.callback = poll
+                self.stats.counter("passthrough_busy", lambda: poll.busy)
+        if self.ingest is not None:
+            self.ingest.callback = self.ingested
+        if self.overlay is not None:
+            self.overlay.collect = self.overlay_state
+        if self.pool is not None:
+            self.register_stats()
+        self.log.info("took over %d controllers and %d tickers",
+                      len(self.pool or ()), len(self.tickers))
 
     @classmethod
     def reload(cls, old):
-        return cls(old.bot, old.loop, old.lib, old.ctrl, old.vctrl)
+        return cls(old.bot, old.loop, old)
+
+    @property
+    def ctrl(self):
+        """
+        Physical controller passed through, None if there is none.
+        """
+        ticker = self.tickers.get("passthrough")
+        return ticker.callback.ctrl if ticker is not None else None
+
+    def after_reload(self):
+        # irc3 registered Commands.on_command again
+        if self.parser is not None:
+            self.install_fast_path()
 
     @irc3.event(irc3.rfc.JOIN)
     def on_joined(self, mask, channel, **kw):
         if mask.nick == self.bot.nick:
-            asyncio.ensure_future(help_reminder(self.bot, channel))
+            self.outbound.announce(("help", channel), channel, HELP_REMINDER,
+                                   HELP_REMINDER_INTERVAL, self.loop.time())
             self.log.info("bot has joined channel: %s", channel)
-            self.log.info("available controllers: %s", self.vxinput.get_num_empty_bus_slots())
-            try:
-                if self.ctrl is None:
-                    self.ctrl = self.xinput.enumerate_devices()[0]
-                if self.vctrl is None:
-                    self.vctrl = self.vxinput.controller(2)
-
-                asyncio.ensure_future(
-                    ctrl_poll(self.loop, self.ctrl, self.vctrl)
-                )
-                self.log.info("initialized controller")
-            except Exception:
-                self.log.exception("failed to initialize controller")
+            if self.setup_task is None:
+                self.setup_task = self.loop.create_task(
+                    self.setup_controllers())
 
-    @command(permission='view')
-    def aim(self, mask, target, args):
-        """Set aiming direction in clock (1-12) or compass (N, E, S, W, NE, SE, SW, NW).
-            %%aim <dir>
+    @irc3.event(irc3.rfc.PART)
+    def on_parted(self, mask, channel, **kw):
+        if mask.nick == self.bot.nick:
+            self.outbound.drop(channel)
+            self.log.info("bot has left channel: %s", channel)
+
+    async def setup_controllers(self):
         """
-        args.pop("aim")
-        dir_ = args.get("<dir>")
-        self.vctrl.set_rs(dir_, 100)
+        Plug in the virtual controllers and start the passthrough, unless
+        a previous join did already. The DLL calls run on the FFI worker,
+        so chat is served meanwhile.
+        """
+        try:
+            if self.pool is None:
+                self.log.info(
+                    "available controllers: %s",
+                    await self.call_ffi(self.vxinput.get_num_empty_bus_slots))
+                await self.init_pool()
+            if self.devices is not None \
+                    and "passthrough" not in self.tickers:
+                poll = ControllerPoll(self.devices, self.passthrough,
+                                      self.worker, self.loop,
+                                      self.passthrough_failed)
+                self.start_ticker("passthrough", self.passthrough_rate, poll)
+                self.stats.counter("passthrough_busy", lambda: poll.busy)
+                devices = self.devices
+                self.stats.counter("device_probes", lambda: devices.probes)
+                self.stats.gauge("devices", lambda: len(devices))
+            self.log.info("initialized controller")
+        except Exception:
+            self.log.exception("failed to initialize controller")
+        finally:
+            self.setup_task = None
+
+    async def call_ffi(self, fn, *args):
+        """
+        Result of fn(*args), run on the FFI worker if there is one.
+        """
+        if self.worker is None:
+            return fn(*args)
+        return await asyncio.wrap_future(self.worker.call(fn, *args))
+
+    def SIGINT(self):
+        if self.setup_task is not None:
+            self.setup_task.cancel()
+        for ticker in self.tickers.values():
+            ticker.stop()
+        if self.ingest is not None:
+            self.ingest.stop()
+        if self.overlay_server is not None:
+            self.overlay_server.close()
+        if self.pool is not None:
+            self.pool.destroy()
+        if self.worker is not None:
+            self.worker.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def passthrough_failed(self, error):
+        """
+        Stop reading physical controllers when XInput is unusable, the bot
+        carries on with chat only.
+        """
+        self.log.error("can't read physical controllers, passthrough is "
+                       "off: %s", error)
+        ticker = self.tickers.pop("passthrough", None)
+        if ticker is not None:
+            ticker.stop()
+        self.devices = None
+
+    def device_event(self, kind, device):
+        """
+        DeviceRegistry listener, called on the thread polling the devices.
+        """
+        if kind != xinputlib.CHANGED:
+            self.log.info("controller %s %s", device.device_number, kind)
+
+    def make_pad(self, index, controller):
+        config = self.config
+        poll = None
+        if self.poll_mode:
+            poll = RollingPoll(
+                winner_keep=float(config.get("poll_winner_keep", 0)),
+                others_keep=float(config.get("poll_others_keep", 0)),
+                half_life=float(config.get("poll_half_life", 0)),
+                clock=self.loop.time,
+            )
+        return Pad(index, controller, self.commit_rate, self.loop.time(),
+                   int(config.get("chat_priority", 1)),
+                   parse_mask(config.get("chat_mask", "all")),
+                   poll, self.recorder,
+                   self.stats.histogram("chat_latency"), self.worker,
+                   self.loop.time)
+
+    async def init_pool(self):
+        """
+        Plug in the virtual controllers. Each one merges its chat commands
+        and, for passthrough_pad, the physical controller in a compositor.
+        """
+        config = self.config
+        pool = ControllerPool(self.vxinput, self.controller_ids, self.make_pad,
+                              int(config.get("max_users", 10000)))
+        pool.plug_in(await self.call_ffi(pool.connect))
+        self.pool = pool
+        self.vctrl = pool[0].controller
+        self.macros = MacroPlayer(
+            TimerWheel(self.commit_rate, now=self.loop.time()))
+        self.ramps = RampPlayer(self.commit_rate)
+        if not self.chat_only:
+            passthrough = pool[self.passthrough_pad].compositor.layer(
+                "passthrough",
+                int(config.get("passthrough_priority", 0)),
+                parse_mask(config.get("passthrough_mask", "all")))
+            self.passthrough = DelayLine.for_rate(
+                self.loop, passthrough, self.passthrough_delay,
+                self.passthrough_rate)
+        self.start_ticker("commit", self.commit_rate, self.commit)
+        if self.poll_mode:
+            self.start_ticker("poll", self.poll_rate, self.rollover)
+        self.register_stats()
+        if config.get("stats_path"):
+            self.start_ticker("stats", float(config.get("stats_interval", 60)),
+                              self.write_stats)
+        if config.get("ingest_channels"):
+            self.start_ingest()
+        if config.get("overlay_port"):
+            asyncio.ensure_future(self.start_overlay())
 
-    def _duration(self, args):
+    async def start_overlay(self):
+        """
+        Serve votes, roll-over timer and controller states to overlays.
+        """
+        config = self.config
+        self.overlay = OverlayFeed(
+            self.overlay_state,
+            client_rate=float(config.get("overlay_client_rate", 0.1)),
+            keepalive=float(config.get("overlay_keepalive", 15)))
+        self.overlay_server = await self.overlay.serve(
+            config.get("overlay_host", "127.0.0.1"),
+            int(config["overlay_port"]))
+        self.start_ticker("overlay", float(config.get("overlay_rate", 1 / 30)),
+                          self.overlay.publish)
+        overlay = self.overlay
+        self.stats.gauge("overlay_clients", lambda: len(overlay))
+
+    def overlay_state(self):
+        top = int(self.config.get("overlay_top", 10))
+        state = {}
+        for pad in self.pool:
+            prefix = f"pad{pad.index + 1}"
+            frame = pad.compositor.frame
+            state[f"{prefix}.state"] = {
+                "buttons": frame.buttons,
+                "lt": frame.left_trigger,
+                "rt": frame.right_trigger,
+                "lx": frame.l_thumb_x,
+                "ly": frame.l_thumb_y,
+                "rx": frame.r_thumb_x,
+                "ry": frame.r_thumb_y,
+            }
+            if pad.poll is not None:
+                state[f"{prefix}.votes"] = [
+                    [action_label(action), round(votes, 1)]
+                    for action, votes in pad.poll.top(top)]
+        poll_ticker = self.tickers.get("poll")
+        if poll_ticker is not None:
+            # wall clock time, overlays can't see the loop's clock
+            remaining = poll_ticker.deadline - self.loop.time()
+            state["timer"] = {
+                "period": poll_ticker.rate,
+                "rollover_at": round(time.time() + remaining, 1),
+            }
+        return state
+
+    def start_ingest(self):
+        """
+        Start worker processes reading the ingest_channels, each with its
+        own IRC connection, and submit the commands they forward.
+        """
+        channels = self.config["ingest_channels"]
+        if isinstance(channels, str):
+            channels = channels.split()
+        workers = int(self.config.get("ingest_workers", len(channels)))
+        self.ingest = Ingest(self.loop, self.ingested)
+        self.ingest.start(
+            worker_config(self.bot.config, channel_shard, number)
+            for number, channel_shard in enumerate(
+                shard(channels, workers), 1))
+        ingest = self.ingest
+        self.stats.counter("ingested", lambda: ingest.records)
+        self.stats.counter("ingest_restarts", lambda: ingest.restarts)
+        self.stats.gauge("ingest_workers", lambda: len(ingest))
+
+    def ingested(self, records):
+        for mask, action in records:
+            self.submit(action, IrcString(mask))
+
+    def start_ticker(self, name, rate, callback):
+        """
+        Call callback(now) every rate seconds. What happens to missed ticks
+        is configured by <name>_policy and <name>_max_catchup.
+        """
+        ticker = Ticker(
+            self.loop, rate, callback,
+            self.config.get(f"{name}_policy", SKIP),
+            int(self.config.get(f"{name}_max_catchup", 5)),
+            self.stats.histogram(f"{name}_jitter"))
+        self.tickers[name] = ticker.start()
+        self.stats.counter(f"{name}_missed", lambda: ticker.missed)
+        return ticker
+
+    def commit(self, now):
+        if self.worker is not None:
+            failed = self.worker.pop_failed()
+            if failed:
+                self.pool.resync(failed)
+        self.macros.tick(now)
+        self.ramps.tick(now)
+        self.pool.tick(now)
+        if self.recorder is not None:
+            self.recorder.tick()
+
+    def rollover(self, now):
+        for pad in self.pool:
+            action = pad.poll.rollover()
+            if action is not None:
+                self.perform(action, pad)
+
+    def write_stats(self, now):
+        path = self.config["stats_path"]
         try:
-            duration = int(args["<duration>"])
-        except (ValueError, TypeError):
-            duration = 200
-        return max(0, min(10000, duration)) / 1000
+            self.stats.write(path)
+        except OSError:
+            self.log.exception("failed to write stats to %s", path)
+
+    def register_stats(self):
+        """
+        Expose counters and queue depths of the pool and its helpers.
+        """
+        stats = self.stats
+        pool = self.pool
+        admission = self.admission
+        stats.counter("admitted", lambda: admission.admitted)
+        stats.counter("dropped_user", lambda: admission.dropped_user)
+        stats.counter("dropped_global", lambda: admission.dropped_global)
+        stats.counter("dll_calls", lambda: {
+            f"{pad.index + 1}.{fn}": count
+            for pad in pool for fn, count in pad.controller.calls.items()})
+        stats.gauge("users", lambda: len(admission))
+        stats.gauge("macros", lambda: len(self.macros))
+        stats.gauge("ramps", lambda: len(self.ramps))
+        stats.gauge("holds", lambda: sum(len(pad.holds) for pad in pool))
+        if self.passthrough is not None:
+            stats.gauge("passthrough_queue", lambda: len(self.passthrough))
+        worker = self.worker
+        if worker is not None:
+            stats.counter("ffi_coalesced", lambda: worker.coalesced)
+            stats.counter("ffi_rejected", lambda: worker.rejected)
+            stats.counter("ffi_failed", lambda: worker.failed)
+            stats.counter("ffi_errors", lambda: worker.errors)
+            stats.gauge("ffi_queue", lambda: len(worker))
+
+    def submit(self, action, mask=None):
+        """
+        Execute action right away, or count it as vote in poll mode.
+        Actions are built by the *_action functions, None is ignored.
+        Actions of a user mask are subject to admission control and go to
+        the user's controller, others to the first controller.
+        """
+        if action is None or self.pool is None:
+            return
+        now = self.loop.time()
+        if mask is None:
+            pad = self.pool[0]
+        elif self.admission.admit(mask, now):
+            pad = self.pool.assign(mask.nick)
+        else:
+            return
+        if pad.poll is not None:
+            pad.poll.vote(action)
+        else:
+            pad.touch(now)
+            self.perform(action, pad)
+
+    def perform(self, action, pad):
+        name, *params = action
+        result = getattr(self, "_" + name)(pad, *params)
+        if asyncio.iscoroutine(result):
+            asyncio.ensure_future(result)
+
+    def install_fast_path(self):
+        """
+        Put the fast path parser in front of irc3's command dispatch.
+
+        irc3 parses every command with docopt, which dominates the cost of
+        a chat message. The fast path commands stay registered with irc3,
+        so !help still works, but their messages never reach docopt.
+        """
+        commands = self.bot.get_plugin(Commands)
+        self.commands = commands
+        self.dispatch_command = commands.on_command
+        self.parser = make_parser(
+            commands.cmd, asbool(commands.case_sensitive), self.combos)
+        for events in self.bot.registry.events["in"].values():
+            for event in events:
+                if event.callback == commands.on_command:
+                    event.callback = self.on_command
+
+    def on_command(self, cmd, mask=None, target=None, client=None, **kw):
+        if cmd not in self.parser:
+            return self.dispatch_command(
+                cmd, mask=mask, target=target, client=client, **kw)
+        predicates, meth = self.commands[cmd.lower()]
+        has_permission = getattr(self.commands.guard, "has_permission", None)
+        if has_permission is not None \
+                and not has_permission(mask, predicates.get("permission")):
+            return
+        self.submit(self.parser.parse_command(cmd, kw.get("data")), mask)
+
+    @command(permission='view')
+    @queued_replies
+    def aim(self, mask, target, args):
+        """Set aiming direction in clock (1-12) or compass (N, E, S, W, NE, SE, SW, NW), or move there smoothly: !aim 3 to 6 over 500ms inout, curves are linear, in, out and inout.
+            %%aim <dir> [(to <end>)] [(over <duration>)] [<curve>]
+        """
+        action = aim_action(args["<dir>"], args["<end>"], args["<duration>"],
+                            args["<curve>"])
+        if action is None:
+            return ("Invalid aim, directions are clock (1-12) or compass "
+                    "and curves one of " + ", ".join(EASINGS) + ".")
+        self.submit(action, mask)
 
     @command(permission='view')
     def fire(self, mask, target, args):
         """Fire guns, L for left, R for right, LR for left and right.
             %%fire (L|R|LR) [<duration>]
         """
-        duration = self._duration(args)
-        if "L" in args["L"]:
-            self.vctrl.set_trigger_l(TRIGGER_MAX)
-            self.loop.call_later(duration, self.vctrl.set_trigger_l, 0)
-        if "R" in args["L"]:
-            self.vctrl.set_trigger_r(TRIGGER_MAX)
-            self.loop.call_later(duration, self.vctrl.set_trigger_r, 0)
+        self.submit(fire_action(args["L"], args["<duration>"]), mask)
 
     @command(permission='view')
     def button(self, mask, target, args):
         """Trigger button A, B, X, Y or combinations.
             %%button <buttons> [<duration>]
         """
-        duration = self._duration(args)
-        buttons = args["<buttons>"].lower()
-        if "a" in buttons:
-            self.vctrl.set_btn_a(True)
-            self.loop.call_later(duration, self.vctrl.set_btn_a, False)
-        if "b" in buttons:
-            self.vctrl.set_btn_b(True)
-            self.loop.call_later(duration, self.vctrl.set_btn_b, False)
-        if "x" in buttons:
-            self.vctrl.set_btn_x(True)
-            self.loop.call_later(duration, self.vctrl.set_btn_x, False)
-        if "y" in buttons:
-            self.vctrl.set_btn_y(True)
-            self.loop.call_later(duration, self.vctrl.set_btn_y, False)
+        self.submit(
+            button_action(args["<buttons>"], args["<duration>"]), mask)
 
     @command(permission='view')
-    async def dpad(self, mask, target, args):
+    def dpad(self, mask, target, args):
         """Trigger DPAD up, down, left, right.
             %%dpad <dir> [<count>]
         """
+        self.submit(dpad_action(args["<dir>"], args["<count>"]), mask)
+
+    @command(permission='view')
+    @queued_replies
+    def combo(self, mask, target, args):
+        """Play a combo of up, down, left, right, a, b, x, y, start, back, lb, rb, e.g. down right a+b. Keys joined by + are pressed together.
+            %%combo <keys>...
+        """
+        action = self.combos.action(args["<keys>"])
+        if action is None:
+            named = ", ".join(sorted(self.combos.named))
+            return (f"Invalid combo, use up to {self.combos.max_steps} keys"
+                    + (f" or one of {named}." if named else "."))
+        self.submit(action, mask)
+
+    @command(permission='view')
+    @queued_replies
+    def join(self, mask, target, args):
+        """Control another controller, from 1 to the number of controllers.
+            %%join <controller>
+        """
+        if self.pool is None:
+            return
         try:
-            count = int(args["<count>"])
-        except (TypeError, ValueError):
-            count = 1
-        count = min(4, max(1, count))
-        dpad_dir = args["<dir>"].lower()
-        if "up" in dpad_dir:
-            fn = self.vctrl.set_dpad_up
-        elif "down" in dpad_dir:
-            fn = self.vctrl.set_dpad_down
-        elif "left" in dpad_dir:
-            fn = self.vctrl.set_dpad_left
-        elif "right" in dpad_dir:
-            fn = self.vctrl.set_dpad_right
+            index = int(args["<controller>"]) - 1
+            self.pool.join(mask.nick, index)
+        except (ValueError, IndexError):
+            return f"Pick a controller from 1 to {len(self.pool)}."
+        self.outbound.status(target, ("join", mask.nick),
+                             f"{mask.nick} controls controller {index + 1}")
+
+    @command(permission='view')
+    def leave(self, mask, target, args):
+        """Leave the controller picked with !join for the one picked by your name.
+            %%leave
+        """
+        if self.pool is None:
+            return
+        self.pool.leave(mask.nick)
+        index = self.pool.assign(mask.nick).index
+        self.outbound.status(target, ("join", mask.nick),
+                             f"{mask.nick} controls controller {index + 1}")
+
+    @command(permission='admin')
+    @queued_replies
+    def stats(self, mask, target, args):
+        """Show latency, jitter and queue statistics, optionally reset the histograms.
+            %%stats [reset]
+        """
+        if args["reset"]:
+            self.stats.reset()
+            return "Statistics reset."
+        return self.stats.format()
+
+    def _aim(self, pad, dir_):
+        self.ramps.cancel(pad.chat, "right")
+        x, y = direction_to_xy(dir_, 100)
+        pad.chat.set(GamepadState.axis_rx, x)
+        pad.chat.set(GamepadState.axis_ry, y)
+
+    def _ramp(self, pad, start, end, duration, curve):
+        now = self.loop.time()
+        if start is None:
+            frame = pad.compositor.frame
+            self.ramps.glide(pad.chat, "right",
+                             (frame.r_thumb_x, frame.r_thumb_y),
+                             direction_to_xy(end, 100), duration, curve, now)
         else:
-            fn = None
-        if fn is not None:
-            for i in range(count):
-                fn(True)
-                await asyncio.sleep(self.button_delay)
-                self.vctrl.set_dpad_off()
-                await asyncio.sleep(self.button_delay)
+            self.ramps.sweep(pad.chat, "right", DIRECTION_ANGLES[start],
+                             DIRECTION_ANGLES[end], duration, curve, now)
+
+    def _fire(self, pad, side, duration):
+        if "L" in side:
+            pad.holds.press(GamepadState.trigger_l, TRIGGER_MAX, duration)
+        if "R" in side:
+            pad.holds.press(GamepadState.trigger_r, TRIGGER_MAX, duration)
+
+    def _button(self, pad, buttons, duration):
+        for button in buttons:
+            pad.holds.press(GamepadState[button], True, duration)
+
+    def _dpad(self, pad, dpad_dir, count):
+        self._combo(pad, (dpad_dir,) * count)
+
+    def _combo(self, pad, words):
+        self.macros.play(pad.holds, self.combos.timeline(words))
@@ -0,0 +1,90 @@
+# coding: utf-8
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """
+    Allow rate events per second with bursts of up to burst events.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def refill(self, now):
+        tokens = self.tokens + (now - self.stamp) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.stamp = now
+        return self.tokens
+
+    def take(self, now):
+        if self.refill(now) < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Admission:
+    """
+    Rate limit commands per user and in total.
+
+    Per user buckets are kept in a LRU of fixed capacity, users not seen
+    for a while are forgotten and start over with a full bucket. Every
+    check is O(1).
+
+    :param float rate: commands per second per user, 0 disables the limit
+    :param float burst: commands a user may send at once
+    :param float global_rate: commands per second of all users, 0 disables
+        the limit
+    :param float global_burst: commands all users may send at once
+    :param int capacity: number of users tracked
+    """
+
+    def __init__(self, rate=2.0, burst=5.0, global_rate=0.0,
+                 global_burst=0.0, capacity=10000):
+        self.rate = rate
+        self.burst = burst
+        self.capacity = capacity
+        self.buckets = OrderedDict()
+        self.global_bucket = None
+        if global_rate > 0:
+            self.global_bucket = TokenBucket(
+                global_rate, max(1.0, global_burst or global_rate))
+        self.admitted = 0
+        self.dropped_user = 0
+        self.dropped_global = 0
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def admit(self, key, now):
+        """
+        Check and count one command of user key at time now.
+
+        :return: True if the command may be executed
+        """
+        bucket = None
+        if self.rate > 0:
+            buckets = self.buckets
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = TokenBucket(self.rate, self.burst, now)
+                if len(buckets) > self.capacity:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+            if bucket.refill(now) < 1:
+                self.dropped_user += 1
+                return False
+        if self.global_bucket is not None \
+                and not self.global_bucket.take(now):
+            self.dropped_global += 1
+            return False
+        if bucket is not None:
+            bucket.tokens -= 1
+        self.admitted += 1
+        return True
@@ -0,0 +1,183 @@
+# coding: utf-8
+import operator
+from functools import reduce
+
+import xinputlib
+from vxinputlib import (
+    GamepadState, STATE_ATTRS, STATE_BUTTONS, DPAD_UP, DPAD_DOWN, DPAD_LEFT,
+    DPAD_RIGHT,
+)
+
+
+# single field GamepadState values, in definition order
+FIELDS = tuple(flag.value for flag in GamepadState)
+_DPAD = GamepadState.dpad.value
+_ATTRS = {GamepadState[field].value: attr
+          for field, attr in STATE_ATTRS.items()}
+_BUTTONS = (GamepadState.buttons & ~GamepadState.dpad).value
+_DEFAULTS = {bit: False if bit & _BUTTONS else 0 for bit in FIELDS}
+# GamepadState value -> XInput wButtons bit
+_BUTTON_BITS = {GamepadState[field].value: button
+                for field, button in STATE_BUTTONS.items()}
+_DPAD_BITS = DPAD_UP | DPAD_DOWN | DPAD_LEFT | DPAD_RIGHT
+# (GamepadState value, state attribute, wButtons bit or 0) read by
+# Layer.set_state
+_STATE_FIELDS = tuple((bit, attr, _BUTTON_BITS.get(bit, 0))
+                      for bit, attr in _ATTRS.items())
+
+
+def parse_mask(value):
+    """
+    Parse GamepadState names separated by whitespace or |, e.g.
+    "axis_l | buttons".
+    """
+    names = value.replace("|", " ").split()
+    return reduce(operator.or_, (GamepadState[n] for n in names),
+                  GamepadState(0))
+
+
+class Frame(xinputlib.GamepadState):
+    """
+    Mutable xinputlib.GamepadState, set one GamepadState field at a time.
+    """
+
+    __slots__ = ()
+
+    def set(self, bit, value):
+        if bit == _DPAD:
+            self.buttons = self.buttons & ~_DPAD_BITS | value & _DPAD_BITS
+            return
+        button = _BUTTON_BITS.get(bit)
+        if button is None:
+            setattr(self, _ATTRS[bit], value)
+        elif value:
+            self.buttons |= button
+        else:
+            self.buttons &= ~button
+
+
+class Layer:
+    """
+    Desired controller state of one input source.
+
+    A layer only claims the fields it has set. Fields it doesn't claim, or
+    that are outside its mask, fall through to layers of lower priority.
+    """
+
+    def __init__(self, compositor, name, priority, mask):
+        self.compositor = compositor
+        self.name = name
+        self.priority = priority
+        self.mask = mask.value
+        self.active = 0
+        self.values = {}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r}, {self.priority})"
+
+    def set(self, flag, value):
+        """
+        Claim a single field, e.g. layer.set(GamepadState.a, True).
+        """
+        bit = flag.value
+        self.values[bit] = value
+        self.active |= bit
+        self.compositor.dirty |= bit
+
+    def release(self, flag):
+        """
+        Stop claiming fields, they fall through to lower layers again.
+        """
+        bits = flag.value & self.active
+        self.active &= ~bits
+        self.compositor.dirty |= bits
+
+    def set_state(self, state, flags=GamepadState.all):
+        """
+        Claim the fields selected by flags with values taken from state,
+        any other field is released. Same signature as
+        Controller.set_state, so a layer can stand in for a controller.
+        """
+        flags = flags.value
+        values = self.values
+        buttons = state.buttons
+        if flags & _DPAD:
+            values[_DPAD] = buttons & _DPAD_BITS
+        for bit, attr, button in _STATE_FIELDS:
+            if flags & bit:
+                if button:
+                    values[bit] = bool(buttons & button)
+                else:
+                    values[bit] = getattr(state, attr)
+        self.compositor.dirty |= self.active | flags
+        self.active = flags
+
+    def clear(self):
+        self.release(GamepadState.all)
+
+
+class Compositor:
+    """
+    Merge the layers of all input sources into one frame per tick.
+
+    Sources write into their Layer at any time, commit() resolves each
+    field changed since the last commit to the value of the highest
+    priority layer claiming it, and sends the frame to the controller in
+    a single set_state call. Fields whose write failed stay dirty.
+
+    :param controller: vxinputlib.Controller, or anything with set_state
+    :param recorder: optional callable(frame) called with every committed
+        frame, e.g. a bound ctrlbotlib.recording.Recorder.record
+    """
+
+    def __init__(self, controller, recorder=None):
+        self.controller = controller
+        self.recorder = recorder
+        self.layers = []
+        self.frame = Frame()
+        self.dirty = 0
+        self.commits = 0
+
+    def layer(self, name, priority=0, mask=GamepadState.all):
+        """
+        Add a layer, layers with higher priority win.
+        """
+        layer = Layer(self, name, priority, mask)
+        self.layers.append(layer)
+        self.layers.sort(key=lambda l: l.priority, reverse=True)
+        return layer
+
+    def get_layer(self, name):
+        for layer in self.layers:
+            if layer.name == name:
+                return layer
+        raise KeyError(name)
+
+    def resolve(self, bit):
+        for layer in self.layers:
+            if layer.active & layer.mask & bit:
+                return layer.values[bit]
+        return _DEFAULTS[bit]
+
+    def commit(self):
+        """
+        Send changed fields to the controller.
+
+        :return: True if anything was sent
+        """
+        dirty = self.dirty
+        if not dirty:
+            return False
+        self.dirty = 0
+        frame = self.frame
+        for bit in FIELDS:
+            if dirty & bit:
+                frame.set(bit, self.resolve(bit))
+        failed = self.controller.set_state(frame, GamepadState(dirty))
+        if failed:
+            # writes the controller rejected are sent again next commit
+            self.dirty |= failed.value
+        if self.recorder is not None:
+            self.recorder(frame)
+        self.commits += 1
+        return True
@@ -0,0 +1,88 @@
+# coding: utf-8
+import math
+
+
+class DelayLine:
+    """
+    Write frames to a sink after a fixed delay.
+
+    Frames are stored in a preallocated ring buffer and drained by a single
+    event loop timer, which is only armed while frames are pending. When
+    the buffer is full, the oldest frame is written early to make room.
+
+    :param loop: asyncio event loop
+    :param sink: object with set_state(state, mask), e.g. vxinputlib.Controller
+    :param float delay: seconds between push and write
+    :param int capacity: number of frames that can be pending
+    """
+
+    # frames due within this many seconds are written by the current drain,
+    # the loop may run timers slightly early
+    resolution = 1 / 1000
+
+    def __init__(self, loop, sink, delay, capacity=128):
+        self.loop = loop
+        self.sink = sink
+        self.delay = delay
+        self.capacity = capacity
+        self._due = [0.0] * capacity
+        self._states = [None] * capacity
+        self._masks = [None] * capacity
+        self._head = 0
+        self._size = 0
+        self._timer = None
+        self.overruns = 0
+
+    @classmethod
+    def for_rate(cls, loop, sink, delay, rate):
+        """
+        Create a delay line large enough for delay seconds of frames pushed
+        every rate seconds.
+        """
+        return cls(loop, sink, delay, max(1, math.ceil(delay / rate) + 1))
+
+    def __len__(self):
+        return self._size
+
+    def push(self, state, mask):
+        if self.delay <= 0:
+            self.sink.set_state(state, mask)
+            return
+        if self._size == self.capacity:
+            self.overruns += 1
+            self._pop()
+        i = (self._head + self._size) % self.capacity
+        self._due[i] = self.loop.time() + self.delay
+        self._states[i] = state
+        self._masks[i] = mask
+        self._size += 1
+        if self._timer is None:
+            self._timer = self.loop.call_at(self._due[i], self._drain)
+
+    def _pop(self):
+        i = self._head
+        state = self._states[i]
+        self._states[i] = None
+        self._head = (i + 1) % self.capacity
+        self._size -= 1
+        self.sink.set_state(state, self._masks[i])
+
+    def _drain(self):
+        self._timer = None
+        due = self._due
+        now = self.loop.time() + self.resolution
+        while self._size and due[self._head] <= now:
+            self._pop()
+        if self._size:
+            self._timer = self.loop.call_at(due[self._head], self._drain)
+
+    def clear(self):
+        """
+        Drop all pending frames without writing them.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for i in range(self.capacity):
+            self._states[i] = None
+        self._head = self._size = 0
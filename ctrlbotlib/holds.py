@@ -0,0 +1,115 @@
+# coding: utf-8
+import math
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel.
+
+    Time advances in fixed ticks, a timer is appended to the slot of the
+    tick it expires in, so scheduling is O(1) regardless of the number of
+    pending timers. Timers further out than one revolution stay in their
+    slot until their round comes up.
+
+    :param float tick: seconds per tick, the resolution of all timers
+    :param int slots: number of slots in the wheel
+    :param float now: start time
+    """
+
+    def __init__(self, tick, slots=512, now=0.0):
+        self.tick = tick
+        self.time = now
+        self.slots = [[] for _ in range(slots)]
+        self._ticks = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def schedule(self, delay, item):
+        """
+        Schedule item to expire after delay seconds, at least one tick.
+        """
+        expires = self._ticks + max(1, math.ceil(delay / self.tick))
+        self.slots[expires % len(self.slots)].append((expires, item))
+        self.size += 1
+
+    def advance(self, now):
+        """
+        Advance to time now.
+
+        :return: list of expired items, in order of expiry
+        """
+        expired = []
+        slots = self.slots
+        count = len(slots)
+        while self.time + self.tick <= now:
+            self.time += self.tick
+            self._ticks += 1
+            if not self.size:
+                # nothing pending, jump straight to now
+                skip = int((now - self.time) / self.tick)
+                self.time += skip * self.tick
+                self._ticks += skip
+                continue
+            slot = slots[self._ticks % count]
+            if not slot:
+                continue
+            ticks = self._ticks
+            pending = [entry for entry in slot if entry[0] > ticks]
+            if len(pending) != len(slot):
+                expired.extend(item for expires, item in slot
+                               if expires <= ticks)
+                self.size -= len(slot) - len(pending)
+                slot[:] = pending
+        return expired
+
+
+class HoldScheduler:
+    """
+    Hold fields of a compositor layer pressed for a duration.
+
+    Presses of a field that overlap are merged into one hold lasting until
+    the latest of them ends, so a short press can't release a field a
+    longer press still holds. Each held field has at most one pending
+    timer in the wheel.
+
+    :param layer: ctrlbotlib.compositor.Layer
+    :param TimerWheel wheel: wheel providing time and resolution
+    """
+
+    def __init__(self, layer, wheel):
+        self.layer = layer
+        self.wheel = wheel
+        # GamepadState value -> time the hold ends
+        self.holds = {}
+
+    def __len__(self):
+        return len(self.holds)
+
+    def press(self, flag, value, duration):
+        self.layer.set(flag, value)
+        bit = flag.value
+        deadline = self.wheel.time + duration
+        current = self.holds.get(bit)
+        if current is None:
+            self.holds[bit] = deadline
+            self.wheel.schedule(duration, flag)
+        elif deadline > current:
+            self.holds[bit] = deadline
+
+    def tick(self, now):
+        """
+        Release fields whose hold ended before now.
+        """
+        wheel = self.wheel
+        for flag in wheel.advance(now):
+            bit = flag.value
+            if bit not in self.holds:
+                continue
+            remaining = self.holds[bit] - wheel.time
+            if remaining >= wheel.tick / 2:
+                wheel.schedule(remaining, flag)
+            else:
+                del self.holds[bit]
+                self.layer.release(flag)
@@ -0,0 +1,277 @@
+# coding: utf-8
+"""
+Chat ingestion in worker processes.
+
+Each worker process runs its own irc3 bot with its own IRC connection to
+a shard of the channels. It parses chat commands with the fast path
+parser and forwards compact records, (user mask, action) tuples batched
+and serialized with marshal, over a pipe to the process owning the
+controllers. There they are submitted like commands read by the owner
+itself. Parsing scales with the number of processes instead of sharing
+one GIL with the controller output.
+
+Workers only parse the fast path commands and don't check command
+permissions, the owner still applies its admission control. Each worker
+connects with the owner's nick suffixed with its number, e.g. botname_1,
+and a worker that exits is started again after a backoff.
+"""
+import asyncio
+import logging
+import marshal
+import multiprocessing
+import threading
+
+import irc3
+
+
+log = logging.getLogger(__name__)
+
+# config keys of the bot section not passed on to workers
+_LOCAL_KEYS = ("loop", "autojoins", "includes")
+
+
+def shard(channels, workers):
+    """
+    Spread channels round robin over at most workers lists.
+    """
+    shards = [[] for _ in range(min(workers, len(channels)))]
+    for i, channel in enumerate(channels):
+        shards[i % len(shards)].append(channel)
+    return shards
+
+
+def worker_config(config, channels, number):
+    """
+    Config of worker number joining channels, based on the owner's config.
+    """
+    worker = {key: value for key, value in config.items()
+              if key not in _LOCAL_KEYS
+              and isinstance(value, (str, int, float, bool, list, dict))}
+    if "nick" in worker:
+        worker["nick"] = f"{worker['nick']}_{number}"
+    worker["autojoins"] = list(channels)
+    worker["includes"] = ["irc3.plugins.core", __name__]
+    return worker
+
+
+class Forwarder:
+    """
+    Send records over conn in batches.
+
+    A batch is sent when it has max_batch records or delay seconds after
+    its first record, whichever comes first.
+
+    :param conn: multiprocessing.connection.Connection to the owner
+    :param loop: asyncio event loop
+    :param float delay: maximum seconds a record waits for its batch
+    :param int max_batch: maximum number of records per batch
+    """
+
+    def __init__(self, conn, loop, delay=0.005, max_batch=256):
+        self.conn = conn
+        self.loop = loop
+        self.delay = delay
+        self.max_batch = max_batch
+        self.batch = []
+        self._handle = None
+        self.records = 0
+        self.batches = 0
+
+    def send(self, record):
+        self.batch.append(record)
+        if len(self.batch) >= self.max_batch:
+            self.flush()
+        elif self._handle is None:
+            self._handle = self.loop.call_later(self.delay, self.flush)
+
+    def flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        try:
+            self.conn.send_bytes(marshal.dumps(batch))
+        except OSError:
+            # the owner is gone, so is our purpose
+            log.exception("failed to forward records, stopping")
+            self.loop.stop()
+            return
+        self.records += len(batch)
+        self.batches += 1
+
+
+@irc3.plugin
+class IngestPlugin:
+    """
+    irc3 plugin of worker bots, forwarding fast path commands to the
+    owner through bot.ingest_forwarder.
+    """
+
+    requires = [
+        "irc3.plugins.core",
+    ]
+
+    def __init__(self, bot):
+        # imported here, ctrlbot_plugin imports this module
+        import ctrlbot_plugin
+        self.bot = bot
+        command_config = bot.config.get("irc3.plugins.command", {})
+        self.parser = ctrlbot_plugin.make_parser(
+            command_config.get("cmd", bot.config.get("cmd", "!")),
+            ctrlbot_plugin.asbool(
+                command_config.get("casesensitive", False)),
+            ctrlbot_plugin.make_combos(bot.config))
+
+    @irc3.event(irc3.rfc.PRIVMSG)
+    def on_privmsg(self, mask=None, event=None, target=None, data=None,
+                   **kw):
+        if event != "PRIVMSG" or not target.is_channel:
+            return
+        action = self.parser.parse(data)
+        if action is not None:
+            self.bot.ingest_forwarder.send((str(mask), action))
+
+
+def run_worker(config, conn):
+    """
+    Main function of a worker process.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    bot = irc3.IrcBot.from_config(config, loop=loop)
+    bot.ingest_forwarder = Forwarder(conn, loop)
+    bot.run(forever=True)
+
+
+class Worker:
+    """
+    Worker process and the config it is started again with.
+    """
+
+    __slots__ = ("name", "config", "process", "started_at", "backoff",
+                 "restart")
+
+    def __init__(self, name, config, backoff):
+        self.name = name
+        self.config = config
+        # None while the worker waits for its restart
+        self.process = None
+        self.started_at = 0.0
+        self.backoff = backoff
+        self.restart = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r})"
+
+
+class Ingest:
+    """
+    Run worker processes and pass the records they send to
+    callback(records) on the event loop.
+
+    Each pipe is read by a thread, so this works with any event loop. When
+    a worker exits, its pipe is closed and it is started again after
+    min_backoff seconds, doubling on every exit up to max_backoff. A
+    worker that ran for max_backoff seconds starts over at min_backoff.
+
+    :param loop: asyncio event loop of the owner
+    :param callback: callable receiving a list of (mask, action) records
+    :param target: main function of the worker processes,
+        target(config, conn)
+    :param float min_backoff: seconds before the first restart of a worker
+    :param float max_backoff: maximum seconds before a restart
+    """
+
+    def __init__(self, loop, callback, context=None, target=run_worker,
+                 min_backoff=1.0, max_backoff=60.0):
+        self.loop = loop
+        self.callback = callback
+        self.context = context or multiprocessing.get_context("spawn")
+        self.target = target
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.workers = []
+        self._stopping = False
+        self.records = 0
+        self.batches = 0
+        self.restarts = 0
+
+    def __len__(self):
+        return sum(worker.process is not None for worker in self.workers)
+
+    def start(self, configs):
+        """
+        Start one worker per config, see worker_config.
+        """
+        for config in configs:
+            worker = Worker(f"ingest-{len(self.workers) + 1}", config,
+                            self.min_backoff)
+            self.workers.append(worker)
+            self._spawn(worker)
+            log.info("started %s for %s", worker.name,
+                     " ".join(config["autojoins"]))
+
+    def stop(self, timeout=5.0):
+        self._stopping = True
+        for worker in self.workers:
+            if worker.restart is not None:
+                worker.restart.cancel()
+                worker.restart = None
+            if worker.process is not None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout)
+                worker.process = None
+        self.workers.clear()
+
+    def _spawn(self, worker):
+        worker.restart = None
+        reader, writer = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=self.target, args=(worker.config, writer), daemon=True,
+            name=worker.name)
+        process.start()
+        writer.close()
+        worker.process = process
+        worker.started_at = self.loop.time()
+        threading.Thread(
+            target=self._read, args=(worker, process, reader),
+            name=f"{worker.name}-reader", daemon=True).start()
+
+    def _read(self, worker, process, conn):
+        with conn:
+            while True:
+                try:
+                    data = conn.recv_bytes()
+                except (EOFError, OSError):
+                    break
+                self.loop.call_soon_threadsafe(
+                    self._received, marshal.loads(data))
+        # the worker closed its end of the pipe, it is exiting
+        process.join()
+        if not self._stopping:
+            self.loop.call_soon_threadsafe(self._exited, worker, process)
+
+    def _received(self, records):
+        self.records += len(records)
+        self.batches += 1
+        self.callback(records)
+
+    def _exited(self, worker, process):
+        if self._stopping or worker.process is not process:
+            return
+        worker.process = None
+        if self.loop.time() - worker.started_at >= self.max_backoff:
+            worker.backoff = self.min_backoff
+        log.warning("%s exited with code %s, restarting in %.1f seconds",
+                    worker.name, process.exitcode, worker.backoff)
+        worker.restart = self.loop.call_later(
+            worker.backoff, self._restart, worker)
+        worker.backoff = min(worker.backoff * 2, self.max_backoff)
+
+    def _restart(self, worker):
+        self.restarts += 1
+        self._spawn(worker)
@@ -0,0 +1,218 @@
+# coding: utf-8
+"""
+Combos: sequences of controller inputs played back over time.
+
+A combo is written as words, e.g. "up up down a+b x:500 - start":
+
+    up, down, left, right       dpad directions
+    a, b, x, y, start, back,    buttons
+    lb, rb
+    a+b, up+left                pressed together
+    a:500                       held for 500 ms instead of the default
+    -                           a pause of one step
+
+Combos are compiled once into an immutable timeline and cached. All
+running combos are played by one MacroPlayer, a running combo costs a
+cursor in its timer wheel, not a coroutine.
+"""
+from vxinputlib import (
+    DPAD_UP, DPAD_DOWN, DPAD_LEFT, DPAD_RIGHT, GamepadState,
+)
+
+
+# word -> (GamepadState, value), values of the same field are or-ed
+KEYS = {
+    "up": (GamepadState.dpad, DPAD_UP),
+    "down": (GamepadState.dpad, DPAD_DOWN),
+    "left": (GamepadState.dpad, DPAD_LEFT),
+    "right": (GamepadState.dpad, DPAD_RIGHT),
+}
+KEYS.update((name, (GamepadState[name], True))
+            for name in ("a", "b", "x", "y", "start", "back", "lb", "rb"))
+
+PAUSE = "-"
+MAX_HOLD = 10.0
+
+
+def parse_key(word, press):
+    """
+    Parse one combo word.
+
+    :return: (tuple of (GamepadState, value), seconds held), the tuple is
+        empty for a pause
+    :raises ValueError: for unknown keys or invalid hold times
+    """
+    chord, _, hold = word.partition(":")
+    duration = press
+    if hold:
+        duration = max(0, min(MAX_HOLD * 1000, int(hold))) / 1000
+    if chord == PAUSE:
+        return (), duration
+    values = {}
+    for key in chord.split("+"):
+        try:
+            flag, value = KEYS[key]
+        except KeyError:
+            raise ValueError(f"unknown key {key!r}")
+        if flag is GamepadState.dpad:
+            value |= values.get(flag, 0)
+        values[flag] = value
+    return tuple(values.items()), duration
+
+
+def compile_combo(words, press=0.2, gap=0.2):
+    """
+    Compile combo words into a timeline.
+
+    :param words: normalized combo words, see ComboBook.normalize
+    :param float press: seconds a key is held by default
+    :param float gap: seconds between releasing a step and the next step
+    :return: tuple of (offset, GamepadState, value, duration), sorted by
+        offset in seconds from the start of the combo
+    """
+    timeline = []
+    offset = 0.0
+    for word in words:
+        presses, duration = parse_key(word, press)
+        for flag, value in presses:
+            timeline.append((offset, flag, value, duration))
+        offset += duration + gap
+    return tuple(timeline)
+
+
+class ComboBook:
+    """
+    Named combos and the cache of compiled timelines.
+
+    :param dict combos: name -> combo words, as string or list of strings.
+        Names can be used as words in other combos.
+    :param float press: seconds a key is held by default
+    :param float gap: seconds between steps
+    :param int max_steps: maximum number of steps of a combo
+    :param int max_cache: cached timelines beyond this clear the cache
+    :raises ValueError: if a named combo is invalid
+    """
+
+    def __init__(self, combos=None, press=0.2, gap=0.2, max_steps=16,
+                 max_cache=1024):
+        self.press = press
+        self.gap = gap
+        self.max_steps = max_steps
+        self.max_cache = max_cache
+        self.named = {}
+        self._cache = {}
+        for name, words in (combos or {}).items():
+            if not isinstance(words, str):
+                words = " ".join(words)
+            try:
+                self.named[name.lower()] = self.normalize(words.split())
+            except ValueError as e:
+                raise ValueError(f"combo {name!r}: {e}")
+
+    def normalize(self, words):
+        """
+        Lower case words with named combos expanded.
+
+        :return: tuple of words
+        :raises ValueError: if a word is invalid or the combo is too long
+        """
+        result = []
+        for word in words:
+            word = word.lower()
+            named = self.named.get(word)
+            if named is not None:
+                result.extend(named)
+            else:
+                parse_key(word, self.press)
+                result.append(word)
+        if not result or len(result) > self.max_steps:
+            raise ValueError(f"combos have 1 to {self.max_steps} steps")
+        return tuple(result)
+
+    def action(self, words):
+        """
+        Action playing words, for the command parser.
+
+        :param words: string or list of words
+        :return: ("combo", words), or None if words are invalid
+        """
+        if isinstance(words, str):
+            words = words.split()
+        try:
+            return ("combo", self.normalize(words))
+        except ValueError:
+            return None
+
+    def timeline(self, words):
+        """
+        Compiled timeline of normalized words, compiled on first use.
+        """
+        timeline = self._cache.get(words)
+        if timeline is None:
+            # chat picks the words, don't keep every combo ever played
+            if len(self._cache) >= self.max_cache:
+                self._cache.clear()
+            timeline = self._cache[words] = \
+                compile_combo(words, self.press, self.gap)
+        return timeline
+
+
+class Cursor:
+    """
+    Position of a running combo in its timeline.
+    """
+
+    __slots__ = ("holds", "timeline", "start", "index")
+
+    def __init__(self, holds, timeline, start):
+        self.holds = holds
+        self.timeline = timeline
+        self.start = start
+        self.index = 0
+
+
+class MacroPlayer:
+    """
+    Play timelines on hold schedulers, driven by tick().
+
+    :param wheel: ctrlbotlib.holds.TimerWheel providing time and resolution
+    """
+
+    def __init__(self, wheel):
+        self.wheel = wheel
+        self.running = 0
+
+    def __len__(self):
+        return self.running
+
+    def play(self, holds, timeline):
+        """
+        Start playing timeline on holds, a ctrlbotlib.holds.HoldScheduler.
+        Steps at offset 0 are pressed right away.
+        """
+        if not timeline:
+            return
+        cursor = Cursor(holds, timeline, self.wheel.time)
+        self.running += 1
+        self._advance(cursor, self.wheel.time)
+
+    def tick(self, now):
+        for cursor in self.wheel.advance(now):
+            self._advance(cursor, self.wheel.time)
+
+    def _advance(self, cursor, now):
+        timeline = cursor.timeline
+        elapsed = now - cursor.start
+        index = cursor.index
+        press = cursor.holds.press
+        # steps due within half a tick are pressed now, not a tick late
+        due = elapsed + self.wheel.tick / 2
+        while index < len(timeline) and timeline[index][0] <= due:
+            offset, flag, value, duration = timeline[index]
+            press(flag, value, duration)
+            index += 1
+        cursor.index = index
+        if index < len(timeline):
+            self.wheel.schedule(timeline[index][0] - elapsed, cursor)
+        else:
+            self.running -= 1
@@ -0,0 +1,114 @@
+# coding: utf-8
+from collections import OrderedDict, deque
+
+from .admission import TokenBucket
+
+
+class Outbound:
+    """
+    Chat messages sent within a flood budget.
+
+    Three kinds of messages are queued:
+
+    * announcements, repeated every interval seconds. They are keyed, so
+      announcing a key again replaces it instead of adding another one.
+    * status updates, keyed per target. Updates pending in the same window
+      are merged into one line, a newer update of a key replaces the older.
+    * plain messages, sent once in order.
+
+    flush() is called once per window. It turns due announcements and
+    pending status updates into lines and sends as many queued lines as
+    the budget allows, the rest wait for the next window.
+
+    :param send: callable(target, line), e.g. bot.privmsg
+    :param float budget: lines per period
+    :param float period: seconds, Twitch allows 20 lines per 30 seconds
+    :param float burst: lines that may be sent at once, budget by default
+    :param int max_queue: queued lines beyond this drop the oldest
+    :param int max_length: maximum length of a merged status line
+    """
+
+    def __init__(self, send, budget=20, period=30.0, burst=None,
+                 max_queue=100, max_length=450, now=0.0):
+        self.send = send
+        self.bucket = TokenBucket(budget / period, burst or budget, now)
+        self.max_queue = max_queue
+        self.max_length = max_length
+        # key -> [target, message, interval, next due time]
+        self.announcements = {}
+        # target -> {key: text}
+        self.statuses = OrderedDict()
+        self.queue = deque()
+        self.sent = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def announce(self, key, target, message, interval, now=0.0):
+        """
+        Send message to target now and every interval seconds, replacing
+        any announcement of key. An existing announcement of key keeps its
+        schedule.
+        """
+        current = self.announcements.get(key)
+        due = now if current is None else current[3]
+        self.announcements[key] = [target, message, interval, due]
+
+    def cancel(self, key):
+        self.announcements.pop(key, None)
+
+    def status(self, target, key, text):
+        """
+        Queue a status update for the next window.
+        """
+        self.statuses.setdefault(target, OrderedDict())[key] = text
+
+    def say(self, target, message):
+        self._enqueue(target, message)
+
+    def drop(self, target):
+        """
+        Drop announcements, status updates and queued lines to target,
+        e.g. a channel the bot left.
+        """
+        for key, announcement in list(self.announcements.items()):
+            if announcement[0] == target:
+                del self.announcements[key]
+        self.statuses.pop(target, None)
+        self.queue = deque(line for line in self.queue if line[0] != target)
+
+    def _enqueue(self, target, line):
+        if len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((target, line))
+
+    def _merge(self, texts):
+        line = ""
+        for text in texts:
+            if line and len(line) + 3 + len(text) > self.max_length:
+                yield line
+                line = ""
+            line = f"{line} | {text}" if line else text
+        if line:
+            yield line
+
+    def flush(self, now):
+        """
+        Queue due announcements and merged status updates, then send what
+        the budget allows.
+        """
+        for announcement in self.announcements.values():
+            target, message, interval, due = announcement
+            if due <= now:
+                self._enqueue(target, message)
+                announcement[3] = max(due + interval, now)
+        for target, texts in self.statuses.items():
+            for line in self._merge(texts.values()):
+                self._enqueue(target, line)
+        self.statuses.clear()
+        queue = self.queue
+        while queue and self.bucket.take(now):
+            self.send(*queue.popleft())
+            self.sent += 1
@@ -0,0 +1,198 @@
+# coding: utf-8
+"""
+Server-Sent Events feed for stream overlays.
+
+Clients connect to http://<host>:<port>/events, e.g. from an OBS browser
+source, and receive a "snapshot" event with the full state followed by
+"delta" events with the keys that changed, removed keys are null:
+
+    event: snapshot
+    data: {"pad1.votes": [["aim NE", 3.0]], "pad1.state": {...}}
+
+    event: delta
+    data: {"pad1.votes": [["aim NE", 4.0]]}
+
+Each client gets the delta from the last state it received, so a client
+that can't take every version, because of its own rate limit or a full
+send buffer, gets the changes of all versions it missed in one delta.
+Deltas are serialized once per version a client has, snapshots once per
+version, no matter how many clients are connected. Clients that haven't
+been sent anything for keepalive seconds get an SSE comment, so proxies
+don't close the idle connection:
+
+    : keepalive
+"""
+import asyncio
+import json
+import logging
+
+
+log = logging.getLogger(__name__)
+
+_HEADERS = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"Connection: keep-alive\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"\r\n"
+)
+_NOT_FOUND = (
+    b"HTTP/1.1 404 Not Found\r\n"
+    b"Content-Length: 0\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+)
+_KEEPALIVE = b": keepalive\n\n"
+_MISSING = object()
+
+
+def _diff(old, new):
+    """
+    Keys of new with a different value in old, and keys removed from old
+    as None.
+    """
+    delta = {key: value for key, value in new.items()
+             if old.get(key, _MISSING) != value}
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
+
+
+def _event(name, data):
+    data = json.dumps(data, separators=(",", ":"))
+    return f"event: {name}\ndata: {data}\n\n".encode()
+
+
+class Client:
+
+    __slots__ = ("writer", "version", "state", "sent_at")
+
+    def __init__(self, writer):
+        self.writer = writer
+        # state version the client has and that state, None before its
+        # first snapshot
+        self.version = None
+        self.state = None
+        self.sent_at = float("-inf")
+
+
+class OverlayFeed:
+    """
+    Publish the values returned by collect() to SSE clients.
+
+    :param collect: callable returning a dict of key -> JSON serializable
+        value, called on every publish
+    :param float client_rate: minimum seconds between events to one client
+    :param int buffer_limit: bytes buffered for a client before it is
+        skipped
+    :param float keepalive: seconds without events before a client is
+        sent a keepalive comment
+    """
+
+    def __init__(self, collect, client_rate=0.1, buffer_limit=64 * 1024,
+                 keepalive=15.0):
+        self.collect = collect
+        self.client_rate = client_rate
+        self.buffer_limit = buffer_limit
+        self.keepalive = keepalive
+        self.state = {}
+        self.version = 0
+        self.clients = []
+        # client version -> delta event to the current version
+        self._deltas = {}
+        self._snapshot = None
+        self._snapshot_version = None
+        self.events = 0
+        self.keepalives = 0
+
+    def __len__(self):
+        return len(self.clients)
+
+    def snapshot(self):
+        """
+        Snapshot event of the current state, serialized once per version.
+        """
+        if self._snapshot_version != self.version:
+            self._snapshot = _event("snapshot", self.state)
+            self._snapshot_version = self.version
+        return self._snapshot
+
+    def publish(self, now):
+        """
+        Collect the state and send each client what it is missing.
+        """
+        values = self.collect()
+        if values != self.state:
+            self.state = values
+            self.version += 1
+            self._deltas = {}
+        if not self.clients:
+            return
+        deltas = self._deltas
+        for client in self.clients:
+            if client.version == self.version:
+                if now - client.sent_at < self.keepalive:
+                    continue
+                data = _KEEPALIVE
+            elif now - client.sent_at < self.client_rate:
+                continue
+            elif client.version is None:
+                data = self.snapshot()
+            else:
+                data = deltas.get(client.version)
+                if data is None:
+                    changes = _diff(client.state, self.state)
+                    data = deltas[client.version] = (
+                        _event("delta", changes) if changes else b"")
+            transport = client.writer.transport
+            if transport.is_closing() \
+                    or transport.get_write_buffer_size() > self.buffer_limit:
+                continue
+            client.version = self.version
+            client.state = self.state
+            if not data:
+                # changes the client missed were undone since
+                continue
+            client.writer.write(data)
+            client.sent_at = now
+            if data is _KEEPALIVE:
+                self.keepalives += 1
+            else:
+                self.events += 1
+
+    async def handle(self, reader, writer):
+        """
+        asyncio.start_server callback.
+        """
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError):
+            writer.close()
+            return
+        method, path, *_ = request.split(b" ", 2) + [b""]
+        if method != b"GET" or path.split(b"?")[0] != b"/events":
+            writer.write(_NOT_FOUND)
+            writer.close()
+            return
+        writer.write(_HEADERS)
+        client = Client(writer)
+        self.clients.append(client)
+        try:
+            # clients don't send anything, wait for them to go away
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.remove(client)
+            writer.close()
+
+    async def serve(self, host, port):
+        """
+        Start listening, returns the asyncio server.
+        """
+        server = await asyncio.start_server(self.handle, host, port)
+        log.info("overlay feed on http://%s:%s/events", host, port)
+        return server
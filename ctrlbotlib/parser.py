@@ -0,0 +1,213 @@
+# coding: utf-8
+"""
+Fast path for high volume chat commands.
+
+Compiles the docopt usage lines of irc3 commands, e.g.::
+
+    %%fire (L|R|LR) [<duration>]
+
+into one regular expression per command. Matching a message is a prefix
+check, a dict lookup and a single regex match, docopt is not involved.
+
+Supported usage syntax, read like docopt does: literal words,
+<argument> or ARGUMENT, <argument>... (one or more words), (a|b|c)
+alternatives of literal words, (required groups) and [optional] parts.
+Literals match case sensitive.
+
+Like in docopt, each part of an optional matches on its own, [to <end>]
+is [to] [<end>], write [(to <end>)] for words that go together. Upper
+case words are arguments, (L|R|LR) matches any word like <side> does.
+"""
+import re
+
+
+_TOKENS = re.compile(r"\.\.\.|[()\[\]|]|<[^>]+>|[^\s()\[\]|.]+")
+# separates elements, it matches nothing at the start of the arguments
+# or after whitespace, so optional elements that didn't match leave no
+# whitespace to be matched
+_SEPARATOR = r"\s*(?<!\S)"
+_ARGUMENT = r"(\S+)"
+
+
+def _is_argument(token):
+    return token.startswith("<") or token.isupper()
+
+
+def _compile_elements(tokens, end=None):
+    """
+    Consume tokens up to end, return list of (optional, regex) tuples.
+    """
+    elements = []
+    while tokens:
+        token = tokens.pop(0)
+        if token == end:
+            return elements
+        if token == "[":
+            elements.extend((True, regex) for optional, regex
+                            in _compile_elements(tokens, "]"))
+        elif token == "(":
+            elements.append((False, _compile_group(tokens)))
+        elif token == "...":
+            if not elements or elements[-1][1] != _ARGUMENT:
+                raise ValueError("... is only supported after <argument>")
+            elements[-1] = (elements[-1][0], r"(\S+(?:\s+\S+)*)")
+        elif token in (")", "]", "|"):
+            raise ValueError(f"unexpected {token!r}")
+        elif _is_argument(token):
+            elements.append((False, _ARGUMENT))
+        else:
+            elements.append((False, re.escape(token)))
+    if end is not None:
+        raise ValueError(f"missing {end!r}")
+    return elements
+
+
+def _compile_group(tokens):
+    """
+    Consume the tokens of a group up to its ), return its regex.
+    """
+    alternatives = [[]]
+    depth = 0
+    while True:
+        if not tokens:
+            raise ValueError("missing ')'")
+        token = tokens.pop(0)
+        if token in ("(", "["):
+            depth += 1
+        elif token in (")", "]"):
+            if not depth:
+                if token == "]":
+                    raise ValueError(f"unexpected {token!r}")
+                break
+            depth -= 1
+        elif token == "|" and not depth:
+            alternatives.append([])
+            continue
+        alternatives[-1].append(token)
+    if len(alternatives) == 1:
+        # a required group, e.g. (to <end>)
+        return _join(_compile_elements(alternatives[0]), "")
+    words = []
+    for alternative in alternatives:
+        if len(alternative) != 1 or alternative[0][0] in "()[]|.":
+            raise ValueError(
+                f"only alternatives of single words are supported, "
+                f"got {' '.join(alternative)!r}")
+        words.append(alternative[0])
+    arguments = sum(map(_is_argument, words))
+    if arguments == len(words):
+        # docopt matches the first one, which takes any word
+        return _ARGUMENT
+    if arguments:
+        raise ValueError("alternatives mix literals and arguments")
+    return "(" + "|".join(map(re.escape, words)) + ")"
+
+
+def _join(elements, first_separator):
+    parts = []
+    for i, (optional, regex) in enumerate(elements):
+        separator = first_separator if i == 0 else _SEPARATOR
+        if optional:
+            parts.append(f"(?:{separator}{regex})?")
+        else:
+            parts.append(separator + regex)
+    return "".join(parts)
+
+
+def compile_usage(usage):
+    """
+    Compile one usage line.
+
+    :param str usage: e.g. "%%fire (L|R|LR) [<duration>]"
+    :return: (command name, compiled regex matching the arguments)
+    """
+    tokens = _TOKENS.findall(usage.strip().lstrip("%"))
+    if not tokens:
+        raise ValueError(f"empty usage {usage!r}")
+    name = tokens.pop(0)
+    pattern = _join(_compile_elements(tokens), r"\s*") + r"\s*"
+    return name, re.compile(pattern)
+
+
+def usage_lines(doc):
+    """
+    Usage lines of an irc3 command docstring.
+    """
+    return [line.strip() for line in (doc or "").splitlines()
+            if line.strip().startswith("%%")]
+
+
+class CommandParser:
+    """
+    Map chat messages to actions.
+
+    Each command has one or more usage patterns and a builder. The builder
+    is called with the matched arguments in order of appearance, missing
+    optional arguments are None, and returns an action or None to reject
+    the message.
+
+    :param str prefix: command prefix, ! by default
+    :param bool case_sensitive: if False command names match ignoring case
+    """
+
+    def __init__(self, prefix="!", case_sensitive=False):
+        self.prefix = prefix
+        self.case_sensitive = case_sensitive
+        self.commands = {}
+        self._match_name = None
+
+    def __contains__(self, name):
+        if not self.case_sensitive:
+            name = name.lower()
+        return name in self.commands
+
+    def add(self, usage, builder):
+        name, pattern = compile_usage(usage)
+        if not self.case_sensitive:
+            name = name.lower()
+        self.commands.setdefault(name, []).append((pattern.fullmatch, builder))
+        names = "|".join(sorted(map(re.escape, self.commands),
+                                key=len, reverse=True))
+        flags = 0 if self.case_sensitive else re.IGNORECASE
+        self._match_name = re.compile(
+            rf"{re.escape(self.prefix)}({names})(?:\s+|$)", flags).match
+
+    def add_command(self, doc, builder):
+        """
+        Add all usage lines of an irc3 command docstring.
+        """
+        for usage in usage_lines(doc):
+            self.add(usage, builder)
+
+    def parse_command(self, name, data):
+        """
+        Parse the arguments of a known command.
+
+        :param str name: command name without prefix
+        :param str data: arguments, or None
+        :return: action, or None if the arguments don't match
+        """
+        if not self.case_sensitive:
+            name = name.lower()
+        patterns = self.commands.get(name)
+        if patterns is None:
+            return None
+        for match, builder in patterns:
+            m = match(data or "")
+            if m is not None:
+                return builder(*m.groups())
+        return None
+
+    def parse(self, text):
+        """
+        Parse a raw chat message.
+
+        :return: action, or None if text is not a known command or the
+            arguments don't match
+        """
+        if not text.startswith(self.prefix) or self._match_name is None:
+            return None
+        m = self._match_name(text)
+        if m is None:
+            return None
+        return self.parse_command(m.group(1), text[m.end():])
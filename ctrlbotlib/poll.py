@@ -0,0 +1,127 @@
+# coding: utf-8
+import heapq
+import math
+import time
+from operator import itemgetter
+
+
+class RollingPoll:
+    """
+    Vote counter for the rolling poll.
+
+    Votes are counted per key, any hashable command works as key. Time decay
+    is applied lazily: instead of shrinking every counter as time passes,
+    new votes get a weight that grows with time, so relative order is
+    preserved and a vote stays a single dict update. The leading key is
+    tracked on every vote, the full counter table is only scanned once per
+    roll-over.
+
+    :param float winner_keep: fraction of votes the winning key keeps after
+        roll-over, 0 executes a command once, 1 keeps executing it
+    :param float others_keep: fraction of votes all other keys keep after
+        roll-over
+    :param float half_life: seconds after which a vote counts half, 0
+        disables decay
+    :param clock: callable returning monotonic time in seconds
+    """
+
+    # rebase vote weights once they grow past this to stay in float range
+    max_weight = 2.0 ** 64
+    # votes with less weight than this are dropped on roll-over
+    min_votes = 1 / 100
+
+    def __init__(self, winner_keep=0.0, others_keep=0.0, half_life=0.0,
+                 clock=time.monotonic):
+        self.winner_keep = winner_keep
+        self.others_keep = others_keep
+        self.clock = clock
+        self._rate = math.log(2) / half_life if half_life > 0 else 0.0
+        self._epoch = clock()
+        self._weight = 1.0
+        self._votes = {}
+        self._leader = None
+
+    def __len__(self):
+        return len(self._votes)
+
+    def __contains__(self, key):
+        return key in self._votes
+
+    @property
+    def leader(self):
+        return self._leader
+
+    def _current_weight(self):
+        if not self._rate:
+            return 1.0
+        weight = math.exp(self._rate * (self.clock() - self._epoch))
+        if weight > self.max_weight:
+            self._rebase(weight)
+            weight = 1.0
+        return weight
+
+    def _rebase(self, weight):
+        votes = self._votes
+        for key in votes:
+            votes[key] /= weight
+        self._epoch = self.clock()
+        self._weight = 1.0
+
+    def vote(self, key, count=1):
+        """
+        Add votes for key.
+
+        :return: current vote count of key
+        """
+        weight = self._weight = self._current_weight()
+        votes = self._votes
+        score = votes.get(key, 0.0) + weight * count
+        votes[key] = score
+        leader = self._leader
+        if leader is None or score > votes[leader]:
+            self._leader = key
+        return score / weight
+
+    def votes(self, key):
+        return self._votes.get(key, 0.0) / self._current_weight()
+
+    def top(self, count):
+        """
+        Keys with most votes, most votes first.
+
+        :return: list of (key, votes) tuples
+        """
+        weight = self._current_weight()
+        return [
+            (key, score / weight)
+            for key, score in heapq.nlargest(
+                count, self._votes.items(), key=itemgetter(1))
+        ]
+
+    def rollover(self):
+        """
+        Close the current round and apply the roll-over policies.
+
+        :return: winning key, or None if there were no votes
+        """
+        winner = self._leader
+        if winner is None:
+            return None
+        votes = self._votes
+        winner_score = votes[winner] * self.winner_keep
+        if self.others_keep <= 0:
+            votes.clear()
+        elif self.others_keep < 1:
+            keep = self.others_keep
+            for key in votes:
+                votes[key] *= keep
+        votes[winner] = winner_score
+        threshold = self.min_votes * self._current_weight()
+        for key in [k for k, v in votes.items() if v < threshold]:
+            del votes[key]
+        self._leader = max(votes, key=votes.__getitem__) if votes else None
+        return winner
+
+    def clear(self):
+        self._votes.clear()
+        self._leader = None
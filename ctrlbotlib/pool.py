@@ -0,0 +1,215 @@
+# coding: utf-8
+import logging
+import time
+import zlib
+from collections import OrderedDict
+
+from vxinputlib import GamepadState
+
+from .compositor import Compositor
+from .holds import HoldScheduler, TimerWheel
+
+
+log = logging.getLogger(__name__)
+
+
+def _unplug(controllers):
+    for controller in controllers:
+        try:
+            controller.destroy()
+        except Exception:
+            log.exception("failed to unplug controller %r", controller)
+
+
+class Pad:
+    """
+    One virtual controller with its own compositor, chat layer, hold
+    scheduler and optional poll.
+
+    :param int index: position in the pool, 0 based
+    :param controller: vxinputlib.Controller
+    :param float tick: seconds per compositor tick
+    :param float now: current loop time
+    :param recorder: optional ctrlbotlib.recording.Recorder
+    :param latency: optional ctrlbotlib.stats.Histogram of seconds from
+        the first command since the last commit until the DLL completed
+        the writes of the commit
+    :param worker: ctrlbotlib.worker.FFIWorker the controller's writes are
+        queued on, None if they are made right away
+    :param clock: callable returning the time now is given in
+    """
+
+    def __init__(self, index, controller, tick, now, chat_priority=1,
+                 chat_mask=GamepadState.all, poll=None, recorder=None,
+                 latency=None, worker=None, clock=time.monotonic):
+        self.index = index
+        self.controller = controller
+        self.compositor = Compositor(
+            controller, recorder.tap(index) if recorder else None)
+        self.chat = self.compositor.layer("chat", chat_priority, chat_mask)
+        self.holds = HoldScheduler(self.chat, TimerWheel(tick, now=now))
+        self.poll = poll
+        self.latency = latency
+        self.worker = worker
+        self.clock = clock
+        self.pending_since = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.index})"
+
+    def touch(self, now):
+        """
+        Note a command received at now, for latency statistics.
+        """
+        if self.pending_since is None:
+            self.pending_since = now
+
+    def resync(self, control=None):
+        """
+        Send the field DLL function control writes on the next tick, e.g.
+        after a queued write of it failed, every field if control is None.
+        """
+        if control is None:
+            self.controller.resync()
+            self.compositor.dirty |= GamepadState.all.value
+        else:
+            self.compositor.dirty |= self.controller.forget(control).value
+
+    def tick(self, now):
+        self.holds.tick(now)
+        committed = self.compositor.commit()
+        if self.pending_since is not None:
+            if committed and self.latency is not None:
+                if self.worker is None:
+                    self.latency.record(self.clock() - self.pending_since)
+                else:
+                    # queued after the writes of the commit, so it runs
+                    # once the DLL completed them
+                    self.worker.call(self._record_latency, self.pending_since)
+            self.pending_since = None
+
+    def _record_latency(self, since):
+        self.latency.record(self.clock() - since)
+
+
+class ControllerPool:
+    """
+    Virtual controllers plugged into vXbox bus slots, with users assigned
+    to them either explicitly or by a stable hash of their name.
+
+    Explicit assignments are kept in a LRU of fixed capacity, like the
+    admission buckets. Users not seen for a while fall back to the hash.
+
+    :param vxinput: vxinputlib.VXInput
+    :param controller_ids: bus slots (1-4) to plug controllers into
+    :param pad_factory: callable(index, controller) creating a Pad
+    :param int capacity: number of explicit assignments kept
+    """
+
+    def __init__(self, vxinput, controller_ids, pad_factory,
+                 capacity=10000):
+        self.vxinput = vxinput
+        self.controller_ids = list(controller_ids)
+        self.pad_factory = pad_factory
+        self.capacity = capacity
+        self.pads = []
+        # user -> pad index, for users who picked a pad
+        self.assignments = OrderedDict()
+
+    def __len__(self):
+        return len(self.pads)
+
+    def __iter__(self):
+        return iter(self.pads)
+
+    def __getitem__(self, index):
+        return self.pads[index]
+
+    def connect(self):
+        """
+        Plug a controller into every bus slot. If one fails, those already
+        plugged in are unplugged again and the error is raised.
+
+        Only the library is used, so this can run on the FFI worker.
+
+        :return: list of vxinputlib.Controller, in order of controller_ids
+        """
+        controllers = []
+        try:
+            for controller_id in self.controller_ids:
+                controllers.append(self.vxinput.controller(controller_id))
+        except Exception:
+            _unplug(controllers)
+            raise
+        return controllers
+
+    def plug_in(self, controllers=None):
+        """
+        Create the pads of controllers, plugging them in with connect() if
+        not given. If creating a pad fails, all controllers are unplugged
+        again and the error is raised.
+        """
+        if controllers is None:
+            controllers = self.connect()
+        try:
+            for index, controller in enumerate(controllers):
+                self.pads.append(self.pad_factory(index, controller))
+        except Exception:
+            self.pads.clear()
+            _unplug(controllers)
+            raise
+        return self.pads
+
+    def destroy(self, force=False):
+        """
+        Unplug all controllers.
+        """
+        for pad in self.pads:
+            try:
+                pad.controller.destroy(force)
+            except Exception:
+                log.exception("failed to unplug controller %r", pad)
+        self.pads.clear()
+
+    def join(self, user, index):
+        """
+        Assign user to pad index.
+        """
+        if not 0 <= index < len(self.pads):
+            raise IndexError(f"no controller {index + 1}")
+        assignments = self.assignments
+        assignments[user] = index
+        assignments.move_to_end(user)
+        if len(assignments) > self.capacity:
+            assignments.popitem(last=False)
+
+    def leave(self, user):
+        self.assignments.pop(user, None)
+
+    def assign(self, user):
+        """
+        Pad of user, an explicit join wins over the hash of the name.
+        """
+        index = self.assignments.get(user)
+        if index is None:
+            index = zlib.crc32(user.lower().encode()) % len(self.pads)
+        else:
+            self.assignments.move_to_end(user)
+        return self.pads[index]
+
+    def resync(self, writes):
+        """
+        Send the controls of failed writes again on the next tick.
+
+        :param writes: (controller id, DLL function) pairs, as returned by
+            FFIWorker.pop_failed()
+        """
+        pads = dict(zip(self.controller_ids, self.pads))
+        for controller_id, control in writes:
+            pad = pads.get(controller_id)
+            if pad is not None:
+                pad.resync(control)
+
+    def tick(self, now):
+        for pad in self.pads:
+            pad.tick(now)
@@ -0,0 +1,174 @@
+# coding: utf-8
+"""
+Ramps: analog sticks moving smoothly from one position to another.
+
+A ramp plays a table of (x, y) axis values, one per tick. Tables are
+computed once per shape and cached: arc sweeps per (start angle, end
+angle, curve, ticks), straight ramps per (start position, end position,
+curve, ticks), both from a cached table of eased fractions per (curve,
+ticks). A running ramp costs an index into its table per tick, no
+trigonometry, and all ramps are advanced by one RampPlayer.tick().
+"""
+from vxinputlib import GamepadState, angle_to_xy
+
+
+# curve name -> easing function of the fraction of time passed, 0 to 1
+EASINGS = {
+    "linear": lambda t: t,
+    "in": lambda t: t * t,
+    "out": lambda t: t * (2 - t),
+    "inout": lambda t: t * t * (3 - 2 * t),
+}
+
+# stick name -> (x axis, y axis)
+STICKS = {
+    "left": (GamepadState.axis_lx, GamepadState.axis_ly),
+    "right": (GamepadState.axis_rx, GamepadState.axis_ry),
+}
+
+
+class Ramp:
+    """
+    Position of a running ramp in its table.
+    """
+
+    __slots__ = ("layer", "x_axis", "y_axis", "table", "start", "index")
+
+    def __init__(self, layer, stick, table, start):
+        self.layer = layer
+        self.x_axis, self.y_axis = STICKS[stick]
+        self.table = table
+        self.start = start
+        self.index = -1
+
+
+class RampPlayer:
+    """
+    Play ramps on compositor layers, driven by tick().
+
+    A stick of a layer runs one ramp at a time, a new ramp replaces the
+    running one. When ticks run late, values in between are skipped so a
+    ramp always ends on time.
+
+    :param float rate: seconds per tick, the resolution of the tables
+    :param int max_cache: cached tables beyond this clear the cache
+    """
+
+    def __init__(self, rate, max_cache=1024):
+        self.rate = rate
+        self.max_cache = max_cache
+        # (layer, stick) -> Ramp
+        self.ramps = {}
+        self._curves = {}
+        self._arcs = {}
+        self._lines = {}
+
+    def __len__(self):
+        return len(self.ramps)
+
+    def steps(self, duration):
+        return max(1, round(duration / self.rate))
+
+    def curve(self, name, steps):
+        """
+        Eased fractions of each of steps ticks, ending at 1.0.
+
+        :raises KeyError: for unknown curves
+        """
+        key = (name, steps)
+        fractions = self._curves.get(key)
+        if fractions is None:
+            if len(self._curves) >= self.max_cache:
+                self._curves.clear()
+            ease = EASINGS[name]
+            fractions = self._curves[key] = tuple(
+                ease(i / steps) for i in range(1, steps + 1))
+        return fractions
+
+    def arc(self, start, end, curve, steps, amount=100):
+        """
+        Axis values of an arc from angle start to angle end, in degrees
+        clockwise from up, the shorter way round and clockwise between
+        opposite angles.
+        """
+        key = (start, end, curve, steps, amount)
+        table = self._arcs.get(key)
+        if table is None:
+            if len(self._arcs) >= self.max_cache:
+                self._arcs.clear()
+            delta = (end - start) % 360
+            if delta > 180:
+                delta -= 360
+            table = []
+            for fraction in self.curve(curve, steps):
+                x, y = angle_to_xy(start + delta * fraction, amount)
+                table.append((int(x), int(y)))
+            table = self._arcs[key] = tuple(table)
+        return table
+
+    def line(self, start, end, curve, steps):
+        """
+        Axis values of a straight line from axis values start to end.
+        """
+        key = (start, end, curve, steps)
+        table = self._lines.get(key)
+        if table is None:
+            if len(self._lines) >= self.max_cache:
+                self._lines.clear()
+            x, y = start
+            dx = end[0] - x
+            dy = end[1] - y
+            table = self._lines[key] = tuple(
+                (int(x + dx * f), int(y + dy * f))
+                for f in self.curve(curve, steps))
+        return table
+
+    def sweep(self, layer, stick, start, end, duration, curve, now):
+        """
+        Sweep stick along an arc between angles start and end.
+        """
+        self.play(layer, stick,
+                  self.arc(start, end, curve, self.steps(duration)), now)
+
+    def glide(self, layer, stick, start, end, duration, curve, now):
+        """
+        Move stick in a straight line from axis values start to end.
+        """
+        self.play(layer, stick,
+                  self.line(start, end, curve, self.steps(duration)), now)
+
+    def play(self, layer, stick, table, now):
+        """
+        Start playing table on stick of layer, the first values are set
+        right away.
+        """
+        ramp = self.ramps[layer, stick] = Ramp(layer, stick, table, now)
+        self._set(ramp, 0)
+        if len(table) == 1:
+            del self.ramps[layer, stick]
+
+    def cancel(self, layer, stick):
+        """
+        Stop a running ramp, the stick stays where it is.
+        """
+        self.ramps.pop((layer, stick), None)
+
+    def tick(self, now):
+        rate = self.rate
+        done = []
+        for key, ramp in self.ramps.items():
+            index = int((now - ramp.start) / rate)
+            last = len(ramp.table) - 1
+            if index >= last:
+                index = last
+                done.append(key)
+            if index != ramp.index:
+                self._set(ramp, index)
+        for key in done:
+            del self.ramps[key]
+
+    def _set(self, ramp, index):
+        ramp.index = index
+        x, y = ramp.table[index]
+        ramp.layer.set(ramp.x_axis, x)
+        ramp.layer.set(ramp.y_axis, y)
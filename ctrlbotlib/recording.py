@@ -0,0 +1,282 @@
+# coding: utf-8
+"""
+Binary recording of committed controller frames.
+
+A recording is the 8 byte MAGIC header followed by fixed size little
+endian records, one per committed frame:
+
+    timestamp   double, seconds since the start of the session
+    pad         uint16, index of the controller in the pool
+    gamepad     12 bytes, XInputGamepadStruct layout: wButtons,
+                bLeftTrigger, bRightTrigger, sThumbLX, sThumbLY,
+                sThumbRX, sThumbRY
+
+Every run of the bot appends a session, which starts with a record of pad
+SESSION holding the wall clock time the session started and an empty
+gamepad. Replays skip the time between sessions.
+
+Replay a recording to vXbox controllers with:
+
+    python -m ctrlbotlib.recording <path> --dll-path vXboxInterface.dll
+"""
+import argparse
+import asyncio
+import logging
+import mmap
+import struct
+import time
+
+from xinputlib import GamepadState
+
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"CTRLREC\x02"
+RECORD = struct.Struct("<dHHBBhhhh")
+# pad of the record starting a session
+SESSION = 0xFFFF
+
+
+class Recorder:
+    """
+    Append frames to a recording.
+
+    Records are packed into a preallocated buffer, which is written to the
+    file when it is full or flush_interval seconds after the last write,
+    checked on every record and tick(). An existing recording is appended
+    to in a new session, after dropping a partially written last record.
+
+    :param str path: recording file
+    :param clock: callable returning monotonic time in seconds, frames
+        are timestamped relative to its value on creation
+    :param int buffer_records: number of records buffered in memory
+    :param float flush_interval: maximum seconds records stay buffered
+    :raises ValueError: if path exists but is not a recording
+    """
+
+    def __init__(self, path, clock=time.monotonic, buffer_records=4096,
+                 flush_interval=5.0):
+        self.path = path
+        self.clock = clock
+        self.flush_interval = flush_interval
+        self.file = open(path, "ab+")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        else:
+            size = self.file.tell()
+            self.file.seek(0)
+            magic = self.file.read(len(MAGIC))
+            if magic != MAGIC:
+                self.file.close()
+                raise ValueError(f"{path} is not a recording")
+            # drop a partially written last record, e.g. after a crash
+            self.file.truncate(size - (size - len(MAGIC)) % RECORD.size)
+            self.file.seek(0, 2)
+        self.file.write(
+            RECORD.pack(time.time(), SESSION, 0, 0, 0, 0, 0, 0, 0))
+        self.file.flush()
+        self._buffer = bytearray(RECORD.size * buffer_records)
+        self._offset = 0
+        self.epoch = self._flushed = clock()
+        self.records = 0
+        self.errors = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, pad, frame):
+        """
+        Record frame of controller pad.
+
+        :param int pad: index of the controller in the pool
+        :param frame: ctrlbotlib.compositor.Frame
+        """
+        now = self.clock()
+        try:
+            RECORD.pack_into(
+                self._buffer, self._offset, now - self.epoch, pad,
+                frame.buttons,
+                frame.left_trigger, frame.right_trigger,
+                frame.l_thumb_x, frame.l_thumb_y,
+                frame.r_thumb_x, frame.r_thumb_y)
+        except struct.error:
+            # a value out of range of its XInput field
+            self.errors += 1
+            return
+        self._offset += RECORD.size
+        self.records += 1
+        if self._offset == len(self._buffer) \
+                or now - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def tap(self, pad):
+        """
+        Callable recording frames of controller pad, for
+        Compositor.recorder.
+        """
+        def record(frame):
+            self.record(pad, frame)
+        return record
+
+    def tick(self):
+        """
+        Flush records buffered for flush_interval seconds, so an idle bot
+        doesn't keep them in memory.
+        """
+        if self._offset \
+                and self.clock() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._offset:
+            self.file.write(self._buffer[:self._offset])
+            self._offset = 0
+        self.file.flush()
+        self._flushed = self.clock()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class Replay:
+    """
+    Read a recording through a read only memory map.
+
+    A partially written last record, e.g. after a crash, is ignored.
+
+    :param str path: recording file
+    :raises ValueError: if path is not a recording
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            self.file.close()
+            raise ValueError(f"{path} is not a recording")
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a recording")
+        self.count = (len(self.map) - len(MAGIC)) // RECORD.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        """
+        Record index as (timestamp, pad, GamepadState), session records
+        included.
+        """
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        timestamp, pad, *gamepad = RECORD.unpack_from(
+            self.map, len(MAGIC) + index * RECORD.size)
+        return timestamp, pad, GamepadState(*gamepad)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def frames(self):
+        """
+        Frames as (time, pad, GamepadState), time in seconds since the
+        first frame. The first frame of a session follows the last frame
+        of the session before, the time the bot wasn't running is left out.
+        """
+        offset = None
+        end = 0.0
+        for timestamp, pad, state in self:
+            if pad == SESSION:
+                offset = None
+                continue
+            if offset is None:
+                offset = end - timestamp
+            end = timestamp + offset
+            yield end, pad, state
+
+    async def play(self, controllers, speed=1.0, loop=None):
+        """
+        Send all frames to their controller's set_state, keeping the
+        recorded time between frames. Frames are scheduled against the
+        start of the replay, so delays don't add up.
+
+        :param controllers: pad index -> controller, a dict or list.
+            Frames of other pads are skipped.
+        :param float speed: replay speed, 2 plays twice as fast
+        :return: number of frames sent
+        """
+        loop = loop if loop else asyncio.get_event_loop()
+        start = loop.time()
+        sent = 0
+        for offset, pad, state in self.frames():
+            try:
+                controller = controllers[pad]
+            except (KeyError, IndexError):
+                continue
+            delay = start + offset / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            controller.set_state(state)
+            sent += 1
+        return sent
+
+    def close(self):
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
+
+
+def main():
+    import vxinputlib
+    from vxinputlib import fake
+
+    parser = argparse.ArgumentParser(
+        description="Replay a recording to vXbox controllers.")
+    parser.add_argument("path", help="recording file")
+    parser.add_argument("--dll-path", default="vXboxInterface.dll")
+    parser.add_argument("--backend", choices=("dll", "fake"), default="dll")
+    parser.add_argument("--controller-ids", type=int, nargs="+", default=[2],
+                        help="bus slots of the recorded pads, in order")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--dump", action="store_true",
+                        help="print the records instead of replaying them")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with Replay(args.path) as replay:
+        if args.dump:
+            for record in replay:
+                print(*record)
+            return
+        loader = (vxinputlib.load_library if args.backend == "dll"
+                  else fake.load_library)
+        vxinput = vxinputlib.VXInput(args.dll_path, loader)
+        controllers = []
+        try:
+            for controller_id in args.controller_ids:
+                controllers.append(vxinput.controller(controller_id))
+            sent = asyncio.run(replay.play(controllers, args.speed))
+            log.info("replayed %d of %d frames", sent, len(replay))
+        finally:
+            for controller in controllers:
+                controller.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# coding: utf-8
+"""
+Runtime statistics: latency histograms, counters and queue depths.
+
+Recording a value costs a few integer operations and a list increment, so
+statistics can stay enabled in production.
+"""
+import json
+import os
+
+
+class Histogram:
+    """
+    Log-linear histogram of non-negative values, in the style of
+    HdrHistogram.
+
+    Values are counted in integer units. Up to 2 ** precision units every
+    unit has its own bucket, above that each power of two is split into
+    2 ** (precision - 1) buckets, so the relative error of any value is
+    below 2 ** (1 - precision), about 1.6% for the default precision.
+
+    :param float unit: size of one unit, 1e-6 counts microseconds of
+        values given in seconds
+    :param float highest: larger values are counted as highest
+    :param int precision: bits of precision, see above
+    """
+
+    def __init__(self, unit=1e-6, highest=60.0, precision=7):
+        self.unit = unit
+        self.precision = precision
+        self.highest = int(highest / unit)
+        self._half = 1 << (precision - 1)
+        self.counts = [0] * (self._index(self.highest) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, units):
+        shift = units.bit_length() - self.precision
+        if shift < 0:
+            shift = 0
+        return (units >> shift) + shift * self._half
+
+    def _bounds(self, index):
+        """
+        Lowest and highest unit value counted in bucket index.
+        """
+        shift = max(0, index // self._half - 1)
+        mantissa = index - shift * self._half
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value):
+        units = int(value / self.unit)
+        if units < 0:
+            units = 0
+        elif units > self.highest:
+            units = self.highest
+        self.counts[self._index(units)] += 1
+        self.count += 1
+        self.total += units
+        if units > self.max:
+            self.max = units
+        if self.min is None or units < self.min:
+            self.min = units
+
+    def percentile(self, percent):
+        """
+        Value at or below which percent of all values are.
+
+        :return: highest value of the bucket containing the percentile, 0.0
+            if nothing was recorded
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._bounds(index)[1], self.max) * self.unit
+        return self.max * self.unit
+
+    @property
+    def mean(self):
+        return self.total / self.count * self.unit if self.count else 0.0
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def summary(self):
+        """
+        count, mean, min, max and common percentiles, values in seconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": (self.min or 0) * self.unit,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max * self.unit,
+        }
+
+
+class Stats:
+    """
+    Named histograms, plus counters and gauges read on demand.
+
+    Counters and gauges are callables, e.g. lambda: len(queue), so the
+    instrumented code only keeps its own plain attributes up to date.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def histogram(self, name, **kwargs):
+        """
+        Histogram name, created with kwargs on first use.
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(**kwargs)
+        return histogram
+
+    def counter(self, name, read):
+        self.counters[name] = read
+
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    def snapshot(self):
+        return {
+            "histograms": {name: histogram.summary()
+                           for name, histogram in self.histograms.items()},
+            "counters": {name: read() for name, read in self.counters.items()},
+            "gauges": {name: read() for name, read in self.gauges.items()},
+        }
+
+    def format(self):
+        """
+        Short human readable lines for chat.
+        """
+        lines = []
+        for name, histogram in self.histograms.items():
+            s = histogram.summary()
+            lines.append(
+                f"{name}: n={s['count']} p50={s['p50'] * 1000:.2f}ms "
+                f"p99={s['p99'] * 1000:.2f}ms max={s['max'] * 1000:.2f}ms")
+        values = dict(self.counters)
+        values.update(self.gauges)
+        if values:
+            lines.append(" ".join(f"{name}={read()}"
+                                  for name, read in values.items()))
+        return lines
+
+    def write(self, path):
+        """
+        Write a JSON snapshot to path, replacing it atomically.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
@@ -0,0 +1,121 @@
+# coding: utf-8
+import logging
+
+
+log = logging.getLogger(__name__)
+
+# run every missed tick, up to max_catchup at once
+CATCHUP = "catchup"
+# run once for all missed ticks
+SKIP = "skip"
+POLICIES = (CATCHUP, SKIP)
+
+
+class Ticker:
+    """
+    Call callback(now) at a fixed rate.
+
+    Ticks are scheduled with loop.call_at on absolute deadlines, counted
+    from the start, so the time callback takes doesn't make the rate
+    drift. When the loop falls behind by whole ticks, they are counted in
+    missed and, depending on policy, either run back to back with the time
+    they were due (CATCHUP) or dropped (SKIP). Missed ticks that aren't run
+    are also counted in skipped.
+
+    An exception in callback is logged and doesn't stop the ticker.
+    callback may stop or restart the ticker, remaining catch up runs of
+    the tick are then dropped.
+
+    :param loop: asyncio event loop
+    :param float rate: seconds between ticks
+    :param callback: callable(now)
+    :param str policy: CATCHUP or SKIP
+    :param int max_catchup: maximum number of missed ticks run at once
+    :param jitter: optional ctrlbotlib.stats.Histogram of seconds each tick
+        ran late
+    """
+
+    def __init__(self, loop, rate, callback, policy=SKIP, max_catchup=5,
+                 jitter=None):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        if policy not in POLICIES:
+            raise ValueError(
+                f"policy must be one of {POLICIES}, got {policy!r}")
+        self.loop = loop
+        self.rate = rate
+        self.callback = callback
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.jitter = jitter
+        self.ticks = 0
+        self.missed = 0
+        self.skipped = 0
+        self._start = 0.0
+        self._count = 0
+        self._handle = None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.rate}, {self.callback!r})"
+
+    @property
+    def running(self):
+        return self._handle is not None
+
+    @property
+    def deadline(self):
+        return self._start + self._count * self.rate
+
+    def start(self, delay=None):
+        """
+        Start ticking, the first tick is after delay seconds, one tick by
+        default.
+        """
+        self.stop()
+        self._start = self.loop.time() + (self.rate if delay is None
+                                          else delay)
+        self._count = 0
+        self._handle = self.loop.call_at(self._start, self._tick)
+        return self
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _tick(self):
+        handle = self._handle
+        deadline = self.deadline
+        now = self.loop.time()
+        late = now - deadline
+        if late < 0:
+            # the loop may run timers slightly early
+            late = 0.0
+        if self.jitter is not None:
+            self.jitter.record(late)
+        behind = int(late / self.rate)
+        if behind:
+            self.missed += behind
+        if behind and self.policy == CATCHUP:
+            runs = min(behind, self.max_catchup)
+            self.skipped += behind - runs
+            for i in range(runs):
+                self._run(deadline + i * self.rate)
+                if self._handle is not handle:
+                    return
+            self._run(now)
+        else:
+            self.skipped += behind
+            self._run(now)
+        if self._handle is not handle:
+            # stopped or restarted by callback
+            return
+        self._count += behind + 1
+        self._handle = self.loop.call_at(self.deadline, self._tick)
+
+    def _run(self, now):
+        self.ticks += 1
+        try:
+            self.callback(now)
+        except Exception:
+            log.exception("%r failed", self)
@@ -0,0 +1,245 @@
+# coding: utf-8
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+log = logging.getLogger(__name__)
+
+
+class FFIWorker:
+    """
+    Run DLL calls on a dedicated thread, so a stalling driver never blocks
+    the event loop.
+
+    Writes are queued by key. A write to a key that is still queued
+    replaces the pending write instead of adding another call. When
+    maxsize keys are queued, writes to new keys are rejected, submit()
+    returns False for them. A queued write the DLL then fails, returning
+    false or raising, is kept by key until pop_failed(). Calls made with
+    call() are never coalesced, they count against maxsize too and fail
+    with queue.Full when the queue is full.
+
+    :param int maxsize: maximum number of queued writes and calls
+    :param wait: optional ctrlbotlib.stats.Histogram of seconds calls
+        spent in the queue
+    """
+
+    def __init__(self, maxsize=256, name="ffi-worker", wait=None):
+        self.maxsize = maxsize
+        self.wait = wait
+        self._pending = OrderedDict()
+        self._failed = set()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self.calls = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """
+        Stop the thread after running all queued calls.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread.is_alive() \
+                and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def submit(self, key, fn, *args):
+        """
+        Queue fn(*args) as the write for key.
+
+        :return: False if the queue is full, True otherwise
+        """
+        with self._cond:
+            pending = self._pending
+            if key in pending:
+                # keep the time the key has been waiting since
+                pending[key] = (fn, args, pending[key][2])
+                pending.move_to_end(key)
+                self.coalesced += 1
+                return True
+            if len(pending) >= self.maxsize:
+                self.rejected += 1
+                return False
+            pending[key] = (fn, args, time.monotonic())
+            self._cond.notify()
+        return True
+
+    def call(self, fn, *args):
+        """
+        Queue fn(*args) and return a concurrent.futures.Future of its
+        result, use asyncio.wrap_future to await it. When the queue is full
+        the future fails with queue.Full.
+        """
+        future = Future()
+        with self._cond:
+            pending = self._pending
+            if len(pending) >= self.maxsize:
+                self.rejected += 1
+                future.set_exception(queue.Full(f"{fn!r} not queued"))
+                return future
+            pending[future] = (
+                self._resolve, (future, fn, args), time.monotonic())
+            self._cond.notify()
+        return future
+
+    def is_current(self):
+        """
+        True on the worker thread, e.g. in a function run by call().
+        """
+        return threading.current_thread() is self._thread
+
+    def pop_failed(self):
+        """
+        Keys of writes the DLL failed since the last call.
+        """
+        if not self._failed:
+            return ()
+        with self._cond:
+            failed, self._failed = self._failed, set()
+        return failed
+
+    @staticmethod
+    def _resolve(future, fn, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _run(self):
+        cond = self._cond
+        pending = self._pending
+        while True:
+            with cond:
+                while not pending and self._running:
+                    cond.wait()
+                if not pending:
+                    return
+                key, (fn, args, queued) = pending.popitem(last=False)
+            if self.wait is not None:
+                self.wait.record(time.monotonic() - queued)
+            try:
+                result = fn(*args)
+            except Exception:
+                self.errors += 1
+                log.exception("%r failed", fn)
+                result = False
+            # calls resolve their future, only writes can fail
+            if not result and not isinstance(key, Future):
+                self.failed += 1
+                with cond:
+                    self._failed.add(key)
+            self.calls += 1
+
+
+class WorkerFunction:
+    """
+    Stand-in for a ctypes function that runs it on a FFIWorker.
+    argtypes and restype are forwarded to the wrapped function.
+    """
+
+    def __init__(self, fn, call):
+        self.fn = fn
+        self.call = call
+
+    def __call__(self, *args):
+        return self.call(*args)
+
+    @property
+    def argtypes(self):
+        return self.fn.argtypes
+
+    @argtypes.setter
+    def argtypes(self, value):
+        self.fn.argtypes = value
+
+    @property
+    def restype(self):
+        return self.fn.restype
+
+    @restype.setter
+    def restype(self, value):
+        self.fn.restype = value
+
+
+class WorkerLib:
+    """
+    Wrap a loaded vXbox library so all its calls run on worker.
+
+    Set* calls are queued and coalesced per controller and control, they
+    return True when queued and False when the queue is full. Writes the
+    DLL fails later are returned by FFIWorker.pop_failed() as (controller
+    id, control) keys.
+
+    vxinputlib.Controller records a write in its shadow state when it is
+    queued, not when the DLL completes it, so set_state never waits for
+    the driver. A write that fails later leaves a wrong shadow value
+    until Controller.forget() is called with its control, see Pad.resync.
+
+    All other calls wait for their result. On the worker thread itself
+    they run right away, so setup code run with FFIWorker.call(), like
+    ControllerPool.connect, keeps the event loop free. Elsewhere they
+    block the calling thread, only do that for teardown.
+
+    :param lib: loaded library, e.g. from vxinputlib.load_library
+    :param FFIWorker worker: started worker
+    :param float timeout: seconds to wait for blocking calls
+    """
+
+    def __init__(self, lib, worker, timeout=5.0):
+        self._lib = lib
+        self._worker = worker
+        self._timeout = timeout
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        fn = getattr(self._lib, name)
+        if not callable(fn):
+            return fn
+        worker = self._worker
+        if name.startswith("Set"):
+            # all SetDpad* functions write the same control
+            control = "SetDpad" if name.startswith("SetDpad") else name
+
+            def call(id, *args):
+                return worker.submit((id, control), fn, id, *args)
+        else:
+            timeout = self._timeout
+
+            def call(*args):
+                if worker.is_current():
+                    return fn(*args)
+                return worker.call(fn, *args).result(timeout)
+        wrapped = WorkerFunction(fn, call)
+        setattr(self, name, wrapped)
+        return wrapped
+
+
+def worker_loader(loader, worker, timeout=5.0):
+    """
+    Wrap a library loader, e.g. for VXInput, to load libraries as WorkerLib.
+    """
+    def load(path):
+        return WorkerLib(loader(path), worker, timeout)
+    return load
@@ -0,0 +1,259 @@
+# coding: utf-8
+"""
+Throughput benchmarks for the hot paths, using the fake vXbox and XInput
+backends so they run without drivers.
+
+    python -m tests.benchmark.run [--call-cost MICROSECONDS] [--seconds N]
+
+Each benchmark reports operations per second, mean latency per operation
+and the number of calls into the (fake) DLLs per operation.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import irc3
+
+import ctrlbot_plugin
+from ctrlbotlib.compositor import Compositor
+from ctrlbotlib.delay import DelayLine
+from ctrlbotlib.ramps import RampPlayer
+from vxinputlib import VXInput, GamepadState
+from vxinputlib import fake as vxinput_fake
+from xinputlib import Buttons, DeviceRegistry, XInput
+from xinputlib import fake as xinput_fake
+
+
+class Result:
+    def __init__(self, name, ops, seconds, calls):
+        self.name = name
+        self.ops = ops
+        self.seconds = seconds
+        self.calls = calls
+
+    def __str__(self):
+        ops = max(1, self.ops)
+        return (f"{self.name:<32} {self.ops / self.seconds:>12,.0f} ops/s "
+                f"{self.seconds / ops * 1e6:>10.2f} us/op "
+                f"{self.calls / ops:>8.2f} calls/op")
+
+
+def measure(name, fn, lib, seconds):
+    """
+    Run fn repeatedly for about seconds, fn returns the number of
+    operations it did.
+    """
+    lib.reset_calls()
+    ops = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        ops += fn()
+    elapsed = time.perf_counter() - start
+    return Result(name, ops, elapsed, lib.calls)
+
+
+def make_controller(call_cost):
+    vxinput = VXInput(
+        "vXboxInterface.dll",
+        loader=lambda path: vxinput_fake.load_library(path, call_cost))
+    return vxinput, vxinput.controller(2)
+
+
+def make_gamepad(call_cost):
+    xinput = XInput(
+        "xinput9_1_0",
+        loader=lambda name: xinput_fake.load_library(name, 1, call_cost))
+    return xinput.dll.pads[0], xinput.enumerate_devices()[0]
+
+
+def bench_set_state(call_cost, seconds):
+    vxinput, vctrl = make_controller(call_cost)
+    pad, ctrl = make_gamepad(0)
+    ctrl.update()
+    idle_state = ctrl.state
+    pad.set(buttons=Buttons.a, l_thumb_x=1000)
+    ctrl.update()
+    busy_state = ctrl.state
+    states = [idle_state, busy_state]
+
+    def idle():
+        for _ in range(100):
+            vctrl.set_state(idle_state)
+        return 100
+
+    def changing():
+        for i in range(100):
+            vctrl.set_state(states[i & 1])
+        return 100
+
+    def axis_only():
+        for i in range(100):
+            vctrl.set_state(states[i & 1], GamepadState.axis_l)
+        return 100
+
+    lib = vxinput._lib
+    return [
+        measure("set_state idle", idle, lib, seconds),
+        measure("set_state changing", changing, lib, seconds),
+        measure("set_state changing axis_l", axis_only, lib, seconds),
+    ]
+
+
+def bench_directions(call_cost, seconds):
+    vxinput, vctrl = make_controller(call_cost)
+    clock = [str(i) for i in range(1, 13)]
+    compass = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+               "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+
+    def run(dirs):
+        def fn():
+            for dir in dirs:
+                vctrl.set_rs(dir, 100)
+            return len(dirs)
+        return fn
+
+    lib = vxinput._lib
+    return [
+        measure("set_rs clock", run(clock), lib, seconds),
+        measure("set_rs compass", run(compass), lib, seconds),
+    ]
+
+
+def bench_ramps(call_cost, seconds, count):
+    """
+    Advance count overlapping sweeps, one per layer of a compositor, and
+    commit the result, one tick per operation.
+    """
+    vxinput, vctrl = make_controller(call_cost)
+    compositor = Compositor(vctrl)
+    layers = [compositor.layer(str(i), i) for i in range(count)]
+    ramps = RampPlayer(0.01)
+    now = [0.0]
+
+    def fn():
+        for _ in range(10):
+            if not ramps:
+                for i, layer in enumerate(layers):
+                    ramps.sweep(layer, "right", i * 15 % 360, 180, 1.0,
+                                "inout", now[0])
+            now[0] += 0.01
+            ramps.tick(now[0])
+            compositor.commit()
+        return 10
+
+    return [measure(f"ramps {count} overlapping", fn, vxinput._lib, seconds)]
+
+
+def bench_ctrl_poll(call_cost, seconds, change_every):
+    """
+    Run the passthrough tick callback back to back, the fake pad changes
+    every change_every reads.
+    """
+    vxinput, vctrl = make_controller(call_cost)
+    pad, ctrl = make_gamepad(call_cost)
+    reads = [0]
+    read = pad.read
+
+    def moving_read(state):
+        reads[0] += 1
+        if reads[0] % change_every == 0:
+            pad.set(l_thumb_x=reads[0] & 0x7FFF)
+        read(state)
+
+    pad.read = moving_read
+    poll = ctrlbot_plugin.ControllerPoll(
+        DeviceRegistry(ctrl._lib), DelayLine(None, vctrl, 0))
+
+    def fn():
+        for _ in range(100):
+            poll(0.0)
+        return 100
+
+    return [measure(f"ctrl_poll change every {change_every}",
+                    fn, vxinput._lib, seconds)]
+
+
+class NullProtocol:
+    def write(self, data):
+        pass
+
+
+def bench_chat(call_cost, seconds):
+    """
+    Dispatch raw PRIVMSG lines through irc3 into the plugin.
+    """
+    lines = [
+        ":user{0}!user{0}@host PRIVMSG #chan :!fire LR 100",
+        ":user{0}!user{0}@host PRIVMSG #chan :!button ab 100",
+        ":user{0}!user{0}@host PRIVMSG #chan :!dpad up 2",
+        ":user{0}!user{0}@host PRIVMSG #chan :!aim NE",
+        ":user{0}!user{0}@host PRIVMSG #chan :just chatting",
+    ]
+    lines = [line.format(i) for i in range(20) for line in lines]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        bot = irc3.IrcBot(
+            nick="bot", loop=loop,
+            includes=["irc3.plugins.command", "ctrlbot_plugin"],
+            **{
+                "ctrlbot_plugin": {
+                    "dll_path": "vXboxInterface.dll",
+                    "backend": "fake",
+                },
+                "irc3.plugins.command": {
+                    "cmd": "!",
+                    "guard": "irc3.plugins.command.mask_based_policy",
+                },
+                "irc3.plugins.command.masks": {"*": "view"},
+            })
+        bot.protocol = NullProtocol()
+        bot.dispatch(":bot!bot@host JOIN #chan")
+        plugin = bot.get_plugin(ctrlbot_plugin.Plugin)
+        while plugin.pool is None:
+            await asyncio.sleep(0.01)
+        # the library behind the FFI worker
+        lib = plugin.vxinput._lib.load()._lib
+        for fn in lib.functions.values():
+            fn.call_cost = call_cost
+        lib.reset_calls()
+        ops = 0
+        start = time.perf_counter()
+        end = start + seconds
+        while time.perf_counter() < end:
+            for line in lines:
+                bot.dispatch(line)
+            ops += len(lines)
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+        plugin.worker.stop()
+        return Result("chat dispatch", ops, elapsed, lib.calls)
+
+    return [asyncio.run(run())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--call-cost", type=float, default=2.0,
+                        help="simulated microseconds per DLL call")
+    parser.add_argument("--seconds", type=float, default=1.0,
+                        help="seconds per benchmark")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    call_cost = args.call_cost / 1e6
+    results = []
+    results += bench_set_state(call_cost, args.seconds)
+    results += bench_directions(call_cost, args.seconds)
+    results += bench_ramps(call_cost, args.seconds, 1)
+    results += bench_ramps(call_cost, args.seconds, 200)
+    results += bench_ctrl_poll(call_cost, args.seconds, 1)
+    results += bench_ctrl_poll(call_cost, args.seconds, 10)
+    results += bench_chat(call_cost, args.seconds)
+    for result in results:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
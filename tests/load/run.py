@@ -0,0 +1,403 @@
+# coding: utf-8
+"""
+Chat flood load test of the bot against a local fake Twitch IRC server,
+using the fake vXbox and XInput backends so it runs without drivers.
+
+    python -m tests.load.run [--rates N ...] [--seconds N] [--users N]
+        [--mix NAME=WEIGHT,...] [--burst N] [--call-cost MICROSECONDS]
+
+For each rate, in commands per second, chat lines of --users nicks are
+sent to the bot for --seconds. Lines are sent in bursts of --burst lines,
+the mix picks commands by weight from aim, fire, button, dpad, combo and
+chat (plain chat lines).
+
+A probe user on its own controller alternates between !aim E and !aim W
+every --probe-interval seconds. The chat-to-input latency is the time
+from when a probe line was due to be sent to the first write of its
+value to the fake vXbox. Since the server shares the event loop with the
+bot, a bot falling behind also makes the server send late, counting from
+the due time keeps that delay in the latency.
+
+Per rate it reports the rate achieved by the server, commands admitted
+per second, probe latency percentiles, probes that never arrived and the
+p99 of the bot's chat_latency statistic, which starts when the bot
+handles a line rather than when it was due.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+
+import irc3
+
+import ctrlbot_plugin
+from ctrlbotlib.stats import Histogram
+
+
+CHANNEL = "#load"
+PROBE_NICK = "probe"
+LOAD_PAD = 1
+PROBE_PAD = 2
+
+COMMANDS = {
+    "aim": ["!aim N", "!aim NE", "!aim SW", "!aim 3", "!aim 9"],
+    "fire": ["!fire L 100", "!fire R 200", "!fire LR 100"],
+    "button": ["!button a 100", "!button ab 200", "!button xy"],
+    "dpad": ["!dpad up", "!dpad left 2", "!dpad down 3"],
+    "combo": ["!combo a b", "!combo up+a:300 - b", "!combo down down a"],
+    "chat": ["just chatting", "LUL", "what is this game"],
+}
+DEFAULT_MIX = "aim=1,fire=2,button=2,dpad=1,combo=1,chat=3"
+
+WELCOME = [
+    "001 {nick} :Welcome, GLHF!",
+    "002 {nick} :Your host is tmi.twitch.tv",
+    "003 {nick} :This server is rather new",
+    "004 {nick} :-",
+    "375 {nick} :-",
+    "372 {nick} :You are in a maze of twisty passages, all alike.",
+    "376 {nick} :>",
+]
+CAPABILITIES = "twitch.tv/tags twitch.tv/commands twitch.tv/membership"
+
+
+def privmsg(nick, channel, text):
+    """
+    PRIVMSG line from nick, without and with Twitch tags.
+    """
+    line = (f":{nick}!{nick}@{nick}.tmi.twitch.tv "
+            f"PRIVMSG {channel} :{text}\r\n").encode()
+    tags = f"@display-name={nick};mod=0;subscriber=0;turbo=0 ".encode()
+    return line, tags + line
+
+
+class Client:
+
+    __slots__ = ("writer", "nick", "tags")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.nick = "*"
+        self.tags = False
+
+
+class FakeTwitch:
+    """
+    In-process IRC server speaking enough of Twitch's dialect for irc3 to
+    connect, join channels and receive chat.
+
+    Lines sent by clients other than registration, CAP, PING and JOIN are
+    ignored, chat is injected with send().
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.handlers = set()
+        # channel -> joined clients
+        self.channels = defaultdict(list)
+        self.joined = asyncio.Event()
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        self.server.close()
+        for clients in self.channels.values():
+            for client in clients:
+                client.writer.close()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    def _reply(self, client, line):
+        client.writer.write(f":tmi.twitch.tv {line}\r\n".encode())
+
+    async def handle(self, reader, writer):
+        client = Client(writer)
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, _, params = line.decode("utf-8", "replace") \
+                    .rstrip("\r\n").partition(" ")
+                command = command.upper()
+                if command == "PING":
+                    self._reply(client, f"PONG tmi.twitch.tv {params}")
+                elif command == "CAP":
+                    sub, _, caps = params.partition(" ")
+                    if sub == "LS":
+                        self._reply(client, f"CAP * LS :{CAPABILITIES}")
+                    elif sub == "REQ":
+                        client.tags = "twitch.tv/tags" in caps
+                        self._reply(client, f"CAP * ACK {caps}")
+                elif command == "NICK":
+                    client.nick = params.lstrip(":").lower()
+                    for reply in WELCOME:
+                        self._reply(client, reply.format(nick=client.nick))
+                elif command == "JOIN":
+                    self.join(client, params.lstrip(":").split(","))
+                elif command == "QUIT":
+                    break
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for clients in self.channels.values():
+                if client in clients:
+                    clients.remove(client)
+            writer.close()
+            self.handlers.discard(asyncio.current_task())
+
+    def join(self, client, channels):
+        nick = client.nick
+        for channel in channels:
+            channel = channel.lower()
+            client.writer.write(
+                f":{nick}!{nick}@{nick}.tmi.twitch.tv JOIN {channel}\r\n"
+                .encode())
+            self._reply(client, f"353 {nick} = {channel} :{nick}")
+            self._reply(client, f"366 {nick} {channel} :End of /NAMES list")
+            self.channels[channel].append(client)
+        self.joined.set()
+
+    async def send(self, channel, lines):
+        """
+        Send privmsg() lines to everyone in channel, waits while the
+        clients' buffers are full.
+        """
+        for client in self.channels[channel]:
+            client.writer.write(b"".join(line[client.tags] for line in lines))
+        for client in self.channels[channel]:
+            await client.writer.drain()
+
+
+def parse_mix(mix):
+    """
+    Weights of "name=weight,..." as dict.
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"unknown command {name!r}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def make_lines(users, weights, count, rng):
+    names = list(weights)
+    picks = rng.choices(names, [weights[name] for name in names], k=count)
+    return [privmsg(f"user{rng.randrange(users)}", CHANNEL,
+                    rng.choice(COMMANDS[name]))
+            for name in picks]
+
+
+def fake_library(plugin):
+    """
+    Fake vXbox library of plugin, behind the FFI worker if there is one.
+    """
+    lib = plugin.vxinput._lib.load()
+    return getattr(lib, "_lib", lib)
+
+
+class ProbeWrites:
+    """
+    Times of the probe controller's right stick x writes, filled in by
+    the thread calling the fake vXbox.
+    """
+
+    def __init__(self, lib, controller_id):
+        self.writes = []
+        fn = lib.functions["SetAxisRx"]
+        impl = fn.impl
+        writes = self.writes
+
+        def set_axis_rx(id, value):
+            if id == controller_id:
+                writes.append((time.monotonic(), value))
+            return impl(id, value)
+
+        fn.impl = set_axis_rx
+
+    def latencies(self, probes):
+        """
+        Seconds from each probe (due time, sign) to the first write with
+        its sign after it was due, None for probes without write.
+        """
+        writes = list(self.writes)
+        result = []
+        i = 0
+        for due, sign in probes:
+            while i < len(writes) and (writes[i][0] < due
+                                       or (writes[i][1] > 0) != (sign > 0)):
+                i += 1
+            if i == len(writes):
+                result.append(None)
+            else:
+                result.append(writes[i][0] - due)
+        return result
+
+
+async def run_stage(server, lines, rate, seconds, burst, probe_interval,
+                    probe_writes, plugin):
+    loop = asyncio.get_running_loop()
+    probe_lines = [privmsg(PROBE_NICK, CHANNEL, "!aim E"),
+                   privmsg(PROBE_NICK, CHANNEL, "!aim W")]
+    probes = []
+    plugin.stats.reset()
+    admitted = plugin.admission.admitted
+    start = loop.time()
+    end = start + seconds
+    sent = 0
+    next_probe = start
+    position = 0
+    while True:
+        # due time of the next burst
+        due = start + sent / rate
+        if due >= end:
+            break
+        delay = min(due, next_probe) - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        batch = []
+        if next_probe <= due:
+            sign = 1 if len(probes) % 2 == 0 else -1
+            batch.append(probe_lines[len(probes) % 2])
+            probes.append((next_probe, sign))
+            next_probe += probe_interval
+        if loop.time() >= due:
+            for _ in range(burst):
+                batch.append(lines[position])
+                position = (position + 1) % len(lines)
+            sent += burst
+        if batch:
+            await server.send(CHANNEL, batch)
+    elapsed = loop.time() - start
+    # give the last probes time to arrive
+    await asyncio.sleep(max(0.5, 2 * plugin.commit_rate))
+    latency = Histogram()
+    lost = 0
+    for value in probe_writes.latencies(probes):
+        if value is None:
+            lost += 1
+        else:
+            latency.record(value)
+    return {
+        "rate": rate,
+        "sent": sent / elapsed,
+        "admitted": (plugin.admission.admitted - admitted) / elapsed,
+        "probes": len(probes),
+        "lost": lost,
+        "latency": latency.summary(),
+        "chat": plugin.stats.histogram("chat_latency").summary(),
+    }
+
+
+def format_result(result):
+    s = result["latency"]
+    return (f"{result['rate']:>8,.0f} {result['sent']:>10,.0f} "
+            f"{result['admitted']:>10,.0f} "
+            f"{s['p50'] * 1000:>8.2f} {s['p90'] * 1000:>8.2f} "
+            f"{s['p99'] * 1000:>8.2f} {s['max'] * 1000:>8.2f} "
+            f"{result['lost']:>4}/{result['probes']:<4} "
+            f"{result['chat']['p99'] * 1000:>8.2f}")
+
+
+HEADER = (f"{'rate':>8} {'sent/s':>10} {'admitted/s':>10} "
+          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'lost':>9} {'chat p99':>8}")
+
+
+async def run(args):
+    server = await FakeTwitch().start()
+    loop = asyncio.get_running_loop()
+    bot = irc3.IrcBot(
+        nick="bot", host=server.host, port=server.port, loop=loop,
+        includes=["irc3.plugins.core", "irc3.plugins.command",
+                  "ctrlbot_plugin"],
+        autojoins=[CHANNEL],
+        **{
+            "ctrlbot_plugin": {
+                "dll_path": "vXboxInterface.dll",
+                "backend": "fake",
+                "controller_ids": f"{LOAD_PAD} {PROBE_PAD}",
+                "passthrough_delay": 0,
+                "user_rate": args.user_rate,
+                "user_burst": args.user_rate,
+                "ffi_worker": not args.no_ffi_worker,
+            },
+            "irc3.plugins.command": {
+                "cmd": "!",
+                "guard": "irc3.plugins.command.mask_based_policy",
+            },
+            "irc3.plugins.command.masks": {"*": "view"},
+        })
+    bot.create_connection()
+    await asyncio.wait_for(server.joined.wait(), 10)
+    plugin = bot.get_plugin(ctrlbot_plugin.Plugin)
+    while plugin.pool is None:
+        await asyncio.sleep(0.01)
+    lib = fake_library(plugin)
+    for fn in lib.functions.values():
+        fn.call_cost = args.call_cost / 1e6
+    probe_writes = ProbeWrites(lib, PROBE_PAD)
+
+    # the probe gets its own controller, everyone else shares the other
+    await server.send(CHANNEL, [privmsg(PROBE_NICK, CHANNEL,
+                                        f"!join {PROBE_PAD}")])
+    await server.send(CHANNEL, [privmsg(f"user{i}", CHANNEL,
+                                        f"!join {LOAD_PAD}")
+                                for i in range(args.users)])
+    await asyncio.sleep(0.5)
+
+    rng = random.Random(args.seed)
+    lines = make_lines(args.users, args.mix, 10000, rng)
+    print(HEADER)
+    for rate in args.rates:
+        result = await run_stage(server, lines, rate, args.seconds,
+                                 args.burst, args.probe_interval,
+                                 probe_writes, plugin)
+        print(format_result(result))
+    # irc3 complains loudly about the connection going away
+    logging.disable(logging.CRITICAL)
+    bot.notify("SIGINT")
+    bot.protocol.close()
+    await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rates", type=float, nargs="+",
+                        default=[100, 500, 1000, 2000, 5000],
+                        help="commands per second to try")
+    parser.add_argument("--seconds", type=float, default=5.0,
+                        help="seconds per rate")
+    parser.add_argument("--users", type=int, default=500,
+                        help="number of chatting nicks")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help=f"command weights, default {DEFAULT_MIX}")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="lines sent at once")
+    parser.add_argument("--probe-interval", type=float, default=0.05,
+                        help="seconds between latency probes")
+    parser.add_argument("--user-rate", type=float, default=1000,
+                        help="commands per second admitted per user")
+    parser.add_argument("--call-cost", type=float, default=2.0,
+                        help="simulated microseconds per DLL call")
+    parser.add_argument("--no-ffi-worker", action="store_true",
+                        help="call the DLL on the event loop")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
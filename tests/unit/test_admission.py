@@ -0,0 +1,61 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.admission import Admission, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=2, burst=3)
+        self.assertEqual([bucket.take(0.0) for _ in range(4)],
+                         [True, True, True, False])
+        self.assertFalse(bucket.take(0.25))
+        self.assertTrue(bucket.take(0.5))
+        self.assertFalse(bucket.take(0.5))
+
+    def test_refill_is_capped(self):
+        bucket = TokenBucket(rate=2, burst=3)
+        self.assertEqual(bucket.refill(100.0), 3)
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def test_per_user_limit(self):
+        admission = Admission(rate=1, burst=2)
+        self.assertEqual([admission.admit("a", 0.0) for _ in range(3)],
+                         [True, True, False])
+        # other users have their own bucket
+        self.assertTrue(admission.admit("b", 0.0))
+        self.assertTrue(admission.admit("a", 1.0))
+        self.assertEqual(admission.admitted, 4)
+        self.assertEqual(admission.dropped_user, 1)
+
+    def test_global_limit(self):
+        admission = Admission(rate=1, burst=2, global_rate=1, global_burst=3)
+        results = [admission.admit(user, 0.0) for user in "abcd"]
+        self.assertEqual(results, [True, True, True, False])
+        self.assertEqual(admission.dropped_global, 1)
+        # a command dropped globally doesn't use the user's token
+        self.assertEqual(admission.buckets["d"].tokens, 2)
+
+    def test_disabled(self):
+        admission = Admission(rate=0)
+        self.assertTrue(all(admission.admit("a", 0.0) for _ in range(100)))
+        self.assertEqual(len(admission), 0)
+
+    def test_lru_eviction(self):
+        admission = Admission(rate=1, burst=1, capacity=2)
+        admission.admit("a", 0.0)
+        admission.admit("b", 0.0)
+        # a is used again, so b is the least recently seen user
+        admission.admit("a", 0.0)
+        admission.admit("c", 0.0)
+        self.assertEqual(list(admission.buckets), ["a", "c"])
+        # a forgotten user starts over with a full bucket
+        self.assertTrue(admission.admit("b", 0.0))
+        self.assertEqual(len(admission), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# coding: utf-8
+import asyncio
+import unittest
+
+import irc3
+from irc3.plugins.command import Commands
+
+import ctrlbot_plugin
+
+
+class Protocol:
+    """
+    Connection stand-in keeping the lines the bot sends.
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        self.lines.append(data.strip())
+
+
+class CommandTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.bot = irc3.IrcBot(
+            nick="bot", loop=asyncio.get_running_loop(),
+            includes=["irc3.plugins.command", "ctrlbot_plugin"],
+            **{
+                "ctrlbot_plugin": {
+                    "dll_path": "vXboxInterface.dll",
+                    "backend": "fake",
+                    "controller_ids": "1 2",
+                    "chat_only": True,
+                    "ffi_worker": False,
+                },
+                "irc3.plugins.command": {
+                    "cmd": "!",
+                    "guard": "irc3.plugins.command.mask_based_policy",
+                },
+                "irc3.plugins.command.masks": {"*": "view"},
+            })
+        self.bot.protocol = Protocol()
+        self.plugin = self.bot.get_plugin(ctrlbot_plugin.Plugin)
+        self.bot.dispatch(":bot!bot@host JOIN #chan")
+        while self.plugin.pool is None:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.plugin.SIGINT()
+
+    async def say(self, nick, text):
+        self.bot.dispatch(f":{nick}!{nick}@host PRIVMSG #chan :{text}")
+        await asyncio.sleep(0)
+
+    async def test_join_and_leave(self):
+        pool = self.plugin.pool
+        hashed = pool.assign("user").index
+        await self.say("user", f"!join {2 - hashed}")
+        self.assertEqual(pool.assign("user").index, 1 - hashed)
+        await self.say("user", "!leave")
+        self.assertEqual(pool.assign("user").index, hashed)
+        self.assertNotIn("user", pool.assignments)
+        self.assertEqual(self.plugin.outbound.statuses["#chan"],
+                         {("join", "user"): f"user controls controller "
+                                            f"{hashed + 1}"})
+
+    async def test_replies_are_queued(self):
+        await self.say("user", "!join 9")
+        self.assertEqual(list(self.plugin.outbound.queue),
+                         [("#chan", "Pick a controller from 1 to 2.")])
+        self.assertFalse(any(b"Pick a controller" in line
+                             for line in self.bot.protocol.lines))
+
+    async def test_other_plugins_reply_directly(self):
+        self.assertIs(self.bot.get_plugin(Commands).context, self.bot)
+        await self.say("user", "!help")
+        self.assertEqual(len(self.plugin.outbound), 0)
+
+    async def test_part_drops_pending_lines(self):
+        outbound = self.plugin.outbound
+        self.assertIn(("help", "#chan"), outbound.announcements)
+        await self.say("user", "!join 9")
+        self.bot.dispatch(":bot!bot@host PART #chan")
+        await asyncio.sleep(0)
+        self.assertEqual(outbound.announcements, {})
+        self.assertEqual(len(outbound), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# coding: utf-8
+import asyncio
+import os
+import tempfile
+import unittest
+
+import irc3
+from irc3.utils import parse_config
+
+import ctrlbot_plugin
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                       "config.ini.example")
+
+
+class ExampleConfigTest(unittest.TestCase):
+    """
+    The bot starts with the shipped example config, on the fake backend.
+    """
+
+    def setUp(self):
+        # irc3 creates plugins without a loop, they use the current one
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.close_loop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def close_loop(self):
+        # the bot's message queue task
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(task, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def start(self, **options):
+        config = parse_config("bot", EXAMPLE)
+        config["ctrlbot_plugin"].update(options, backend="fake")
+        bot = irc3.IrcBot(loop=self.loop, **config)
+        plugin = bot.get_plugin(ctrlbot_plugin.Plugin)
+        if plugin.worker is not None:
+            self.addCleanup(plugin.worker.stop)
+        return plugin
+
+    def test_plugin_starts(self):
+        plugin = self.start()
+        self.assertEqual(plugin.combos.named, {})
+        self.assertIn("aim", plugin.parser)
+        self.assertIsNotNone(plugin.worker)
+        self.assertFalse(plugin.chat_only)
+
+    def test_booleans(self):
+        # irc3 keeps all but lower case true and false as strings
+        plugin = self.start(chat_only="False", fast_path="no",
+                            ffi_worker="OFF")
+        self.assertFalse(plugin.chat_only)
+        self.assertIsNotNone(plugin.devices)
+        self.assertIsNone(plugin.parser)
+        self.assertIsNone(plugin.worker)
+        self.assertTrue(self.start(chat_only="Yes").chat_only)
+
+    def test_controller_ids_on_several_lines(self):
+        with open(EXAMPLE) as f:
+            example = f.read()
+        path = os.path.join(self.directory, "config.ini")
+        with open(path, "w") as f:
+            f.write(example.replace(
+                "[ctrlbot_plugin]\n",
+                "[ctrlbot_plugin]\ncontroller_ids =\n    1\n    3\n"))
+        config = parse_config("bot", path)
+        self.assertEqual(config["ctrlbot_plugin"]["controller_ids"],
+                         ["1", "3"])
+        self.assertEqual(ctrlbot_plugin.parse_controller_ids(
+            config["ctrlbot_plugin"]["controller_ids"]), [1, 3])
+
+    def test_parse_controller_ids(self):
+        parse = ctrlbot_plugin.parse_controller_ids
+        self.assertEqual(parse(2), [2])
+        self.assertEqual(parse("1 4"), [1, 4])
+        self.assertEqual(parse(["1 2", "3"]), [1, 2, 3])
+        for value in (0, 5, "1 x", "1 1", "", []):
+            with self.assertRaises(ValueError, msg=value):
+                parse(value)
+
+    def test_asbool(self):
+        for value in (True, 1, "true", "Yes", "ON", " 1 "):
+            self.assertIs(ctrlbot_plugin.asbool(value), True, value)
+        for value in (False, 0, 0.0, "false", "No", "off", "0", ""):
+            self.assertIs(ctrlbot_plugin.asbool(value), False, value)
+        with self.assertRaises(ValueError):
+            ctrlbot_plugin.asbool("maybe")
+
+    def test_irc3_defaults_are_not_combos(self):
+        combos = ctrlbot_plugin.make_combos({"ctrlbot_plugin.combos": {
+            "hash": "#", "#": "#", "##": "##", "dash": "right right"}})
+        self.assertEqual(list(combos.named), ["dash"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.delay import DelayLine
+
+
+class FakeTimer:
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeLoop:
+    """
+    Event loop clock advanced by run_until, running due timers in order.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.timers = []
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback):
+        timer = FakeTimer(when, callback)
+        self.timers.append(timer)
+        return timer
+
+    def run_until(self, now):
+        while True:
+            due = [timer for timer in self.timers
+                   if not timer.cancelled and timer.when <= now]
+            if not due:
+                break
+            timer = min(due, key=lambda timer: timer.when)
+            self.timers.remove(timer)
+            self.now = timer.when
+            timer.callback()
+        self.now = now
+
+
+class RecordingSink:
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.writes = []
+
+    def set_state(self, state, mask):
+        self.writes.append((self.loop.time(), state, mask))
+
+
+class DelayLineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = FakeLoop()
+        self.sink = RecordingSink(self.loop)
+
+    def line(self, delay, capacity=4):
+        return DelayLine(self.loop, self.sink, delay, capacity)
+
+    def states(self):
+        return [state for _, state, _ in self.sink.writes]
+
+    def test_no_delay(self):
+        line = self.line(0)
+        line.push("a", 1)
+        self.assertEqual(self.sink.writes, [(0.0, "a", 1)])
+        self.assertEqual(len(line), 0)
+        self.assertEqual(self.loop.timers, [])
+
+    def test_frames_are_written_after_the_delay(self):
+        line = self.line(0.2)
+        for now, state in ((0.0, "a"), (0.05, "b"), (0.1, "c")):
+            self.loop.run_until(now)
+            line.push(state, 1)
+        # a single timer for the oldest pending frame
+        self.assertEqual(len(self.loop.timers), 1)
+        self.loop.run_until(0.24)
+        self.assertEqual(self.states(), ["a"])
+        self.loop.run_until(1.0)
+        self.assertEqual([(round(when, 6), state)
+                          for when, state, _ in self.sink.writes],
+                         [(0.2, "a"), (0.25, "b"), (0.3, "c")])
+        self.assertEqual(len(line), 0)
+        self.assertEqual(self.loop.timers, [])
+
+    def test_drain_writes_every_due_frame(self):
+        line = self.line(0.2)
+        line.push("a", 1)
+        line.push("b", 2)
+        self.loop.now = 0.0005
+        line.push("c", 3)
+        self.loop.now = 0.1
+        line.push("d", 4)
+        self.loop.run_until(0.2)
+        # frames due up to now + resolution are written by the same drain,
+        # the latest state written is the last one pushed before now - delay
+        self.assertEqual(self.states(), ["a", "b", "c"])
+        self.assertEqual([mask for _, _, mask in self.sink.writes], [1, 2, 3])
+        self.assertEqual(len(line), 1)
+        self.assertEqual(self.loop.timers[0].when, 0.1 + 0.2)
+
+    def test_full_line_writes_oldest_early(self):
+        line = self.line(0.2, capacity=2)
+        for state in "abc":
+            line.push(state, 1)
+        self.assertEqual(self.states(), ["a"])
+        self.assertEqual(line.overruns, 1)
+        self.assertEqual(len(line), 2)
+        self.loop.run_until(0.2)
+        self.assertEqual(self.states(), ["a", "b", "c"])
+
+    def test_clear(self):
+        line = self.line(0.2)
+        line.push("a", 1)
+        line.push("b", 1)
+        line.clear()
+        self.assertEqual(len(line), 0)
+        self.loop.run_until(1.0)
+        self.assertEqual(self.sink.writes, [])
+        # the line is usable again after a clear
+        line.push("c", 1)
+        self.loop.run_until(1.2)
+        self.assertEqual(self.states(), ["c"])
+
+    def test_for_rate(self):
+        line = DelayLine.for_rate(self.loop, self.sink, 0.2, 1 / 30)
+        self.assertEqual(line.capacity, 7)
+        self.assertEqual(DelayLine.for_rate(None, None, 0, 0.1).capacity, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.holds import HoldScheduler, TimerWheel
+from vxinputlib import GamepadState
+
+
+class RecordingLayer:
+    """
+    Compositor layer stand-in recording sets and releases.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def set(self, flag, value):
+        self.events.append(("set", flag, value))
+
+    def release(self, flag):
+        self.events.append(("release", flag))
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def test_expiry_order(self):
+        wheel = TimerWheel(0.01, slots=8)
+        wheel.schedule(0.03, "b")
+        wheel.schedule(0.01, "a")
+        wheel.schedule(0, "now")
+        self.assertEqual(len(wheel), 3)
+        self.assertEqual(wheel.advance(0.005), [])
+        self.assertEqual(wheel.advance(0.01), ["a", "now"])
+        self.assertEqual(wheel.advance(0.1), ["b"])
+        self.assertEqual(len(wheel), 0)
+
+    def test_rounds(self):
+        wheel = TimerWheel(1, slots=4)
+        wheel.schedule(2, "short")
+        wheel.schedule(6, "long")
+        wheel.schedule(10, "longer")
+        self.assertEqual(wheel.advance(2), ["short"])
+        # "long" shares the slot of "short" but is one round later
+        self.assertEqual(wheel.advance(5), [])
+        self.assertEqual(wheel.advance(6), ["long"])
+        self.assertEqual(wheel.advance(9), [])
+        self.assertEqual(wheel.advance(10), ["longer"])
+
+    def test_idle_jump(self):
+        wheel = TimerWheel(0.01, slots=4)
+        wheel.advance(1000.0)
+        self.assertAlmostEqual(wheel.time, 1000.0, places=6)
+        wheel.schedule(0.02, "a")
+        self.assertEqual(wheel.advance(1000.03), ["a"])
+
+
+class HoldSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.layer = RecordingLayer()
+        # a tick exact in binary keeps the deadlines on whole ticks
+        self.wheel = TimerWheel(1 / 8)
+        self.holds = HoldScheduler(self.layer, self.wheel)
+
+    def tick_to(self, end):
+        wheel = self.wheel
+        while wheel.time + wheel.tick <= end:
+            self.holds.tick(wheel.time + wheel.tick)
+
+    def releases(self):
+        return [event for event in self.layer.events if event[0] == "release"]
+
+    def test_release(self):
+        self.holds.press(GamepadState.a, True, 1)
+        self.assertEqual(len(self.holds), 1)
+        self.tick_to(0.875)
+        self.assertEqual(self.releases(), [])
+        self.tick_to(1)
+        self.assertEqual(self.releases(), [("release", GamepadState.a)])
+        self.assertEqual(len(self.holds), 0)
+
+    def test_overlapping_presses_merge(self):
+        self.holds.press(GamepadState.a, True, 3)
+        self.tick_to(1)
+        # a shorter press doesn't cut the longer one short
+        self.holds.press(GamepadState.a, True, 0.5)
+        self.tick_to(2)
+        self.holds.press(GamepadState.a, True, 3)
+        self.tick_to(4.875)
+        self.assertEqual(self.releases(), [])
+        self.tick_to(5)
+        self.assertEqual(self.releases(), [("release", GamepadState.a)])
+        # one pending timer per held field
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_fields_are_independent(self):
+        self.holds.press(GamepadState.a, True, 1)
+        self.holds.press(GamepadState.b, True, 2)
+        self.tick_to(1)
+        self.assertEqual(self.releases(), [("release", GamepadState.a)])
+        self.tick_to(2)
+        self.assertEqual(self.releases()[1:], [("release", GamepadState.b)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+# coding: utf-8
+import asyncio
+import marshal
+import unittest
+
+from ctrlbotlib.ingest import Forwarder, Ingest, Worker, shard, worker_config
+
+
+def forward_nick(config, conn):
+    """
+    Worker target sending one record with its nick, then exiting.
+    """
+    conn.send_bytes(marshal.dumps([(config["nick"], ("fire",))]))
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.sent = []
+
+    def send_bytes(self, data):
+        self.sent.append(marshal.loads(data))
+
+
+class FakeHandle:
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeLoop:
+
+    def __init__(self):
+        self.now = 0.0
+        self.handles = []
+
+    def time(self):
+        return self.now
+
+    def call_later(self, delay, callback, *args):
+        handle = FakeHandle(self.now + delay, callback, args)
+        self.handles.append(handle)
+        return handle
+
+
+class FakeProcess:
+
+    exitcode = 1
+
+
+class ShardTest(unittest.TestCase):
+
+    def test_shard(self):
+        self.assertEqual(shard(["#a", "#b", "#c"], 2), [["#a", "#c"], ["#b"]])
+        self.assertEqual(shard(["#a"], 4), [["#a"]])
+
+    def test_worker_config(self):
+        config = worker_config(
+            {"nick": "botname", "host": "irc.example.com", "port": 6667,
+             "autojoins": ["#main"], "loop": object()},
+            ["#a", "#b"], 2)
+        self.assertEqual(config["nick"], "botname_2")
+        self.assertEqual(config["port"], 6667)
+        self.assertEqual(config["autojoins"], ["#a", "#b"])
+        self.assertNotIn("loop", config)
+        self.assertIn("ctrlbotlib.ingest", config["includes"])
+
+
+class ForwarderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = FakeConnection()
+        self.loop = FakeLoop()
+        self.forwarder = Forwarder(self.conn, self.loop, delay=0.005,
+                                   max_batch=3)
+
+    def test_batch_is_sent_after_delay(self):
+        self.forwarder.send(("a!a@a", "x"))
+        self.forwarder.send(("b!b@b", "y"))
+        self.assertEqual(self.conn.sent, [])
+        [handle] = self.loop.handles
+        self.assertEqual(handle.when, 0.005)
+        handle.callback()
+        self.assertEqual(self.conn.sent, [[("a!a@a", "x"), ("b!b@b", "y")]])
+        self.assertEqual((self.forwarder.records, self.forwarder.batches),
+                         (2, 1))
+
+    def test_full_batch_is_sent_at_once(self):
+        for i in range(4):
+            self.forwarder.send(("a!a@a", i))
+        self.assertEqual(self.conn.sent, [[("a!a@a", i) for i in range(3)]])
+        self.assertTrue(self.loop.handles[0].cancelled)
+        self.assertEqual(self.forwarder.batch, [("a!a@a", 3)])
+
+
+class IngestBackoffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = FakeLoop()
+        self.ingest = Ingest(self.loop, None, min_backoff=1, max_backoff=4)
+        self.spawned = []
+        self.ingest._spawn = self.spawn
+
+    def spawn(self, worker):
+        worker.restart = None
+        worker.process = FakeProcess()
+        worker.started_at = self.loop.now
+        self.spawned.append(self.loop.now)
+
+    def crash(self, worker, after):
+        self.loop.now += after
+        self.ingest._exited(worker, worker.process)
+        self.assertEqual(len(self.ingest), 0)
+        handle = worker.restart
+        self.loop.now = handle.when
+        handle.callback(*handle.args)
+
+    def test_restart_backoff(self):
+        self.ingest.start([{"autojoins": ["#a"]}])
+        [worker] = self.ingest.workers
+        for i in range(4):
+            self.crash(worker, 0.5)
+        # 1, 2, 4 and 4 seconds after exiting
+        self.assertEqual(self.spawned, [0.0, 1.5, 4.0, 8.5, 13.0])
+        self.assertEqual(self.ingest.restarts, 4)
+        # a worker that ran for max_backoff starts over
+        self.crash(worker, 4)
+        self.assertEqual(self.spawned[-1], 18.0)
+        self.assertEqual(worker.backoff, 2)
+
+    def test_exit_while_stopping(self):
+        self.ingest.start([{"autojoins": ["#a"]}])
+        [worker] = self.ingest.workers
+        self.ingest._stopping = True
+        self.ingest._exited(worker, worker.process)
+        self.assertIsNone(worker.restart)
+
+    def test_stop_cancels_restart(self):
+        self.ingest.start([{"autojoins": ["#a"]}])
+        [worker] = self.ingest.workers
+        self.ingest._exited(worker, worker.process)
+        handle = worker.restart
+        self.ingest.stop()
+        self.assertTrue(handle.cancelled)
+        self.assertEqual(self.ingest.workers, [])
+
+    def test_worker_repr(self):
+        self.assertEqual(repr(Worker("ingest-1", {}, 1)), "Worker('ingest-1')")
+
+
+class IngestProcessTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_workers_are_restarted(self):
+        records = []
+        ingest = Ingest(asyncio.get_running_loop(), records.extend,
+                        target=forward_nick, min_backoff=0.01,
+                        max_backoff=0.05)
+        self.addCleanup(ingest.stop)
+        ingest.start(worker_config({"nick": "botname"}, [channel], number)
+                     for number, channel in enumerate(["#a", "#b"], 1))
+        async with asyncio.timeout(30):
+            while ingest.restarts < 2 or len(records) < 4:
+                await asyncio.sleep(0.01)
+        self.assertEqual({mask for mask, action in records},
+                         {"botname_1", "botname_2"})
+        self.assertEqual(records[0][1], ("fire",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.holds import TimerWheel
+from ctrlbotlib.macros import ComboBook, MacroPlayer, compile_combo, parse_key
+from vxinputlib import DPAD_LEFT, DPAD_UP, GamepadState
+
+
+class RecordingHolds:
+    """
+    HoldScheduler stand-in recording presses with the wheel time.
+    """
+
+    def __init__(self, wheel):
+        self.wheel = wheel
+        self.presses = []
+
+    def press(self, flag, value, duration):
+        self.presses.append((round(self.wheel.time, 6), flag, value, duration))
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_parse_key(self):
+        self.assertEqual(parse_key("a", 0.2), (((GamepadState.a, True),), 0.2))
+        self.assertEqual(parse_key("-:300", 0.2), ((), 0.3))
+        self.assertEqual(parse_key("up+left", 0.2),
+                         (((GamepadState.dpad, DPAD_UP | DPAD_LEFT),), 0.2))
+        self.assertEqual(parse_key("a:99999", 0.2)[1], 10.0)
+        for word in ("z", "a+z", "a:x"):
+            with self.assertRaises(ValueError):
+                parse_key(word, 0.2)
+
+    def test_compile(self):
+        timeline = compile_combo(("a", "-", "b+x:500"), press=0.1, gap=0.1)
+        self.assertEqual(timeline, (
+            (0.0, GamepadState.a, True, 0.1),
+            (0.4, GamepadState.b, True, 0.5),
+            (0.4, GamepadState.x, True, 0.5),
+        ))
+
+
+class ComboBookTest(unittest.TestCase):
+
+    def test_named_combos_expand(self):
+        book = ComboBook({"Hadouken": "down right a", "twice": "hadouken x"})
+        self.assertEqual(book.action("TWICE b"),
+                         ("combo", ("down", "right", "a", "x", "b")))
+
+    def test_invalid(self):
+        book = ComboBook(max_steps=2)
+        self.assertIsNone(book.action("a b c"))
+        self.assertIsNone(book.action("a nope"))
+        self.assertIsNone(book.action(""))
+        with self.assertRaises(ValueError):
+            ComboBook({"bad": "a nope"})
+
+    def test_timelines_are_cached(self):
+        book = ComboBook(max_cache=2)
+        timeline = book.timeline(("a", "b"))
+        self.assertIs(book.timeline(("a", "b")), timeline)
+
+    def test_cache_is_bounded(self):
+        book = ComboBook(max_cache=2)
+        for hold in range(100):
+            book.timeline(("a", f"b:{hold}"))
+            self.assertLessEqual(len(book._cache), 2)
+
+
+class MacroPlayerTest(unittest.TestCase):
+
+    def test_play(self):
+        wheel = TimerWheel(0.01)
+        player = MacroPlayer(wheel)
+        holds = RecordingHolds(wheel)
+        player.play(holds, compile_combo(("a", "b"), press=0.1, gap=0.1))
+        self.assertEqual(len(player), 1)
+        self.assertEqual(holds.presses, [(0.0, GamepadState.a, True, 0.1)])
+        for i in range(1, 30):
+            player.tick(i * 0.01)
+        self.assertEqual(len(player), 0)
+        self.assertEqual(holds.presses, [
+            (0.0, GamepadState.a, True, 0.1),
+            (0.2, GamepadState.b, True, 0.1),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
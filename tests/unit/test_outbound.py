@@ -0,0 +1,54 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.outbound import Outbound
+
+
+class OutboundTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.outbound = Outbound(
+            lambda target, line: self.sent.append((target, line)),
+            budget=2, period=30, max_length=20)
+
+    def test_budget(self):
+        for i in range(3):
+            self.outbound.say("#chan", f"line {i}")
+        self.outbound.flush(0.0)
+        self.assertEqual(self.sent, [("#chan", "line 0"), ("#chan", "line 1")])
+        self.assertEqual(len(self.outbound), 1)
+        self.outbound.flush(15.0)
+        self.assertEqual(self.sent[-1], ("#chan", "line 2"))
+
+    def test_announcements_are_keyed(self):
+        self.outbound.announce("help", "#chan", "help 1", 60)
+        self.outbound.announce("help", "#chan", "help 2", 60, 10.0)
+        self.outbound.flush(0.0)
+        self.outbound.flush(30.0)
+        self.outbound.flush(60.0)
+        self.assertEqual(self.sent, [("#chan", "help 2"), ("#chan", "help 2")])
+
+    def test_statuses_are_merged(self):
+        self.outbound.status("#chan", "a", "a joined")
+        self.outbound.status("#chan", "b", "b joined")
+        self.outbound.status("#chan", "a", "a left")
+        self.outbound.status("#chan", "c", "c joined")
+        self.outbound.flush(0.0)
+        self.assertEqual(self.sent, [("#chan", "a left | b joined"),
+                                     ("#chan", "c joined")])
+
+    def test_drop(self):
+        self.outbound.announce("help", "#chan", "help", 60)
+        self.outbound.announce("other", "#other", "help", 60)
+        self.outbound.status("#chan", "a", "a joined")
+        self.outbound.say("#chan", "reply")
+        self.outbound.say("#other", "reply")
+        self.outbound.drop("#chan")
+        self.outbound.flush(0.0)
+        self.assertEqual(self.sent, [("#other", "reply"), ("#other", "help")])
+        self.assertEqual(list(self.outbound.announcements), ["other"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+# coding: utf-8
+import asyncio
+import json
+import unittest
+
+from ctrlbotlib.overlay import Client, OverlayFeed
+
+
+def parse(data):
+    name, line = data.decode().split("\n")[:2]
+    return name[len("event: "):], json.loads(line[len("data: "):])
+
+
+class FakeTransport:
+
+    def __init__(self):
+        self.buffered = 0
+        self.closing = False
+
+    def is_closing(self):
+        return self.closing
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class FakeWriter:
+
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    def events(self):
+        """
+        (event, data) of everything written, keepalives as (None, None).
+        """
+        return [(None, None) if data.startswith(b":") else parse(data)
+                for data in self.written]
+
+
+class OverlayFeedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.values = {"a": 1, "b": 2}
+        self.feed = OverlayFeed(lambda: dict(self.values), client_rate=0.1,
+                                buffer_limit=100, keepalive=15)
+
+    def connect(self):
+        writer = FakeWriter()
+        self.feed.clients.append(Client(writer))
+        return writer
+
+    def test_snapshot_then_deltas(self):
+        writer = self.connect()
+        self.feed.publish(0.0)
+        self.values["a"] = 3
+        del self.values["b"]
+        self.feed.publish(0.1)
+        self.feed.publish(0.2)
+        self.assertEqual(writer.events(), [
+            ("snapshot", {"a": 1, "b": 2}),
+            # removed keys are null
+            ("delta", {"a": 3, "b": None}),
+        ])
+
+    def test_rate_limited_client_gets_missed_changes(self):
+        writer = self.connect()
+        self.feed.publish(0.0)
+        # versions published faster than the client rate
+        for i, now in enumerate((0.03, 0.06, 0.09)):
+            self.values["a"] = 10 + i
+            self.feed.publish(now)
+        self.values["c"] = 5
+        self.feed.publish(0.12)
+        self.assertEqual(self.feed.version, 5)
+        self.assertEqual(writer.events(), [
+            ("snapshot", {"a": 1, "b": 2}),
+            ("delta", {"a": 12, "c": 5}),
+        ])
+
+    def test_delta_serialized_once_per_client_version(self):
+        writers = [self.connect() for i in range(3)]
+        self.feed.publish(0.0)
+        late = self.connect()
+        self.values["a"] = 3
+        self.feed.publish(0.1)
+        delta = writers[0].written[1]
+        for writer in writers:
+            self.assertIs(writer.written[1], delta)
+        # the new client has no version yet and gets the snapshot
+        self.assertEqual(late.events(), [("snapshot", {"a": 3, "b": 2})])
+
+    def test_undone_changes_are_not_sent(self):
+        writer = self.connect()
+        self.feed.publish(0.0)
+        self.values["a"] = 3
+        self.feed.publish(0.05)
+        self.values["a"] = 1
+        self.feed.publish(0.1)
+        self.assertEqual(len(writer.written), 1)
+        self.values["b"] = 4
+        self.feed.publish(0.2)
+        self.assertEqual(writer.events()[1:], [("delta", {"b": 4})])
+
+    def test_full_buffer_is_skipped(self):
+        writer = self.connect()
+        self.feed.publish(0.0)
+        writer.transport.buffered = 200
+        self.values["a"] = 3
+        self.feed.publish(0.1)
+        self.assertEqual(len(writer.written), 1)
+        writer.transport.buffered = 0
+        self.values["b"] = 4
+        self.feed.publish(0.2)
+        self.assertEqual(writer.events()[1:], [("delta", {"a": 3, "b": 4})])
+
+    def test_keepalive(self):
+        writer = self.connect()
+        self.feed.publish(0.0)
+        self.feed.publish(14.9)
+        self.assertEqual(len(writer.written), 1)
+        self.feed.publish(15.0)
+        self.assertEqual(writer.written[1], b": keepalive\n\n")
+        self.assertEqual(self.feed.keepalives, 1)
+        self.values["a"] = 3
+        self.feed.publish(20.0)
+        # events restart the interval
+        self.feed.publish(34.9)
+        self.feed.publish(35.0)
+        self.assertEqual(writer.events()[1:], [
+            (None, None), ("delta", {"a": 3}), (None, None)])
+        self.assertEqual(self.feed.events, 2)
+
+
+class OverlayServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.feed = OverlayFeed(lambda: {"a": 1})
+        self.server = await self.feed.serve("127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def request(self, path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: overlay\r\n\r\n".encode())
+        return reader, writer
+
+    async def test_events(self):
+        reader, writer = await self.request("/events?pad=1")
+        headers = await reader.readuntil(b"\r\n\r\n")
+        self.assertTrue(headers.startswith(b"HTTP/1.1 200 OK\r\n"))
+        self.assertIn(b"Content-Type: text/event-stream\r\n", headers)
+        while not self.feed.clients:
+            await asyncio.sleep(0.01)
+        self.feed.publish(0.0)
+        event = await reader.readuntil(b"\n\n")
+        self.assertEqual(parse(event), ("snapshot", {"a": 1}))
+        writer.close()
+        await writer.wait_closed()
+        while self.feed.clients:
+            await asyncio.sleep(0.01)
+
+    async def test_not_found(self):
+        reader, writer = await self.request("/")
+        response = await reader.read()
+        self.assertTrue(response.startswith(b"HTTP/1.1 404 Not Found\r\n"))
+        writer.close()
+        self.assertEqual(self.feed.clients, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
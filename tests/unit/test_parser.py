@@ -0,0 +1,152 @@
+# coding: utf-8
+import re
+import unittest
+
+import docopt
+
+import ctrlbot_plugin
+from ctrlbotlib.parser import CommandParser, compile_usage, usage_lines
+
+
+def docopt_values(doc, name, data):
+    """
+    Arguments of a command parsed like irc3 does, in order of appearance,
+    None if docopt rejects them.
+    """
+    lines = usage_lines(doc)
+    usage = "Usage:\n    " + "\n    ".join(
+        "bot " + line.strip("%") for line in lines)
+    try:
+        args = docopt.docopt(usage, [name] + data.split(), help=False)
+    except docopt.DocoptExit:
+        return None
+    values = []
+    # <arguments> and the first word of (alternatives), docopt's keys
+    for m in re.finditer(r"<[^>]+>|\((\w+)\|", " ".join(lines)):
+        value = args[m.group(1) or m.group()]
+        values.append(" ".join(value) if isinstance(value, list) else value)
+    return tuple(values)
+
+
+def parser_values(doc, name, data):
+    parser = CommandParser()
+    parser.add_command(doc, lambda *values: values)
+    return parser.parse_command(name, data)
+
+
+class CompileUsageTest(unittest.TestCase):
+
+    def match(self, usage, data):
+        name, pattern = compile_usage(usage)
+        m = pattern.fullmatch(data)
+        return None if m is None else m.groups()
+
+    def test_name(self):
+        self.assertEqual(compile_usage("%%fire (L|R)")[0], "fire")
+
+    def test_arguments(self):
+        self.assertEqual(self.match("%%x <a> <b>", " 1  2 "), ("1", "2"))
+        self.assertIsNone(self.match("%%x <a> <b>", "1"))
+        self.assertEqual(self.match("%%x <a>...", "1 2 3"), ("1 2 3",))
+
+    def test_alternatives_are_case_sensitive(self):
+        self.assertEqual(self.match("%%x (up|down)", "up"), ("up",))
+        self.assertIsNone(self.match("%%x (up|down)", "Up"))
+        self.assertIsNone(self.match("%%x (up|down)", "left"))
+
+    def test_upper_case_words_are_arguments(self):
+        self.assertEqual(self.match("%%x SIDE", "l"), ("l",))
+        self.assertEqual(self.match("%%x (L|R|LR)", "lr"), ("lr",))
+
+    def test_optional_parts_match_on_their_own(self):
+        usage = "%%x [to <end>]"
+        self.assertEqual(self.match(usage, "to 1"), ("1",))
+        self.assertEqual(self.match(usage, "1"), ("1",))
+        self.assertEqual(self.match(usage, ""), (None,))
+
+    def test_required_groups(self):
+        usage = "%%x [(to <end>)] [<curve>]"
+        self.assertEqual(self.match(usage, "to 1"), ("1", None))
+        self.assertEqual(self.match(usage, "1"), (None, "1"))
+        self.assertIsNone(self.match(usage, "1 2 3"))
+
+    def test_invalid(self):
+        for usage in ("", "%%x (a|<b>)", "%%x (a|B)", "%%x (a b|c)",
+                      "%%x (a|[b])", "%%x (a",
+                      "%%x [a", "%%x a]", "%%x a...", "%%x (a])"):
+            with self.assertRaises(ValueError, msg=usage):
+                compile_usage(usage)
+
+
+class CommandParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = CommandParser("!")
+        self.parser.add("%%fire (L|R|LR) [<duration>]",
+                        lambda *args: ("fire",) + args)
+        self.parser.add("%%dpad (up|down) [<count>]",
+                        lambda *args: ("dpad",) + args)
+        self.parser.add("%%go <where>", lambda where: ("go", where))
+        self.parser.add("%%go", lambda: ("go", None))
+
+    def test_parse(self):
+        self.assertEqual(self.parser.parse("!fire LR 100"),
+                         ("fire", "LR", "100"))
+        self.assertEqual(self.parser.parse("!FIRE L"), ("fire", "L", None))
+        self.assertEqual(self.parser.parse("!fire X"), ("fire", "X", None))
+        self.assertEqual(self.parser.parse("!dpad up 2"), ("dpad", "up", "2"))
+        self.assertIsNone(self.parser.parse("!dpad left"))
+        self.assertIsNone(self.parser.parse("fire L"))
+        self.assertIsNone(self.parser.parse("!fireL"))
+        self.assertIsNone(self.parser.parse("!other"))
+
+    def test_usage_lines_in_order(self):
+        self.assertEqual(self.parser.parse("!go home"), ("go", "home"))
+        self.assertEqual(self.parser.parse("!go"), ("go", None))
+
+    def test_case_sensitive(self):
+        parser = CommandParser("!", case_sensitive=True)
+        parser.add("%%fire (L|R)", lambda side: side)
+        self.assertEqual(parser.parse("!fire L"), "L")
+        self.assertIsNone(parser.parse("!Fire L"))
+        self.assertNotIn("Fire", parser)
+
+
+class DocoptAgreementTest(unittest.TestCase):
+    """
+    The fast path parses the commands it takes over like docopt would.
+    """
+
+    messages = {
+        "aim": ["N", "ne", "3 to 6", "N over 100ms", "N linear",
+                "3 to 6 over 500ms inout", "N over 1 in", "N to S linear",
+                "N over", "N 500", "", "N to S over 1 in extra",
+                "N over 1 to S"],
+        "fire": ["L", "R 100", "LR 200ms", "l", "X", "", "L 1 2"],
+        "button": ["a", "ab 100", "", "a 1 2"],
+        "dpad": ["up", "down 3", "", "up 1 2"],
+        "combo": ["a", "up up down a+b x:500", ""],
+    }
+
+    def test_fast_commands(self):
+        for name, messages in self.messages.items():
+            doc = getattr(ctrlbot_plugin.Plugin, name).__doc__
+            for data in messages:
+                with self.subTest(command=name, data=data):
+                    self.assertEqual(parser_values(doc, name, data),
+                                     docopt_values(doc, name, data))
+
+    def test_aim_examples(self):
+        doc = ctrlbot_plugin.Plugin.aim.__doc__
+        for data, action in (
+                ("N over 100ms", ("ramp", None, "N", 0.1, "inout")),
+                ("N linear", ("ramp", None, "N", 0.5, "linear")),
+                ("3 to 6 over 500ms inout", ("ramp", "3", "6", 0.5, "inout")),
+                ("ne", ("aim", "NE"))):
+            with self.subTest(data=data):
+                values = docopt_values(doc, "aim", data)
+                self.assertEqual(ctrlbot_plugin.aim_action(*values), action)
+
+
+if __name__ == "__main__":
+    unittest.main()
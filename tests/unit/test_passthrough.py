@@ -0,0 +1,87 @@
+# coding: utf-8
+import unittest
+from concurrent.futures import Future
+
+from ctrlbot_plugin import ControllerPoll
+from ctrlbotlib.delay import DelayLine
+from vxinputlib import GamepadState
+from xinputlib import Buttons, DeviceRegistry, XInput, fake
+
+
+class RecordingSink:
+
+    def __init__(self):
+        self.states = []
+
+    def set_state(self, state, mask):
+        self.states.append((state.buttons, mask))
+
+
+class ControllerPollTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xinput = XInput(
+            "xinput9_1_0", loader=lambda name: fake.load_library(name, 0))
+        self.devices = DeviceRegistry(self.xinput, min_backoff=1,
+                                      max_backoff=1)
+        self.sink = RecordingSink()
+        self.errors = []
+        self.poll = ControllerPoll(self.devices,
+                                   DelayLine(None, self.sink, 0),
+                                   on_error=self.errors.append)
+
+    def test_hot_plug(self):
+        self.poll(0.0)
+        self.assertIsNone(self.poll.ctrl)
+        pad = self.xinput.dll.connect(1)
+        pad.set(buttons=Buttons.a)
+        self.poll(1.0)
+        self.assertEqual(self.poll.ctrl.device_number, 1)
+        pad.set(buttons=Buttons.b)
+        self.poll(1.1)
+        self.xinput.dll.disconnect(1)
+        self.poll(1.2)
+        self.assertIsNone(self.poll.ctrl)
+        self.assertEqual(self.sink.states, [
+            (Buttons.a, GamepadState.axis_l),
+            (Buttons.b, GamepadState.axis_l),
+            # inputs of the disconnected controller are released
+            (0, GamepadState(0)),
+        ])
+
+    def test_back_passes_all_inputs(self):
+        pad = self.xinput.dll.connect(0)
+        pad.set(buttons=Buttons.back | Buttons.a)
+        self.poll(0.0)
+        self.assertEqual(self.sink.states,
+                         [(Buttons.back | Buttons.a, GamepadState.all)])
+
+    def test_load_failure_is_reported_once(self):
+        def fail(name):
+            raise OSError("no xinput")
+        self.xinput._loader = fail
+        for now in range(5):
+            self.poll(float(now))
+        self.assertEqual(len(self.errors), 1)
+        self.assertIsInstance(self.poll.error, OSError)
+        self.assertEqual(self.sink.states, [])
+
+    def test_get_state_error_is_reported_once(self):
+        self.xinput.dll.connect(0)
+        self.xinput.dll.XInputGetState = lambda device_number, ref: 5
+        for now in range(5):
+            self.poll(float(now))
+        self.assertEqual(len(self.errors), 1)
+        self.assertIsInstance(self.poll.error, RuntimeError)
+
+    def test_worker_error_is_reported(self):
+        future = Future()
+        future.set_exception(RuntimeError("Unknown error 5"))
+        self.poll.pending = future
+        self.poll._done(future)
+        self.assertIsNone(self.poll.pending)
+        self.assertEqual(self.errors, [future.exception()])
+
+
+if __name__ == "__main__":
+    unittest.main()
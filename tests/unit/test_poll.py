@@ -0,0 +1,85 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.poll import RollingPoll
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RollingPollTest(unittest.TestCase):
+
+    def test_leader(self):
+        poll = RollingPoll()
+        self.assertIsNone(poll.leader)
+        poll.vote("a")
+        poll.vote("b")
+        # ties keep the first leader
+        self.assertEqual(poll.leader, "a")
+        self.assertEqual(poll.vote("b"), 2)
+        self.assertEqual(poll.leader, "b")
+        self.assertEqual(poll.top(2), [("b", 2), ("a", 1)])
+
+    def test_rollover_clears_by_default(self):
+        poll = RollingPoll()
+        self.assertIsNone(poll.rollover())
+        poll.vote("a", 2)
+        poll.vote("b")
+        self.assertEqual(poll.rollover(), "a")
+        self.assertEqual(len(poll), 0)
+        self.assertIsNone(poll.leader)
+        self.assertIsNone(poll.rollover())
+
+    def test_rollover_keeps_fractions(self):
+        poll = RollingPoll(winner_keep=0.25, others_keep=0.5)
+        poll.vote("a", 4)
+        poll.vote("b", 3)
+        self.assertEqual(poll.rollover(), "a")
+        self.assertEqual(poll.votes("a"), 1)
+        self.assertEqual(poll.votes("b"), 1.5)
+        self.assertEqual(poll.leader, "b")
+        self.assertEqual(poll.rollover(), "b")
+
+    def test_winner_keep_repeats_the_winner(self):
+        poll = RollingPoll(winner_keep=1)
+        poll.vote("a")
+        for _ in range(3):
+            self.assertEqual(poll.rollover(), "a")
+
+    def test_small_votes_are_dropped(self):
+        poll = RollingPoll(others_keep=0.001)
+        poll.vote("a", 2)
+        poll.vote("b")
+        poll.rollover()
+        self.assertNotIn("b", poll)
+        self.assertNotIn("a", poll)
+
+    def test_decay(self):
+        clock = Clock()
+        poll = RollingPoll(half_life=1, clock=clock)
+        poll.vote("old", 3)
+        clock.now = 2.0
+        self.assertAlmostEqual(poll.votes("old"), 0.75)
+        poll.vote("new")
+        self.assertEqual(poll.leader, "new")
+        self.assertAlmostEqual(poll.top(1)[0][1], 1)
+
+    def test_rebase(self):
+        clock = Clock()
+        poll = RollingPoll(half_life=1, clock=clock)
+        poll.vote("a")
+        clock.now = 100.0
+        poll.vote("b")
+        self.assertAlmostEqual(poll.votes("b"), 1)
+        self.assertLess(poll._votes["b"], poll.max_weight)
+        self.assertEqual(poll.leader, "b")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.pool import ControllerPool, Pad
+from ctrlbotlib.worker import FFIWorker, WorkerLib
+from vxinputlib import Controller, GamepadState, VXInput, VrtCtrlError, fake
+
+
+class RecordingHistogram(list):
+
+    record = list.append
+
+
+class ControllerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vxinput = VXInput("vXboxInterface.dll",
+                               loader=fake.load_library)
+        self.pool = ControllerPool(
+            self.vxinput, [1, 2, 3],
+            lambda index, controller: Pad(index, controller, 0.01, 0.0),
+            capacity=2)
+        self.pool.plug_in()
+
+    def test_assign_by_hash(self):
+        pad = self.pool.assign("user")
+        self.assertIs(self.pool.assign("User"), pad)
+        self.assertEqual(len(self.pool.assignments), 0)
+
+    def test_join_and_leave(self):
+        hashed = self.pool.assign("user")
+        other = self.pool[(hashed.index + 1) % 3]
+        self.pool.join("user", other.index)
+        self.assertIs(self.pool.assign("user"), other)
+        self.pool.leave("user")
+        self.assertIs(self.pool.assign("user"), hashed)
+        with self.assertRaises(IndexError):
+            self.pool.join("user", 3)
+
+    def test_assignments_are_bounded(self):
+        self.pool.join("a", 0)
+        self.pool.join("b", 1)
+        # a was used last, b is evicted
+        self.pool.assign("a")
+        self.pool.join("c", 2)
+        self.assertEqual(list(self.pool.assignments), ["a", "c"])
+
+    def test_resync_failed_writes(self):
+        lib = self.vxinput._lib.load()
+        pad = self.pool[1]
+        pad.chat.set(GamepadState.a, True)
+        pad.chat.set(GamepadState.dpad, 1)
+        pad.tick(0.01)
+        lib.controls[2].clear()
+        self.pool.resync({(1, "SetBtnB"), (9, "SetBtnA")})
+        self.assertEqual(pad.compositor.dirty, 0)
+        pad.tick(0.02)
+        self.assertEqual(lib.controls[2], {})
+        # only the controls of the failed writes are sent again
+        self.pool.resync({(2, "SetBtnA"), (2, "SetDpad")})
+        pad.tick(0.03)
+        self.assertEqual(lib.controls[2], {"BtnA": True, "Dpad": 1})
+
+    def test_resync_all(self):
+        lib = self.vxinput._lib.load()
+        pad = self.pool[1]
+        pad.chat.set(GamepadState.a, True)
+        pad.tick(0.01)
+        lib.controls[2].clear()
+        pad.resync()
+        pad.tick(0.02)
+        self.assertTrue(lib.controls[2]["BtnA"])
+        self.assertEqual(len(lib.controls[2]), 17)
+
+    def test_failed_plug_in_unplugs(self):
+        # the fake bus has slots 1-4
+        pool = ControllerPool(
+            self.vxinput, [4, 5],
+            lambda index, controller: Pad(index, controller, 0.01, 0.0))
+        with self.assertRaises(VrtCtrlError):
+            pool.plug_in()
+        self.assertEqual(len(pool), 0)
+        self.assertNotIn(4, self.vxinput._lib.load().plugged)
+
+
+class PadLatencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.latency = RecordingHistogram()
+
+    def pad(self, controller, worker=None):
+        return Pad(0, controller, 0.01, 0.0, latency=self.latency,
+                   worker=worker, clock=lambda: 0.25)
+
+    def test_without_worker(self):
+        pad = self.pad(VXInput("vXboxInterface.dll",
+                               fake.load_library).controller(1))
+        pad.touch(0.1)
+        pad.chat.set(GamepadState.a, True)
+        pad.tick(0.2)
+        self.assertEqual(self.latency, [0.15])
+        # nothing to write, nothing to measure
+        pad.touch(0.3)
+        pad.tick(0.4)
+        self.assertEqual(self.latency, [0.15])
+
+    def test_until_the_worker_wrote(self):
+        lib = fake.load_library("vXboxInterface.dll")
+        lib.PlugIn(1)
+        worker = FFIWorker()
+        pad = self.pad(Controller(WorkerLib(lib, worker), 1), worker)
+        pad.touch(0.1)
+        pad.chat.set(GamepadState.a, True)
+        pad.tick(0.2)
+        self.assertEqual(self.latency, [])
+        worker.start().stop()
+        self.assertEqual(self.latency, [0.15])
+        self.assertTrue(lib.controls[1]["BtnA"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.ramps import RampPlayer
+from vxinputlib import GamepadState, angle_to_xy
+
+
+class RecordingLayer:
+    """
+    Compositor layer stand-in keeping the last value of each field.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def set(self, flag, value):
+        self.values[flag] = value
+
+    @property
+    def right(self):
+        return (self.values.get(GamepadState.axis_rx),
+                self.values.get(GamepadState.axis_ry))
+
+
+class RampPlayerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.player = RampPlayer(0.01, max_cache=4)
+        self.layer = RecordingLayer()
+
+    def test_curves(self):
+        for name in ("linear", "in", "out", "inout"):
+            fractions = self.player.curve(name, 4)
+            self.assertEqual(len(fractions), 4)
+            self.assertEqual(fractions[-1], 1.0)
+            self.assertIs(self.player.curve(name, 4), fractions)
+        self.assertEqual(self.player.curve("linear", 4),
+                         (0.25, 0.5, 0.75, 1.0))
+        with self.assertRaises(KeyError):
+            self.player.curve("bounce", 4)
+
+    def test_tables_are_cached_and_bounded(self):
+        line = self.player.line((0, 0), (100, -100), "linear", 2)
+        self.assertEqual(line, ((50, -50), (100, -100)))
+        self.assertIs(self.player.line((0, 0), (100, -100), "linear", 2),
+                      line)
+        arc = self.player.arc(0, 90, "linear", 2)
+        self.assertIs(self.player.arc(0, 90, "linear", 2), arc)
+        for steps in range(1, 10):
+            self.player.line((0, 0), (1, 1), "linear", steps)
+            self.player.arc(0, 90, "in", steps)
+        self.assertLessEqual(len(self.player._lines), 4)
+        self.assertLessEqual(len(self.player._arcs), 4)
+        self.assertLessEqual(len(self.player._curves), 4)
+
+    def test_arc_takes_the_shorter_way(self):
+        table = self.player.arc(350, 10, "linear", 2)
+        self.assertEqual(table[0], tuple(map(int, angle_to_xy(0, 100))))
+        table = self.player.arc(10, 350, "linear", 2)
+        self.assertEqual(table[0], tuple(map(int, angle_to_xy(0, 100))))
+        # opposite angles go clockwise
+        table = self.player.arc(0, 180, "linear", 2)
+        self.assertEqual(table[0], tuple(map(int, angle_to_xy(90, 100))))
+
+    def test_glide(self):
+        self.player.glide(self.layer, "right", (0, 0), (400, 0), 0.04,
+                          "linear", 0.0)
+        self.assertEqual(self.layer.right, (100, 0))
+        self.assertEqual(len(self.player), 1)
+        self.player.tick(0.01)
+        self.assertEqual(self.layer.right, (200, 0))
+        # late ticks skip ahead and end on time
+        self.player.tick(0.05)
+        self.assertEqual(self.layer.right, (400, 0))
+        self.assertEqual(len(self.player), 0)
+
+    def test_new_ramp_replaces_running(self):
+        self.player.glide(self.layer, "right", (0, 0), (400, 0), 0.04,
+                          "linear", 0.0)
+        self.player.sweep(self.layer, "right", 0, 90, 0.02, "linear", 0.0)
+        self.assertEqual(len(self.player), 1)
+        self.player.tick(0.02)
+        self.assertEqual(self.layer.right,
+                         tuple(map(int, angle_to_xy(90, 100))))
+
+    def test_cancel(self):
+        self.player.glide(self.layer, "right", (0, 0), (400, 0), 0.04,
+                          "linear", 0.0)
+        self.player.cancel(self.layer, "right")
+        self.player.tick(0.04)
+        self.assertEqual(self.layer.right, (100, 0))
+
+    def test_single_step(self):
+        self.player.glide(self.layer, "right", (0, 0), (400, 0), 0,
+                          "linear", 0.0)
+        self.assertEqual(self.layer.right, (400, 0))
+        self.assertEqual(len(self.player), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# coding: utf-8
+import asyncio
+import os
+import tempfile
+import unittest
+
+from ctrlbotlib.recording import MAGIC, RECORD, SESSION, Recorder, Replay
+from xinputlib import GamepadState
+
+
+class Clock:
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "test.rec")
+        self.clock = Clock()
+
+    def record(self, *frames, **kwargs):
+        with Recorder(self.path, self.clock, **kwargs) as recorder:
+            for delay, pad, frame in frames:
+                self.clock.now += delay
+                recorder.record(pad, frame)
+
+    def test_round_trip(self):
+        a = GamepadState(0x1000, 255, 0, -32768, 32767, 1, -1)
+        b = GamepadState(0x2000)
+        self.record((0.5, 0, a), (0.25, 1, b))
+        with Replay(self.path) as replay:
+            self.assertEqual(len(replay), 3)
+            self.assertEqual(replay[0][1], SESSION)
+            self.assertEqual(list(replay)[1:], [(0.5, 0, a), (0.75, 1, b)])
+            self.assertEqual(replay[-1], (0.75, 1, b))
+
+    def test_out_of_range_values_are_skipped(self):
+        with Recorder(self.path, self.clock) as recorder:
+            recorder.record(0, GamepadState(left_trigger=256))
+            self.assertEqual((recorder.records, recorder.errors), (0, 1))
+
+    def test_sessions_leave_out_the_gap(self):
+        frame = GamepadState()
+        self.record((0, 0, frame), (1, 0, frame))
+        # the bot runs again much later
+        self.clock.now += 3600
+        self.record((0.5, 0, frame), (2, 0, frame))
+        with Replay(self.path) as replay:
+            self.assertEqual(len(replay), 6)
+            self.assertEqual([time for time, pad, state in replay.frames()],
+                             [0, 1, 1, 3])
+
+    def test_play(self):
+        self.record((0, 0, GamepadState(1)), (0.01, 1, GamepadState(2)),
+                    (0.01, 5, GamepadState(3)))
+        sent = []
+
+        class Controller:
+            def set_state(self, state):
+                sent.append(state.buttons)
+
+        with Replay(self.path) as replay:
+            count = asyncio.run(replay.play([Controller(), Controller()],
+                                            speed=10))
+        self.assertEqual(count, 2)
+        self.assertEqual(sent, [1, 2])
+
+    def test_partial_trailing_record(self):
+        self.record((0, 0, GamepadState(1)))
+        with open(self.path, "ab") as f:
+            f.write(b"\0" * (RECORD.size - 1))
+        with Replay(self.path) as replay:
+            self.assertEqual(len(replay), 2)
+        # appending continues after the complete records
+        self.record((0, 0, GamepadState(2)))
+        with Replay(self.path) as replay:
+            self.assertEqual(replay[-1][2], GamepadState(2))
+
+    def test_not_a_recording(self):
+        open(self.path, "wb").close()
+        with self.assertRaises(ValueError):
+            Replay(self.path)
+        with open(self.path, "wb") as f:
+            f.write(b"CTRLREC\x01")
+        with self.assertRaises(ValueError):
+            Replay(self.path)
+        with self.assertRaises(ValueError):
+            Recorder(self.path)
+
+    def test_flush_on_tick(self):
+        recorder = Recorder(self.path, self.clock, flush_interval=5)
+        self.addCleanup(recorder.close)
+        recorder.record(0, GamepadState())
+        recorder.tick()
+        size = len(MAGIC) + RECORD.size
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.clock.now += 5
+        recorder.tick()
+        self.assertEqual(os.path.getsize(self.path), size + RECORD.size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# coding: utf-8
+import json
+import os
+import tempfile
+import unittest
+
+from ctrlbotlib.stats import Histogram, Stats
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_bucket_bounds(self):
+        histogram = Histogram(unit=1, highest=5000, precision=4)
+        previous = -1
+        for index in range(len(histogram.counts)):
+            low, high = histogram._bounds(index)
+            # buckets are contiguous and don't overlap
+            self.assertEqual(low, previous + 1, index)
+            previous = high
+            for units in (low, high):
+                self.assertEqual(histogram._index(units), index)
+            # relative error stays below 2 ** (1 - precision)
+            if low >= 1 << histogram.precision:
+                self.assertLess((high - low) / low, 2 ** -3)
+        self.assertGreaterEqual(previous, histogram.highest)
+
+    def test_exact_below_precision(self):
+        histogram = Histogram(unit=1, highest=1000, precision=7)
+        for units in range(128):
+            self.assertEqual(histogram._bounds(histogram._index(units)),
+                             (units, units))
+
+    def test_percentiles(self):
+        histogram = Histogram(unit=1, highest=1000)
+        self.assertEqual(histogram.percentile(50), 0.0)
+        for units in range(1, 101):
+            histogram.record(units)
+        self.assertEqual(histogram.percentile(50), 50)
+        self.assertEqual(histogram.percentile(99), 99)
+        self.assertEqual(histogram.percentile(100), 100)
+        self.assertEqual(histogram.mean, 50.5)
+
+
+    def test_percentile_is_bucket_top(self):
+        histogram = Histogram(unit=1, highest=1000, precision=7)
+        # 600 to 607 share a bucket, the top is capped at the maximum
+        histogram.record(600)
+        histogram.record(603)
+        self.assertEqual(histogram.percentile(50), 603)
+
+    def test_clamping(self):
+        histogram = Histogram(unit=1, highest=100)
+        histogram.record(-5)
+        histogram.record(1e9)
+        self.assertEqual((histogram.min, histogram.max), (0, 100))
+        self.assertEqual(histogram.percentile(100), 100)
+
+    def test_reset(self):
+        histogram = Histogram()
+        histogram.record(0.5)
+        histogram.reset()
+        self.assertEqual(histogram.summary()["count"], 0)
+        self.assertEqual(sum(histogram.counts), 0)
+
+
+class StatsTest(unittest.TestCase):
+
+    def test_snapshot(self):
+        stats = Stats()
+        stats.histogram("wait").record(0.001)
+        self.assertIs(stats.histogram("wait"), stats.histogram("wait"))
+        queue = [1, 2]
+        stats.counter("sent", lambda: 3)
+        stats.gauge("queue", lambda: len(queue))
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["histograms"]["wait"]["count"], 1)
+        self.assertEqual(snapshot["counters"], {"sent": 3})
+        self.assertEqual(snapshot["gauges"], {"queue": 2})
+        self.assertEqual(stats.format()[-1], "sent=3 queue=2")
+
+    def test_write(self):
+        stats = Stats()
+        stats.counter("sent", lambda: 1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stats.json")
+            stats.write(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)["counters"], {"sent": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+# coding: utf-8
+import unittest
+
+from ctrlbotlib.ticker import CATCHUP, SKIP, Ticker
+
+
+class FakeHandle:
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeLoop:
+    """
+    Event loop clock, advance(now) jumps to now and runs the timers due
+    by then in order, as late as a blocked loop would.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.handles = []
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback):
+        handle = FakeHandle(when, callback)
+        self.handles.append(handle)
+        return handle
+
+    def pending(self):
+        return [handle for handle in self.handles if not handle.cancelled]
+
+    def advance(self, now):
+        self.now = now
+        while True:
+            due = [handle for handle in self.pending() if handle.when <= now]
+            if not due:
+                break
+            handle = min(due, key=lambda handle: handle.when)
+            self.handles.remove(handle)
+            handle.callback()
+
+
+class RecordingHistogram(list):
+
+    record = list.append
+
+
+class TickerTest(unittest.TestCase):
+
+    rate = 1 / 8
+
+    def setUp(self):
+        self.loop = FakeLoop()
+        self.calls = []
+
+    def ticker(self, callback=None, **kwargs):
+        return Ticker(self.loop, self.rate, callback or self.calls.append,
+                      **kwargs)
+
+    def test_ticks_at_rate(self):
+        jitter = RecordingHistogram()
+        ticker = self.ticker(jitter=jitter).start()
+        self.assertTrue(ticker.running)
+        for i in range(1, 4):
+            self.loop.advance(i * self.rate)
+        self.loop.advance(0.45)
+        self.assertEqual(self.calls, [0.125, 0.25, 0.375])
+        self.assertEqual(jitter, [0.0, 0.0, 0.0])
+        self.assertEqual((ticker.ticks, ticker.missed), (3, 0))
+        self.assertEqual([handle.when for handle in self.loop.pending()],
+                         [0.5])
+
+    def test_start_delay(self):
+        self.ticker().start(0)
+        self.loop.advance(0.0)
+        self.loop.advance(0.125)
+        self.assertEqual(self.calls, [0.0, 0.125])
+
+    def test_skip(self):
+        ticker = self.ticker(policy=SKIP).start()
+        self.loop.advance(0.125)
+        # the tick due at 0.25 runs 0.35 late, 2 whole ticks behind
+        self.loop.advance(0.6)
+        self.assertEqual(self.calls, [0.125, 0.6])
+        self.assertEqual((ticker.missed, ticker.skipped), (2, 2))
+        # later ticks stay on the original deadlines
+        self.loop.advance(0.625)
+        self.assertEqual(self.calls[-1], 0.625)
+
+    def test_catchup(self):
+        ticker = self.ticker(policy=CATCHUP).start()
+        self.loop.advance(0.125)
+        self.loop.advance(0.6)
+        # missed ticks run with the time they were due, then the late one
+        self.assertEqual(self.calls, [0.125, 0.25, 0.375, 0.6])
+        self.assertEqual((ticker.missed, ticker.skipped), (2, 0))
+        self.loop.advance(0.625)
+        self.assertEqual(self.calls[-1], 0.625)
+
+    def test_max_catchup(self):
+        ticker = self.ticker(policy=CATCHUP, max_catchup=1).start()
+        self.loop.advance(0.7)
+        self.assertEqual(self.calls, [0.125, 0.7])
+        self.assertEqual((ticker.missed, ticker.skipped), (4, 3))
+        self.assertEqual(ticker.ticks, 2)
+
+    def test_stop_from_callback(self):
+        def callback(now):
+            self.calls.append(now)
+            ticker.stop()
+        ticker = self.ticker(callback).start()
+        self.loop.advance(0.125)
+        self.loop.advance(1.0)
+        self.assertEqual(self.calls, [0.125])
+        self.assertFalse(ticker.running)
+        self.assertEqual(self.loop.pending(), [])
+
+    def test_stop_from_callback_while_catching_up(self):
+        def callback(now):
+            self.calls.append(now)
+            ticker.stop()
+        ticker = self.ticker(callback, policy=CATCHUP).start()
+        self.loop.advance(0.6)
+        self.assertEqual(self.calls, [0.125])
+        self.assertEqual(self.loop.pending(), [])
+
+    def test_restart_from_callback(self):
+        def callback(now):
+            self.calls.append(now)
+            if len(self.calls) == 1:
+                ticker.start(1.0)
+        ticker = self.ticker(callback).start()
+        self.loop.advance(0.125)
+        self.assertEqual([handle.when for handle in self.loop.pending()],
+                         [1.125])
+        self.loop.advance(1.125)
+        self.loop.advance(1.25)
+        self.assertEqual(self.calls, [0.125, 1.125, 1.25])
+
+    def test_callback_error_is_logged(self):
+        def callback(now):
+            self.calls.append(now)
+            raise ValueError(now)
+        self.ticker(callback).start()
+        with self.assertLogs("ctrlbotlib.ticker", "ERROR"):
+            self.loop.advance(0.125)
+            self.loop.advance(0.25)
+        self.assertEqual(self.calls, [0.125, 0.25])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Ticker(self.loop, 0, print)
+        with self.assertRaises(ValueError):
+            Ticker(self.loop, self.rate, print, policy="drop")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# coding: utf-8
+import unittest
+
+from vxinputlib import (
+    AXIS_MAX, AXIS_MIN, GamepadState, VXInput, direction_to_xy, fake,
+)
+from xinputlib import Buttons
+from xinputlib import GamepadState as XInputState
+
+
+class DirectionTest(unittest.TestCase):
+
+    def test_clock_and_compass_agree(self):
+        for clock, compass in ((12, "N"), (3, "E"), (6, "S"), (9, "W")):
+            self.assertEqual(direction_to_xy(clock), direction_to_xy(compass))
+            self.assertEqual(direction_to_xy(str(clock)),
+                             direction_to_xy(compass.lower()))
+
+    def test_axes(self):
+        self.assertEqual(direction_to_xy("N"), (0, AXIS_MAX))
+        self.assertEqual(direction_to_xy("S"), (0, AXIS_MIN))
+        self.assertEqual(direction_to_xy("E")[0], AXIS_MAX)
+        self.assertEqual(direction_to_xy("W")[0], AXIS_MIN)
+
+    def test_amount_is_clamped_and_quantized(self):
+        self.assertEqual(direction_to_xy("E", 52), direction_to_xy("E", 50))
+        self.assertEqual(direction_to_xy("E", 250), direction_to_xy("E"))
+        self.assertEqual(direction_to_xy("E", -5), (0, 0))
+
+    def test_unknown_direction(self):
+        for dir in ("X", "13", 0, ""):
+            with self.assertRaises(ValueError):
+                direction_to_xy(dir)
+
+
+class ControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vxinput = VXInput("vXboxInterface.dll",
+                               loader=fake.load_library)
+        self.lib = self.vxinput._lib.load()
+        self.ctrl = self.vxinput.controller(1)
+
+    def test_set_state_sends_changes(self):
+        state = XInputState(Buttons.a, l_thumb_x=1000)
+        self.ctrl.set_state(state)
+        controls = self.lib.controls[1]
+        self.assertTrue(controls["BtnA"])
+        self.assertEqual(controls["AxisX"], 1000)
+        self.lib.reset_calls()
+        self.ctrl.set_state(state)
+        self.assertEqual(self.lib.calls, 0)
+        self.ctrl.set_state(XInputState(Buttons.b, l_thumb_x=1000))
+        self.assertEqual(self.lib.calls, 2)
+        self.assertFalse(controls["BtnA"])
+        self.assertTrue(controls["BtnB"])
+
+    def test_set_state_flags(self):
+        self.ctrl.set_state(XInputState(Buttons.a, l_thumb_x=1000),
+                            GamepadState.axis)
+        controls = self.lib.controls[1]
+        self.assertEqual(controls["AxisX"], 1000)
+        self.assertNotIn("BtnA", controls)
+
+    def test_resync(self):
+        state = XInputState(Buttons.a)
+        self.ctrl.set_state(state)
+        self.ctrl.resync()
+        self.lib.reset_calls()
+        self.ctrl.set_state(state)
+        self.assertGreater(self.lib.calls, 0)
+
+    def test_forget(self):
+        state = XInputState(Buttons.a | Buttons.dpad_up, l_thumb_x=1000)
+        self.ctrl.set_state(state)
+        self.assertEqual(self.ctrl.forget("SetAxisX"), GamepadState.axis_lx)
+        self.assertEqual(self.ctrl.forget("SetDpad"), GamepadState.dpad)
+        self.assertEqual(self.ctrl.forget("GetLedNumber"), GamepadState(0))
+        self.lib.reset_calls()
+        self.ctrl.set_state(state)
+        self.assertEqual(self.lib.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
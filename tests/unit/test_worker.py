@@ -0,0 +1,121 @@
+# coding: utf-8
+import queue
+import unittest
+
+from ctrlbotlib.compositor import Compositor
+from ctrlbotlib.pool import ControllerPool, Pad
+from ctrlbotlib.worker import FFIWorker, worker_loader
+from vxinputlib import GamepadState, VXInput, fake
+
+
+class FFIWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = FFIWorker(maxsize=2)
+        self.calls = []
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def write(self, *args):
+        self.calls.append(args)
+        return True
+
+    def test_writes_are_coalesced(self):
+        self.assertTrue(self.worker.submit("a", self.write, 1))
+        self.assertTrue(self.worker.submit("a", self.write, 2))
+        self.assertEqual(self.worker.coalesced, 1)
+        self.worker.start().stop()
+        self.assertEqual(self.calls, [(2,)])
+
+    def test_full_queue_rejects_new_keys(self):
+        self.assertTrue(self.worker.submit("a", self.write, 1))
+        self.assertTrue(self.worker.submit("b", self.write, 1))
+        self.assertFalse(self.worker.submit("c", self.write, 1))
+        self.assertTrue(self.worker.submit("a", self.write, 2))
+        self.assertEqual(self.worker.rejected, 1)
+
+    def test_call_result(self):
+        self.worker.start()
+        self.assertEqual(self.worker.call(sum, (1, 2)).result(1), 3)
+
+    def test_full_queue_rejects_calls(self):
+        self.worker.submit("a", self.write, 1)
+        self.worker.submit("b", self.write, 1)
+        with self.assertRaises(queue.Full):
+            self.worker.call(sum, (1, 2)).result(0)
+        self.assertEqual(self.worker.rejected, 1)
+
+    def test_failed_writes(self):
+        def fail():
+            raise OSError("driver")
+        self.worker.submit("a", lambda: False)
+        self.worker.submit("b", fail)
+        self.worker.call(lambda: None)
+        self.worker.start().stop()
+        self.assertEqual(self.worker.pop_failed(), {"a", "b"})
+        self.assertEqual(self.worker.pop_failed(), ())
+        self.assertEqual(self.worker.failed, 2)
+
+
+class WorkerLibTest(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = FFIWorker().start()
+        self.addCleanup(self.worker.stop)
+        self.vxinput = VXInput(
+            "vXboxInterface.dll",
+            worker_loader(fake.load_library, self.worker, timeout=1))
+
+    def test_blocking_call(self):
+        self.assertEqual(self.vxinput.get_num_empty_bus_slots(), 4)
+
+    def test_setup_on_the_worker(self):
+        # library calls made on the worker thread don't wait for it
+        pool = ControllerPool(
+            self.vxinput, [1, 2],
+            lambda index, controller: Pad(index, controller, 0.01, 0.0))
+        pool.plug_in(self.worker.call(pool.connect).result(1))
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(self.vxinput._lib.load()._lib.plugged, {1, 2})
+
+
+class FailedWriteTest(unittest.TestCase):
+    """
+    Writes the controller rejects are sent again on the next commit.
+    """
+
+    def setUp(self):
+        self.vxinput = VXInput("vXboxInterface.dll", fake.load_library)
+        self.lib = self.vxinput._lib.load()
+        self.compositor = Compositor(self.vxinput.controller(1))
+        self.layer = self.compositor.layer("chat")
+        self.rejecting = True
+        set_b = self.lib.functions["SetBtnB"].impl
+        self.lib.functions["SetBtnB"].impl = \
+            lambda id, value: not self.rejecting and set_b(id, value)
+
+    def test_rejected_release_is_retried(self):
+        self.rejecting = False
+        self.layer.set(GamepadState.b, True)
+        self.compositor.commit()
+        self.rejecting = True
+        self.layer.release(GamepadState.b)
+        self.assertTrue(self.compositor.commit())
+        self.assertTrue(self.lib.controls[1]["BtnB"])
+        self.assertEqual(self.compositor.dirty, GamepadState.b.value)
+        self.rejecting = False
+        self.assertTrue(self.compositor.commit())
+        self.assertFalse(self.lib.controls[1]["BtnB"])
+        self.assertFalse(self.compositor.commit())
+
+    def test_other_fields_are_sent(self):
+        self.layer.set(GamepadState.a, True)
+        self.layer.set(GamepadState.b, True)
+        self.compositor.commit()
+        self.assertEqual(self.lib.controls[1], {"BtnA": True})
+        self.assertEqual(self.compositor.dirty, GamepadState.b.value)
+
+
+if __name__ == "__main__":
+    unittest.main()
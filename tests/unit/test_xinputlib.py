@@ -0,0 +1,121 @@
+# coding: utf-8
+import unittest
+
+from xinputlib import (
+    CHANGED, CONNECTED, DISCONNECTED, Buttons, DeviceRegistry, XInput, fake,
+)
+
+
+class XInputGamepadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xinput = XInput(
+            "xinput9_1_0", loader=lambda name: fake.load_library(name, 0))
+
+    def test_update_after_connecting(self):
+        gamepad = self.xinput.get_device(0)
+        self.assertFalse(gamepad.update())
+        pad = self.xinput.dll.connect(0)
+        self.assertTrue(gamepad.update())
+        self.assertTrue(gamepad.is_connected())
+        for buttons in (Buttons.a, Buttons.b, 0):
+            pad.set(buttons=buttons)
+            self.assertTrue(gamepad.update())
+            self.assertEqual(gamepad.state.buttons, buttons)
+        self.assertFalse(gamepad.update())
+
+    def test_update_after_reconnecting(self):
+        pad = self.xinput.dll.connect(0)
+        gamepad = self.xinput.get_device(0)
+        pad.set(buttons=Buttons.a)
+        self.assertTrue(gamepad.update())
+        self.xinput.dll.disconnect(0)
+        self.assertTrue(gamepad.update())
+        self.assertIsNone(gamepad.state)
+        self.assertFalse(gamepad.update())
+        pad = self.xinput.dll.connect(0)
+        self.assertTrue(gamepad.update())
+        pad.set(buttons=Buttons.x)
+        self.assertTrue(gamepad.update())
+        self.assertEqual(gamepad.state.buttons, Buttons.x)
+
+    def test_missed_packets(self):
+        pad = self.xinput.dll.connect(0)
+        gamepad = self.xinput.get_device(0)
+        for i in range(3):
+            pad.set(left_trigger=i)
+        self.assertTrue(gamepad.update())
+        self.assertEqual(gamepad.missed_packets, 2)
+        self.assertEqual(gamepad.state.left_trigger, 2)
+
+
+class DeviceRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xinput = XInput(
+            "xinput9_1_0", loader=lambda name: fake.load_library(name, 0))
+        self.devices = DeviceRegistry(self.xinput, min_backoff=1,
+                                      max_backoff=4)
+        self.events = []
+        self.devices.listeners.append(
+            lambda kind, device: self.events.append(
+                (kind, device.device_number)))
+
+    def test_empty_slots_back_off(self):
+        probes = []
+        for now in range(16):
+            before = self.devices.probes
+            self.devices.poll(float(now))
+            if self.devices.probes > before:
+                probes.append(now)
+        # 4 slots probed at 0, then after 1, 2, 4 and 4 seconds
+        self.assertEqual(probes, [0, 1, 3, 7, 11, 15])
+        self.assertEqual(self.devices.probes, 4 * len(probes))
+
+    def test_hot_plug(self):
+        self.devices.poll(0.0)
+        pad = self.xinput.dll.connect(2)
+        # not probed before the backoff is over
+        self.assertEqual(self.devices.poll(0.5), [])
+        self.devices.poll(1.0)
+        self.assertEqual(self.events, [(CONNECTED, 2)])
+        self.assertEqual(self.devices.first().device_number, 2)
+        pad.set(buttons=Buttons.a)
+        self.devices.poll(1.1)
+        self.xinput.dll.disconnect(2)
+        self.devices.poll(1.2)
+        self.assertEqual(self.events[1:], [(CHANGED, 2), (DISCONNECTED, 2)])
+        self.assertIsNone(self.devices.first())
+        self.assertEqual(len(self.devices), 0)
+
+    def test_disconnect_resets_backoff(self):
+        self.devices.poll(0.0)
+        self.devices.poll(1.0)
+        self.devices.poll(3.0)
+        self.xinput.dll.connect(0)
+        self.devices.poll(7.0)
+        self.xinput.dll.disconnect(0)
+        self.devices.poll(7.5)
+        self.xinput.dll.connect(0)
+        # slot 0 is probed min_backoff after the disconnect
+        self.devices.poll(8.5)
+        self.assertEqual(self.events, [
+            (CONNECTED, 0), (DISCONNECTED, 0), (CONNECTED, 0)])
+
+    def test_slot_changes(self):
+        self.xinput.dll.connect(3)
+        self.devices.poll(0.0)
+        self.assertEqual(self.devices.first().device_number, 3)
+        self.xinput.dll.connect(1)
+        self.xinput.dll.disconnect(3)
+        self.devices.poll(1.0)
+        # events come in slot order
+        self.assertEqual(self.events, [
+            (CONNECTED, 3), (CONNECTED, 1), (DISCONNECTED, 3)])
+        self.assertEqual([device.device_number for device in self.devices],
+                         [1])
+        self.assertEqual(self.devices.first().device_number, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -51,14 +51,91 @@ SIGNATURES = {
 }
 
 
+COMPASS_DEGREES = {
+    "N": 0, "E": 90, "S": 180, "W": 270,
+    "NE": 45, "NW": 315, "SE": 135, "SW": 225,
+    "NNE": 22.5, "ENE": 67.5, "ESE": 112.5, "SSE": 157.5,
+    "SSW": 202.5, "WSW": 247.5, "WNW": 292.5, "NNW": 337.5,
+}
+# analog amounts are quantized to this many percent
+AMOUNT_STEP = 5
+
+
 class VrtCtrlError(Exception):
     pass
 
 
-def control_setter(fn):
+def angle_to_xy(angle_degrees, amount):
+    angle_radians = math.radians(-90 + angle_degrees)
+    x = math.cos(angle_radians) * AXIS_MAX / 100 * amount
+    y = math.sin(angle_radians) * AXIS_MIN / 100 * amount
+    return x, y
+
+
+def _direction_angles():
+    angles = {}
+    for name, degrees in COMPASS_DEGREES.items():
+        angles[name] = angles[name.lower()] = degrees
+    for clock in range(1, 13):
+        angles[clock] = angles[str(clock)] = (360.0 / 12) * (clock % 12)
+    return angles
+
+
+# direction -> degrees clockwise from N, for clock directions 1-12 and
+# compass directions in upper and lower case
+DIRECTION_ANGLES = _direction_angles()
+
+
+def _direction_table():
+    table = {}
+    for dir, degrees in DIRECTION_ANGLES.items():
+        for amount in range(0, 101, AMOUNT_STEP):
+            x, y = angle_to_xy(degrees, amount)
+            table[dir, amount] = (int(x), int(y))
+    return table
+
+
+# (direction, amount) -> (x, y) axis values, for clock directions 1-12 and
+# compass directions in upper and lower case
+DIRECTIONS = _direction_table()
+
+
+def direction_to_xy(dir, amount=100):
+    """
+    Axis values for a clock (1-12) or compass (N, NNE, NE, ...) direction.
+
+    :param dir: direction
+    :param amount: deflection in percent, clamped to 0-100 and rounded to
+        AMOUNT_STEP
+    :return: (x, y) tuple of axis values
+    :raises ValueError: for unknown directions
+    """
+    if amount != 100:
+        amount = AMOUNT_STEP * round(max(0, min(100, amount)) / AMOUNT_STEP)
+    try:
+        return DIRECTIONS[dir, amount]
+    except KeyError:
+        raise ValueError(f"invalid direction {dir!r}") from None
+
+
+def control_setter(fn, field=None, value=None):
+    """
+    Create a Controller method calling DLL function fn.
+
+    Successful calls are recorded in the controller's shadow state under
+    field, using value if given, otherwise the first argument. Calls are
+    counted per function in the controller's calls.
+    """
     def set_control(self, *values):
         if filter(None.__ne__, values):
-            return getattr(self._lib, fn)(self._id, *values)
+            calls = self.calls
+            calls[fn] = calls.get(fn, 0) + 1
+            result = getattr(self._lib, fn)(self._id, *values)
+            if result and field is not None:
+                self._shadow[field] = values[0] if value is None else value
+            return result
+    set_control.fn = fn
+    set_control.field = field
     return set_control
 
 
@@ -89,111 +166,242 @@ class GamepadState(enum.Flag):
     all = buttons | triggers | axis
 
 
+_DPAD = GamepadState.dpad.value
+
+# GamepadState field -> attribute of state objects passed to set_state,
+# buttons are read from the XInput wButtons word in their buttons attribute
+STATE_ATTRS = {
+    "start": "start",
+    "back": "back",
+    "lt": "left_thumb",
+    "rt": "right_thumb",
+    "lb": "left_shoulder",
+    "rb": "right_shoulder",
+    "a": "a",
+    "b": "b",
+    "x": "x",
+    "y": "y",
+    "trigger_l": "left_trigger",
+    "trigger_r": "right_trigger",
+    "axis_lx": "l_thumb_x",
+    "axis_ly": "l_thumb_y",
+    "axis_rx": "r_thumb_x",
+    "axis_ry": "r_thumb_y",
+}
+
+# button GamepadState field -> its bit in the wButtons word
+STATE_BUTTONS = {
+    "start": 0x0010,
+    "back": 0x0020,
+    "lt": 0x0040,
+    "rt": 0x0080,
+    "lb": 0x0100,
+    "rb": 0x0200,
+    "a": 0x1000,
+    "b": 0x2000,
+    "x": 0x4000,
+    "y": 0x8000,
+}
+_DPAD_BUTTONS = DPAD_UP | DPAD_DOWN | DPAD_LEFT | DPAD_RIGHT
+
+
 class Controller:
-    set_dpad_up = control_setter("SetDpadUp")
-    set_dpad_down = control_setter("SetDpadDown")
-    set_dpad_left = control_setter("SetDpadLeft")
-    set_dpad_right = control_setter("SetDpadRight")
-    set_dpad_off = control_setter("SetDpadOff")
-    set_dpad = control_setter("SetDpad")
-    set_btn_a = control_setter("SetBtnA")
-    set_btn_b = control_setter("SetBtnB")
-    set_btn_x = control_setter("SetBtnX")
-    set_btn_y = control_setter("SetBtnY")
-    set_btn_start = control_setter("SetBtnStart")
-    set_btn_back = control_setter("SetBtnBack")
-    set_btn_lt = control_setter("SetBtnLT")
-    set_btn_rt = control_setter("SetBtnRT")
-    set_btn_lb = control_setter("SetBtnLB")
-    set_btn_rb = control_setter("SetBtnRB")
-    set_axis_lx = control_setter("SetAxisX")
-    set_axis_ly = control_setter("SetAxisY")
-    set_axis_rx = control_setter("SetAxisRx")
-    set_axis_ry = control_setter("SetAxisRy")
-    set_trigger_l = control_setter("SetTriggerL")
-    set_trigger_r = control_setter("SetTriggerR")
+    set_dpad_up = control_setter("SetDpadUp", "dpad", DPAD_UP)
+    set_dpad_down = control_setter("SetDpadDown", "dpad", DPAD_DOWN)
+    set_dpad_left = control_setter("SetDpadLeft", "dpad", DPAD_LEFT)
+    set_dpad_right = control_setter("SetDpadRight", "dpad", DPAD_RIGHT)
+    set_dpad_off = control_setter("SetDpadOff", "dpad", DPAD_OFF)
+    set_dpad = control_setter("SetDpad", "dpad")
+    set_btn_a = control_setter("SetBtnA", "a")
+    set_btn_b = control_setter("SetBtnB", "b")
+    set_btn_x = control_setter("SetBtnX", "x")
+    set_btn_y = control_setter("SetBtnY", "y")
+    set_btn_start = control_setter("SetBtnStart", "start")
+    set_btn_back = control_setter("SetBtnBack", "back")
+    set_btn_lt = control_setter("SetBtnLT", "lt")
+    set_btn_rt = control_setter("SetBtnRT", "rt")
+    set_btn_lb = control_setter("SetBtnLB", "lb")
+    set_btn_rb = control_setter("SetBtnRB", "rb")
+    set_axis_lx = control_setter("SetAxisX", "axis_lx")
+    set_axis_ly = control_setter("SetAxisY", "axis_ly")
+    set_axis_rx = control_setter("SetAxisRx", "axis_rx")
+    set_axis_ry = control_setter("SetAxisRy", "axis_ry")
+    set_trigger_l = control_setter("SetTriggerL", "trigger_l")
+    set_trigger_r = control_setter("SetTriggerR", "trigger_r")
+
+    # (GamepadState value, shadow field, state attribute, wButtons bit or
+    # 0 for analog fields, setter) used by set_state, dpad is handled
+    # separately
+    _state_fields = tuple(
+        (GamepadState[field].value, field, STATE_ATTRS[field],
+         STATE_BUTTONS.get(field, 0), setter)
+        for field, setter in (
+            ("start", set_btn_start),
+            ("back", set_btn_back),
+            ("lt", set_btn_lt),
+            ("rt", set_btn_rt),
+            ("lb", set_btn_lb),
+            ("rb", set_btn_rb),
+            ("a", set_btn_a),
+            ("b", set_btn_b),
+            ("x", set_btn_x),
+            ("y", set_btn_y),
+            ("trigger_l", set_trigger_l),
+            ("trigger_r", set_trigger_r),
+            ("axis_lx", set_axis_lx),
+            ("axis_ly", set_axis_ly),
+            ("axis_rx", set_axis_rx),
+            ("axis_ry", set_axis_ry),
+        )
+    )
+
+    # DLL function name -> shadow field it writes, see forget
+    _control_fields = {
+        setter.fn: setter.field
+        for setter in (set_dpad_up, set_dpad_down, set_dpad_left,
+                       set_dpad_right, set_dpad_off, set_dpad,
+                       *(entry[4] for entry in _state_fields))
+    }
 
     def __init__(self, lib, id):
         self._lib = lib
         self._id = id
+        # last value successfully sent per field, see control_setter
+        self._shadow = {}
+        # DLL function name -> number of calls
+        self.calls = {}
+
+    def resync(self):
+        """
+        Forget the shadow state, the next set_state sends all fields.
+        """
+        self._shadow.clear()
+
+    def forget(self, control):
+        """
+        Forget the shadow of the field DLL function control writes, e.g.
+        after a queued write failed, the next set_state sends it again.
+
+        :return: GamepadState of the field, empty for unknown functions
+        """
+        field = self._control_fields.get(control)
+        if field is None:
+            return GamepadState(0)
+        self._shadow.pop(field, None)
+        return GamepadState[field]
 
     def destroy(self, force=False):
+        self._shadow.clear()
         if force:
             return self._lib.UnPlugForce(self._id) == 1
         else:
             return self._lib.UnPlug(self._id) == 1
 
     def set_ls(self, dir, amount=100):
-        try:
-            x, y = self.clock_to_xy(int(dir), amount)
-        except ValueError:
-            x, y = self.compass_to_xy(dir, amount)
-        self.set_axis_lx(int(x))
-        self.set_axis_ly(int(y))
+        x, y = direction_to_xy(dir, amount)
+        self.set_axis_lx(x)
+        self.set_axis_ly(y)
 
     def set_rs(self, dir, amount=100):
-        try:
-            x, y = self.clock_to_xy(int(dir), amount)
-        except ValueError:
-            x, y = self.compass_to_xy(dir, amount)
-        self.set_axis_rx(int(x))
-        self.set_axis_ry(int(y))
-
-    def compass_to_xy(self, dir, amount):
-        angle_degrees = {
-            "N": 0, "E": 90, "S": 180, "W": 270,
-            "NE": 45, "NW": 315, "SE": 135, "SW": 225,
-            "NNE": 22.5, "ENE": 67.5, "ESE": 112.5, "SSE": 157.5,
-            "SSW": 202.5, "WSW": 247.5, "WNW": 292.5, "NNW": 337.5,
-        }.get(dir, 0)
-        angle_radians = math.radians(-90 + angle_degrees)
-        x = math.cos(angle_radians) * AXIS_MAX / 100 * amount
-        y = math.sin(angle_radians) * AXIS_MIN / 100 * amount
-        return x, y
-
-    def clock_to_xy(self, clock, amount):
-        angle_degrees = (360.0 / 12) * (clock % 12)
-        angle_radians = math.radians(-90 + angle_degrees)
-        x = math.cos(angle_radians) * AXIS_MAX / 100 * amount
-        y = math.sin(angle_radians) * AXIS_MIN / 100 * amount
-        return x, y
-
-    def set_state(self, state, flags=GamepadState.all):
-        if GamepadState.dpad in flags:
-            state_dpad = (
-                (DPAD_UP if state.dpad_up else 0)
-                ^ (DPAD_DOWN if state.dpad_down else 0)
-                ^ (DPAD_LEFT if state.dpad_left else 0)
-                ^ (DPAD_RIGHT if state.dpad_right else 0)
-            )
-            self.set_dpad(state_dpad)
-        if GamepadState.start in flags: self.set_btn_start(state.start)
-        if GamepadState.back in flags: self.set_btn_back(state.back)
-        if GamepadState.lt in flags: self.set_btn_lt(state.left_thumb)
-        if GamepadState.rt in flags: self.set_btn_rt(state.right_thumb)
-        if GamepadState.lb in flags: self.set_btn_lb(state.left_shoulder)
-        if GamepadState.rb in flags: self.set_btn_rb(state.right_shoulder)
-        if GamepadState.a in flags: self.set_btn_a(state.a)
-        if GamepadState.b in flags: self.set_btn_b(state.b)
-        if GamepadState.x in flags: self.set_btn_x(state.x)
-        if GamepadState.y in flags: self.set_btn_y(state.y)
-        if GamepadState.trigger_l in flags: self.set_trigger_l(state.left_trigger)
-        if GamepadState.trigger_r in flags: self.set_trigger_r(state.right_trigger)
-        if GamepadState.axis_lx in flags: self.set_axis_lx(state.l_thumb_x)
-        if GamepadState.axis_ly in flags: self.set_axis_ly(state.l_thumb_y)
-        if GamepadState.axis_rx in flags: self.set_axis_rx(state.r_thumb_x)
-        if GamepadState.axis_ry in flags: self.set_axis_ry(state.r_thumb_y)
-        if GamepadState.axis_ry in flags: self.set_axis_ry(state.r_thumb_y)
+        x, y = direction_to_xy(dir, amount)
+        self.set_axis_rx(x)
+        self.set_axis_ry(y)
+
+    def set_state(self, state, flags=GamepadState.all, force=False):
+        """
+        Send state to the controller.
+
+        Only fields selected by flags whose value differs from the last value
+        sent are written. With force all selected fields are written.
+
+        state is read like a xinputlib.GamepadState, buttons from the
+        wButtons word in state.buttons, other fields by STATE_ATTRS.
+
+        :return: GamepadState of the fields whose write failed, their
+            shadow is left as it was so the next call writes them again
+        """
+        flags = flags.value
+        shadow = self._shadow
+        if force:
+            shadow.clear()
+        failed = 0
+        buttons = state.buttons
+        if flags & _DPAD:
+            state_dpad = buttons & _DPAD_BUTTONS
+            if shadow.get("dpad") != state_dpad \
+                    and not self.set_dpad(state_dpad):
+                failed |= _DPAD
+        for flag, field, attr, button, setter in self._state_fields:
+            if flags & flag:
+                if button:
+                    value = bool(buttons & button)
+                else:
+                    value = getattr(state, attr)
+                if shadow.get(field) != value and not setter(self, value):
+                    failed |= flag
+        return GamepadState(failed)
+
+
+def load_library(dll_path):
+    return cdll.LoadLibrary(dll_path)
+
+
+class LazyLibrary:
+    """
+    Library loaded on first use. Functions get their argtypes from
+    signatures and restype when they are first looked up, and are then
+    kept as attributes, so later lookups don't come back here.
+
+    :param str path: library path passed to loader
+    :param loader: callable loading the library from path
+    """
+
+    def __init__(self, path, loader, signatures=SIGNATURES, restype=c_bool):
+        self._path = path
+        self._loader = loader
+        self._signatures = signatures
+        self._restype = restype
+        self._lib = None
+
+    @property
+    def loaded(self):
+        return self._lib is not None
+
+    def load(self):
+        """
+        Load the library if it isn't yet, and return it.
+        """
+        if self._lib is None:
+            self._lib = self._loader(self._path)
+        return self._lib
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        fn = getattr(self.load(), name)
+        if not callable(fn):
+            return fn
+        argtypes = self._signatures.get(name)
+        if argtypes is not None:
+            fn.argtypes = argtypes
+            fn.restype = self._restype
+        setattr(self, name, fn)
+        return fn
 
 
 class VXInput:
-    def __init__(self, dll_path):
+    """
+    The library is loaded when it is first used, not on creation, so a
+    missing driver shows up when plugging in controllers.
+
+    :param str dll_path: path to vXboxInterface.dll
+    :param loader: callable loading the library from dll_path, see
+        vxinputlib.fake.load_library for a stand-in
+    """
+
+    def __init__(self, dll_path, loader=load_library):
         self.dll_path = dll_path
-        self._lib = cdll.LoadLibrary(dll_path)
-        for k, v in SIGNATURES.items():
-            fn = getattr(self._lib, k)
-            fn.argtypes = v
-            fn.restype = c_bool
+        self._lib = LazyLibrary(dll_path, loader)
 
     def vbus_exists(self):
         """
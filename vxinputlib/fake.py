@@ -0,0 +1,158 @@
+# coding: utf-8
+"""
+Pure Python stand-in for vXboxInterface.dll.
+
+Use load_library in place of vxinputlib.load_library to run without the
+vXbox driver, e.g. on CI or for benchmarks::
+
+    lib = VXInput("vXboxInterface.dll", loader=fake.load_library)
+"""
+import time
+
+from . import DPAD_UP, DPAD_DOWN, DPAD_LEFT, DPAD_RIGHT, DPAD_OFF
+
+
+MAX_CONTROLLERS = 4
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class FakeFunction:
+    """
+    Callable standing in for a ctypes function pointer.
+
+    Counts calls, optionally records arguments, and burns call_cost seconds
+    per call to simulate the cost of crossing into the driver.
+    """
+
+    def __init__(self, name, impl, call_cost=0.0, record=False):
+        self.__name__ = name
+        self.argtypes = None
+        self.restype = None
+        self.impl = impl
+        self.call_cost = call_cost
+        self.record = record
+        self.calls = 0
+        self.args = []
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.record:
+            self.args.append(args)
+        if self.call_cost:
+            busy_wait(self.call_cost)
+        return self.impl(*args)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.__name__}>"
+
+
+class FakeVXBox:
+    """
+    Virtual bus with up to four controllers, keeping the last value written
+    per controller and control in `controls`.
+
+    :param float call_cost: seconds each call takes
+    :param bool record: keep the arguments of every call
+    """
+
+    def __init__(self, call_cost=0.0, record=False):
+        self.call_cost = call_cost
+        self.record = record
+        self.plugged = set()
+        self.controls = {}
+        self._functions = {}
+        impls = {
+            "isVBusExists": lambda: 1,
+            "GetNumEmptyBusSlots": self._get_num_empty_bus_slots,
+            "isControllerExists": lambda id: id in self.plugged,
+            "isControllerOwned": lambda id: id in self.plugged,
+            "PlugIn": self._plug_in,
+            "UnPlug": self._unplug,
+            "UnPlugForce": self._unplug,
+            "SetDpadUp": self._dpad_setter(DPAD_UP),
+            "SetDpadDown": self._dpad_setter(DPAD_DOWN),
+            "SetDpadLeft": self._dpad_setter(DPAD_LEFT),
+            "SetDpadRight": self._dpad_setter(DPAD_RIGHT),
+            "SetDpadOff": self._dpad_setter(DPAD_OFF),
+            "SetDpad": self._setter("Dpad"),
+            "GetLedNumber": self._get_led_number,
+        }
+        for control in ("BtnA", "BtnB", "BtnX", "BtnY", "BtnStart",
+                        "BtnBack", "BtnLT", "BtnRT", "BtnLB", "BtnRB",
+                        "BtnGD", "TriggerL", "TriggerR",
+                        "AxisX", "AxisY", "AxisRx", "AxisRy"):
+            impls["Set" + control] = self._setter(control)
+        for name, impl in impls.items():
+            self._functions[name] = FakeFunction(
+                name, impl, call_cost, record)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_functions"][name]
+        except KeyError:
+            raise AttributeError(f"function {name!r} not found") from None
+
+    @property
+    def functions(self):
+        return self._functions
+
+    @property
+    def calls(self):
+        """
+        Total number of calls into the fake library.
+        """
+        return sum(fn.calls for fn in self._functions.values())
+
+    def reset_calls(self):
+        for fn in self._functions.values():
+            fn.calls = 0
+            fn.args.clear()
+
+    def _get_num_empty_bus_slots(self, ref):
+        ref._obj.value = MAX_CONTROLLERS - len(self.plugged)
+        return True
+
+    def _get_led_number(self, id, ref):
+        if id not in self.plugged:
+            return False
+        ref._obj.value = id
+        return True
+
+    def _plug_in(self, id):
+        if id in self.plugged or not 1 <= id <= MAX_CONTROLLERS:
+            return False
+        self.plugged.add(id)
+        self.controls[id] = {}
+        return True
+
+    def _unplug(self, id):
+        if id not in self.plugged:
+            return False
+        self.plugged.discard(id)
+        del self.controls[id]
+        return True
+
+    def _setter(self, control):
+        def set_control(id, value):
+            if id not in self.plugged:
+                return False
+            self.controls[id][control] = value
+            return True
+        return set_control
+
+    def _dpad_setter(self, value):
+        def set_dpad(id, *ignored):
+            if id not in self.plugged:
+                return False
+            self.controls[id]["Dpad"] = value
+            return True
+        return set_dpad
+
+
+def load_library(dll_path, call_cost=0.0, record=False):
+    return FakeVXBox(call_cost, record)
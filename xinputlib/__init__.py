@@ -1,13 +1,16 @@
 # coding: utf-8
 
 import ctypes
-from collections import namedtuple, OrderedDict
 from enum import IntFlag
 from pprint import pprint
 
 ERROR_DEVICE_NOT_CONNECTED = 1167
 ERROR_SUCCESS = 0
 
+CONNECTED = "connected"
+DISCONNECTED = "disconnected"
+CHANGED = "changed"
+
 
 class Buttons(IntFlag):
     dpad_up = 0x0001
@@ -25,11 +28,6 @@ class Buttons(IntFlag):
     x = 0x4000
     y = 0x8000
 
-    @classmethod
-    def asdict(cls, value):
-        value = cls(value)
-        return {flag._name_: flag in value for flag in cls}
-
 
 def get_bit_values(number, size=32):
     """
@@ -81,24 +79,87 @@ class XInputVibrationStruct(ctypes.Structure):
     ]
 
 
-GamepadState = namedtuple("GamepadState", [
-    "dpad_up", "dpad_down", "dpad_left", "dpad_right",
-    "start", "back",
-    "left_thumb", "right_thumb",
-    "left_shoulder", "right_shoulder",
-    "a", "b", "x", "y",
-    "left_trigger", "right_trigger",
-    "l_thumb_x", "l_thumb_y",
-    "r_thumb_x", "r_thumb_y",
-])
+def _button(bit):
+    def get(self):
+        return bool(self.buttons & bit)
+    return property(get)
+
+
+class GamepadState:
+    """
+    Gamepad state as XInputGamepadStruct holds it: all buttons in the
+    wButtons word buttons, plus triggers and thumb sticks. Single buttons
+    are properties reading the word.
+
+    States are shared, e.g. queued in a DelayLine, treat them as read
+    only.
+    """
+
+    __slots__ = ("buttons", "left_trigger", "right_trigger",
+                 "l_thumb_x", "l_thumb_y", "r_thumb_x", "r_thumb_y")
+
+    dpad_up = _button(Buttons.dpad_up)
+    dpad_down = _button(Buttons.dpad_down)
+    dpad_left = _button(Buttons.dpad_left)
+    dpad_right = _button(Buttons.dpad_right)
+    start = _button(Buttons.start)
+    back = _button(Buttons.back)
+    left_thumb = _button(Buttons.left_thumb)
+    right_thumb = _button(Buttons.right_thumb)
+    left_shoulder = _button(Buttons.left_shoulder)
+    right_shoulder = _button(Buttons.right_shoulder)
+    a = _button(Buttons.a)
+    b = _button(Buttons.b)
+    x = _button(Buttons.x)
+    y = _button(Buttons.y)
+
+    def __init__(self, buttons=0, left_trigger=0, right_trigger=0,
+                 l_thumb_x=0, l_thumb_y=0, r_thumb_x=0, r_thumb_y=0):
+        self.buttons = buttons
+        self.left_trigger = left_trigger
+        self.right_trigger = right_trigger
+        self.l_thumb_x = l_thumb_x
+        self.l_thumb_y = l_thumb_y
+        self.r_thumb_x = r_thumb_x
+        self.r_thumb_y = r_thumb_y
+
+    @classmethod
+    def from_struct(cls, gamepad):
+        """
+        State of a XInputGamepadStruct.
+        """
+        return cls(gamepad.buttons, gamepad.left_trigger,
+                   gamepad.right_trigger, gamepad.l_thumb_x,
+                   gamepad.l_thumb_y, gamepad.r_thumb_x, gamepad.r_thumb_y)
+
+    def astuple(self):
+        return (self.buttons, self.left_trigger, self.right_trigger,
+                self.l_thumb_x, self.l_thumb_y, self.r_thumb_x,
+                self.r_thumb_y)
+
+    def __eq__(self, other):
+        if not isinstance(other, GamepadState):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(buttons=0x{self.buttons:04x}"
+                f", left_trigger={self.left_trigger}"
+                f", right_trigger={self.right_trigger}"
+                f", l_thumb_x={self.l_thumb_x}, l_thumb_y={self.l_thumb_y}"
+                f", r_thumb_x={self.r_thumb_x}, r_thumb_y={self.r_thumb_y})")
 
 
 class XInputGamepad:
     def __init__(self, lib, device_number, normalize_axes=True):
         self._lib = lib
         self.device_number = device_number
-        self._last_state = self._current_state = \
-            self._lib.get_state(self.device_number)
+        # states are read alternately into these two buffers, the spare one
+        # is only swapped in when the packet number changed
+        self._spare_state = XInputStateStruct()
+        self._current_state = \
+            self._lib.get_state(self.device_number, XInputStateStruct())
+        self._state = None
         self.received_packets = 0
         self.missed_packets = 0
         if normalize_axes:
@@ -107,8 +168,32 @@ class XInputGamepad:
             self.translate = self.translate_identity
 
     def update(self):
-        self._last_state = self._current_state
-        self._current_state = self._lib.get_state(self.device_number)
+        """
+        Read the current device state.
+
+        :return: True if the state changed since the last update, including
+            connecting and disconnecting the device
+        """
+        current = self._current_state
+        new = self._lib.get_state(self.device_number, self._spare_state)
+        if new is None:
+            if current is None:
+                return False
+            self._spare_state = current
+        elif current is None:
+            # new is the spare buffer, it needs a fresh one to replace it
+            self._spare_state = XInputStateStruct()
+            self.received_packets += 1
+        else:
+            gap = (new.packet_number - current.packet_number) & 0xFFFFFFFF
+            if not gap:
+                return False
+            self.received_packets += 1
+            self.missed_packets += gap - 1
+            self._spare_state = current
+        self._current_state = new
+        self._state = None
+        return True
 
     def translate_using_data_size(self, value, data_size):
         # normalizes analog data to [0,1] for unsigned data
@@ -120,27 +205,38 @@ class XInputGamepad:
         return value
 
     def is_connected(self):
-        return self._last_state is not None
+        return self._current_state is not None
 
     def set_vibration(self, left, right):
         self._lib.set_vibration(self.device_number, left, right)
 
     @property
     def state(self):
-        return GamepadState(
-            left_trigger=self._current_state.gamepad.left_trigger,
-            right_trigger=self._current_state.gamepad.right_trigger,
-            l_thumb_x=self._current_state.gamepad.l_thumb_x,
-            l_thumb_y=self._current_state.gamepad.l_thumb_y,
-            r_thumb_x=self._current_state.gamepad.r_thumb_x,
-            r_thumb_y=self._current_state.gamepad.r_thumb_y,
-            **Buttons.asdict(self._current_state.gamepad.buttons)
-        )
+        """
+        State of the last update, built once per received packet.
+
+        :return: GamepadState, or None if the device is not connected
+        """
+        if self._state is None and self._current_state is not None:
+            self._state = GamepadState.from_struct(
+                self._current_state.gamepad)
+        return self._state
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.device_number})"
 
 
+# GamepadState with no buttons pressed and all axes centered
+NEUTRAL_STATE = GamepadState()
+
+
+def load_library(dllname):
+    windll = getattr(ctypes, "windll", None)
+    if windll is None:
+        raise OSError(f"can't load {dllname}, XInput is only on Windows")
+    return getattr(windll, dllname)
+
+
 class XInput:
     """
     Win 8 version
@@ -157,15 +253,26 @@ class XInput:
 
     max_devices = 4
 
-    def __init__(self, dllname, gamepad_factory=XInputGamepad):
+    def __init__(self, dllname, gamepad_factory=XInputGamepad,
+                 loader=load_library):
         self.gamepad_factory = gamepad_factory
         self.dllname = dllname
-        self.dll = getattr(ctypes.windll, dllname)
+        self._loader = loader
+        self._dll = None
 
-        XInputSetState = self.dll.XInputSetState
-        XInputSetState.argtypes = [ctypes.c_uint,
-                                   ctypes.POINTER(XInputVibrationStruct)]
-        XInputSetState.restype = ctypes.c_uint
+    @property
+    def dll(self):
+        """
+        The XInput library, loaded on first use.
+        """
+        if self._dll is None:
+            dll = self._loader(self.dllname)
+            XInputSetState = dll.XInputSetState
+            XInputSetState.argtypes = [ctypes.c_uint,
+                                       ctypes.POINTER(XInputVibrationStruct)]
+            XInputSetState.restype = ctypes.c_uint
+            self._dll = dll
+        return self._dll
 
     def enumerate_devices(self):
         """
@@ -180,8 +287,14 @@ class XInput:
     def get_device(self, device_number):
         return self.gamepad_factory(self, device_number)
 
-    def get_state(self, device_number):
-        state = XInputStateStruct()
+    def get_state(self, device_number, state=None):
+        """
+        Read device state, into state if given.
+
+        :return: XInputStateStruct, or None if the device is not connected
+        """
+        if state is None:
+            state = XInputStateStruct()
         res = self.dll.XInputGetState(device_number, ctypes.byref(state))
 
         if res == ERROR_SUCCESS:
@@ -206,3 +319,88 @@ class XInput:
             int(right * 65535)
         )
         return self.dll.XInputSetState(device_number, ctypes.byref(vibration))
+
+
+class DeviceRegistry:
+    """
+    Cached XInput devices with hot-plug detection.
+
+    Connected devices are kept and updated on every poll, calling
+    XInputGetState on an empty slot is slow so empty slots are only
+    probed again after a backoff, starting at min_backoff and doubling on
+    every failed probe up to max_backoff. A device that disconnects puts
+    its slot back to probing, starting at min_backoff.
+
+    poll(now) returns the events since the last poll, (kind, device) with
+    kind CONNECTED, DISCONNECTED or CHANGED, in slot order, and calls each
+    listener(kind, device) with them. Like the devices, poll must always be
+    called from the same thread.
+
+    :param xinput: XInput
+    :param float min_backoff: seconds before the first probe of an empty
+        slot
+    :param float max_backoff: maximum seconds between probes
+    :param float now: time of the first probes
+    """
+
+    def __init__(self, xinput, min_backoff=0.5, max_backoff=8.0, now=0.0):
+        self.xinput = xinput
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        # slot -> connected device
+        self.devices = {}
+        # empty slot -> [next probe time, backoff]
+        self._empty = {slot: [now, min_backoff]
+                       for slot in range(xinput.max_devices)}
+        self.listeners = []
+        self.probes = 0
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def first(self):
+        """
+        Connected device in the lowest slot, None if there is none.
+        """
+        if not self.devices:
+            return None
+        return self.devices[min(self.devices)]
+
+    def poll(self, now):
+        """
+        Update connected devices and probe the empty slots that are due.
+
+        :return: list of (kind, device) events
+        """
+        events = []
+        for slot, device in list(self.devices.items()):
+            if not device.update():
+                continue
+            if device.is_connected():
+                events.append((CHANGED, device))
+            else:
+                del self.devices[slot]
+                self._empty[slot] = [now + self.min_backoff,
+                                     self.min_backoff]
+                events.append((DISCONNECTED, device))
+        for slot, probe in list(self._empty.items()):
+            if probe[0] > now:
+                continue
+            self.probes += 1
+            device = self.xinput.get_device(slot)
+            if device.is_connected():
+                del self._empty[slot]
+                self.devices[slot] = device
+                events.append((CONNECTED, device))
+            else:
+                probe[0] = now + probe[1]
+                probe[1] = min(probe[1] * 2, self.max_backoff)
+        if events:
+            events.sort(key=lambda event: event[1].device_number)
+            for listener in self.listeners:
+                for kind, device in events:
+                    listener(kind, device)
+        return events
@@ -0,0 +1,92 @@
+# coding: utf-8
+"""
+Pure Python stand-in for the XInput DLL.
+
+Use load_library in place of xinputlib.load_library to run without a
+physical controller::
+
+    xinput = XInput("xinput9_1_0", loader=fake.load_library)
+    pad = xinput.dll.pads[0]
+    pad.set(buttons=Buttons.a, l_thumb_x=1000)
+"""
+from vxinputlib.fake import FakeFunction, busy_wait
+
+from . import (
+    ERROR_DEVICE_NOT_CONNECTED, ERROR_SUCCESS, XInputGamepadStruct,
+)
+
+
+class FakePad:
+    """
+    Physical controller plugged into a fake XInput slot. Every change to
+    its state increments packet_number, like XInput does.
+    """
+
+    def __init__(self):
+        self.packet_number = 0
+        self.gamepad = XInputGamepadStruct()
+        self.vibration = (0, 0)
+
+    def set(self, **fields):
+        """
+        Change gamepad fields, e.g. pad.set(buttons=0x1000, left_trigger=255)
+        """
+        for name, value in fields.items():
+            setattr(self.gamepad, name, value)
+        self.packet_number = (self.packet_number + 1) & 0xFFFFFFFF
+
+    def read(self, state):
+        state.packet_number = self.packet_number
+        state.gamepad = self.gamepad
+
+
+class FakeXInputDll:
+    """
+    Four XInput slots, pads maps connected slot numbers to FakePad.
+
+    :param int pads: number of pads connected, starting at slot 0
+    :param float call_cost: seconds XInputGetState takes for connected slots
+    :param float empty_slot_cost: seconds XInputGetState takes for empty
+        slots, which is notably slower on real hardware
+    """
+
+    def __init__(self, pads=1, call_cost=0.0, empty_slot_cost=0.0,
+                 record=False):
+        self.pads = {i: FakePad() for i in range(pads)}
+        self.call_cost = call_cost
+        self.empty_slot_cost = empty_slot_cost
+        self.XInputGetState = FakeFunction(
+            "XInputGetState", self._get_state, 0.0, record)
+        self.XInputSetState = FakeFunction(
+            "XInputSetState", self._set_state, call_cost, record)
+
+    def connect(self, device_number):
+        pad = self.pads[device_number] = FakePad()
+        return pad
+
+    def disconnect(self, device_number):
+        return self.pads.pop(device_number, None)
+
+    def _get_state(self, device_number, ref):
+        pad = self.pads.get(device_number)
+        if pad is None:
+            if self.empty_slot_cost:
+                busy_wait(self.empty_slot_cost)
+            return ERROR_DEVICE_NOT_CONNECTED
+        if self.call_cost:
+            busy_wait(self.call_cost)
+        pad.read(ref._obj)
+        return ERROR_SUCCESS
+
+    def _set_state(self, device_number, ref):
+        pad = self.pads.get(device_number)
+        if pad is None:
+            return ERROR_DEVICE_NOT_CONNECTED
+        vibration = ref._obj
+        pad.vibration = (vibration.wLeftMotorSpeed, vibration.wRightMotorSpeed)
+        return ERROR_SUCCESS
+
+
+def load_library(dllname, pads=1, call_cost=0.0, empty_slot_cost=0.0,
+                 record=False):
+    return FakeXInputDll(pads, call_cost, empty_slot_cost, record)